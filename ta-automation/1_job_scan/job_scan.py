@@ -1,6 +1,9 @@
 from typing import Dict, List, Optional, Literal, Union
 from pydantic import BaseModel, validator
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from ta_common.algo_params import ALGO_WINDOWS
+from ta_common.instrumentation import instrumented, record, span
+from ta_common.resolutions import derivable
 
 # datetime.strptime("2022-01-01T04:16:13+10:00", "%Y-%m-%dT%H:%M:%S%z")
 
@@ -18,6 +21,12 @@ optional_keys = {
     "target_ta_confidence",
     "notify_method",
     "notify_recipient",
+    "resolutions",
+    "backtest",
+    "backtest_cost",
+    "ta_output",
+    "ta_window",
+    "incremental",
 }
 
 DEFAULT_DATE_TO = str(datetime.now())
@@ -25,8 +34,29 @@ DEFAULT_RESOLUTION = "1d"
 DEFAULT_SEARCH_PERIOD = 20
 DEFAULT_TARGET_TA_CONFIDENCE = 7
 
+# multi timeframe jobs are fetched from this far before date_from, so run TA has the start of date_from's session to
+# resample the coarser timeframes from. a local day is 25 hours at most
+SESSION_LOOKBACK = timedelta(hours=25)
+
 valid_notify_methods = [None, "pushover", "slack"]
 
+valid_resolutions = [
+    "1m",
+    "2m",
+    "5m",
+    "15m",
+    "30m",
+    "60m",
+    "90m",
+    "1h",
+    "1d",
+    "5d",
+    "1wk",
+    "1mo",
+    "3mo",
+]
+
+
 # for the purposes of validation, create objects representing the incoming data structure
 # then use Pydantic to validate them
 # dunno if this is overkill but yolo
@@ -39,16 +69,53 @@ class Algo(BaseModel):
 class AwesomeOscillator(Algo):
     strategy: Optional[Literal["saucer", "twin-peaks", "crossover"]] = None
     direction: Optional[Literal["bullish", "bearish"]] = None
+    # SMA windows, 5 and 34 if they're not given. a parameter sweep (3_run_ta/sweep.py) picks better ones
+    window1: Optional[int] = None
+    window2: Optional[int] = None
+
+    @validator("window1", "window2")
+    def window_checker(cls, v):
+        if v is not None and v < 1:
+            raise ValueError(f"Invalid window specified: {v}. Must be at least 1")
+        return v
+
+    @validator("window2", always=True)
+    def windows_checker(cls, v, values):
+        # a window given on its own is checked against the other one's default. if window1 was invalid it's not in
+        # values, and has already been reported
+        if "window1" not in values:
+            return v
+        defaults = ALGO_WINDOWS["awesome-oscillator"]
+        window1 = values["window1"] or defaults["window1"]
+        window2 = v or defaults["window2"]
+        if window1 >= window2:
+            raise ValueError(
+                f"Invalid windows specified: window1 ({window1}) must be shorter than window2 ({window2})"
+            )
+        return v
 
 
-# todo
 class Stoch(Algo):
-    ...
+    # %K window and %D smoothing window, 14 and 3 if they're not given
+    window: Optional[int] = None
+    smooth_window: Optional[int] = None
+
+    @validator("window", "smooth_window")
+    def window_checker(cls, v):
+        if v is not None and v < 1:
+            raise ValueError(f"Invalid window specified: {v}. Must be at least 1")
+        return v
 
 
-# todo
 class AccumulationDistribution(Algo):
-    ...
+    # how many bars back a divergence looks for the previous price/A-D high or low, 20 if it's not given
+    window: Optional[int] = None
+
+    @validator("window")
+    def window_checker(cls, v):
+        if v is not None and v < 1:
+            raise ValueError(f"Invalid window specified: {v}. Must be at least 1")
+        return v
 
 
 class Job(BaseModel):
@@ -57,10 +124,27 @@ class Job(BaseModel):
     date_to: datetime
     ta_algos: List[Union[AwesomeOscillator, Stoch, AccumulationDistribution]]
     resolution: str
+    # multi timeframe jobs - run TA resamples these from the data fetched at resolution, which should be the finest
+    resolutions: Optional[List[str]]
     search_period: int
     notify_method: Optional[str]
     notify_recipient: Optional[str]
     target_ta_confidence: int
+    # "compact" has run TA send back the last ta_window bars of each series and the signals as sparse events, rather
+    # than the full length series. unset leaves it to run TA's TA_OUTPUT/TA_WINDOW
+    ta_output: Optional[Literal["full", "compact"]]
+    ta_window: Optional[int]
+    # run TA only processes the bars it hasn't seen before for this symbol + resolution, from the indicator state it
+    # saved last time. only for AO crossover jobs, anything else quietly gets the full run
+    incremental: Optional[bool]
+
+    @validator("ta_window")
+    def ta_window_checker(cls, v):
+        if v is not None and v < 0:
+            raise ValueError(
+                f"Invalid ta_window specified: {v}. Must be 0 (everything) or more"
+            )
+        return v
 
     @validator("notify_method")
     def notify_checker(cls, v):
@@ -71,25 +155,25 @@ class Job(BaseModel):
 
     @validator("resolution")
     def resolution_checker(cls, v):
-        valid_resolutions = [
-            "1m",
-            "2m",
-            "5m",
-            "15m",
-            "30m",
-            "60m",
-            "90m",
-            "1h",
-            "1d",
-            "5d",
-            "1wk",
-            "1mo",
-            "3mo",
-        ]
         if v not in valid_resolutions:
             raise ValueError(
                 f"Invalid resolution specified: {v}. Must be one of {str(valid_resolutions)}"
             )
+        return v
+
+    @validator("resolutions", each_item=True)
+    def resolutions_checker(cls, v, values):
+        if v not in valid_resolutions:
+            raise ValueError(
+                f"Invalid resolution specified in resolutions: {v}. Must be one of {str(valid_resolutions)}"
+            )
+        # run TA resamples them from the data fetched at resolution, so they have to be buildable from it
+        resolution = values.get("resolution")
+        if resolution is not None and not derivable(resolution, v):
+            raise ValueError(
+                f"Invalid resolution specified in resolutions: {v}. Can't be built from {resolution} bars"
+            )
+        return v
 
     @validator("target_ta_confidence")
     def target_ta_confidence_checker(cls, v):
@@ -100,12 +184,11 @@ class Job(BaseModel):
 
 
 # Function to flatten a list of jobs that contains a list of symbols and a list of TA algorithms
-# Enumerate the permutations of job x symbol x algo to come up with a list/array that is fed
-# into the Step Function map
+# Enumerate the permutations of job x symbol x algo to come up with a list/array of work items
 def job_enumerator(job_object):
     jobs = []
     # enumerate jobs
-    for job in job_object["jobs"]:
+    for job_id, job in enumerate(job_object["jobs"]):
         # enumerate the algos in this job
         for algo in job["ta_algos"]:
             # take a copy of the parent job, remove the lists and add the specific list item we want in this job
@@ -113,15 +196,75 @@ def job_enumerator(job_object):
             this_job = job.copy()
             del this_job["ta_algos"]
             this_job["ta_algo"] = algo
+            # so calculate confidence can put the results for each job back together again
+            this_job["job_id"] = job_id
             jobs.append(this_job)
 
-        # even though ive set this up to take multiple jobs, the rest of the flow is not ready for that yet
-        # so stop it after one job
-        break
-
     return jobs
 
 
+def parse_date(value):
+    # naive dates (like DEFAULT_DATE_TO) are taken as UTC so they can be compared with the tz aware ones
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def fetch_from(item):
+    # where an item's data has to start
+    if item.get("resolutions"):
+        return (parse_date(item["date_from"]) - SESSION_LOOKBACK).isoformat()
+    return item["date_from"]
+
+
+# Group the flat work items by the data they need, so each piece of data is only fetched once and the algos are
+# fanned out over it. items for the same symbol and resolution whose date ranges overlap are merged into a single
+# fetch covering all of them - run TA and generate graph cut each item's own window back out of it. multi timeframe
+# items start their fetch a day early, see fetch_from
+def plan_fetches(flat_jobs):
+    by_data = {}
+    for item in flat_jobs:
+        key = (item["symbol"].lower(), item["resolution"])
+        by_data.setdefault(key, []).append(item)
+
+    fetch_groups = []
+    for items in by_data.values():
+        items = sorted(items, key=lambda item: parse_date(fetch_from(item)))
+
+        group = None
+        group_end = None
+        for item in items:
+            item_start = parse_date(fetch_from(item))
+            item_end = parse_date(item["date_to"])
+
+            if group is not None and item_start <= group_end:
+                # overlaps (or touches) the current group, so widen it to cover this item too
+                group["items"].append(item)
+                if item_end > group_end:
+                    group["date_to"] = item["date_to"]
+                    group_end = item_end
+                continue
+
+            group = {
+                "symbol": item["symbol"],
+                "resolution": item["resolution"],
+                "date_from": fetch_from(item),
+                "date_to": item["date_to"],
+                "items": [item],
+            }
+            group_end = item_end
+            fetch_groups.append(group)
+
+    return {
+        "fetch_groups": fetch_groups,
+        # without planning every item would have done its own fetch
+        "fetches_naive": len(flat_jobs),
+        "fetches_planned": len(fetch_groups),
+        "fetches_saved": len(flat_jobs) - len(fetch_groups),
+    }
+
+
 # checks that the mandatory keys are specified in the query
 # also looks for additional keys that are not implemented in the query
 def check_required_keys(jobs):
@@ -169,12 +312,13 @@ def check_algos(algos):
             )
 
         algo_name = list(algo.keys())[0]
+        params = algo[algo_name] or {}
         if algo_name == "awesome-oscillator":
-            algo_objects.append(AwesomeOscillator())
+            algo_objects.append(AwesomeOscillator(**params))
         elif algo_name == "stoch":
-            algo_objects.append(Stoch())
+            algo_objects.append(Stoch(**params))
         elif algo_name == "accumulation-distribution":
-            algo_objects.append(AccumulationDistribution())
+            algo_objects.append(AccumulationDistribution(**params))
         else:
             raise KeyError(f"Selected TA algorithm is not recognised: {algo_name}")
 
@@ -217,10 +361,14 @@ def check_types(jobs):
             date_to=this_job["date_to"],
             ta_algos=check_algos(this_job["ta_algos"]),
             resolution=this_job["resolution"],
+            resolutions=this_job["resolutions"],
             search_period=this_job["search_period"],
             notify_method=this_job["notify_method"],
             notify_recipient=this_job["notify_recipient"],
             target_ta_confidence=this_job["target_ta_confidence"],
+            ta_output=this_job["ta_output"],
+            ta_window=this_job["ta_window"],
+            incremental=this_job["incremental"],
         )
     return True
 
@@ -231,21 +379,26 @@ def validate_input(jobs):
     return
 
 
+@instrumented("job_scan")
 def lambda_handler(event, context):
     jobs = event["Payload"]
     # event["Payload"] will need to include the json below - just using a hardcoded mock for now
-    # even though this json is a list of jobs, in reality there should only be a single object in this array
-    # this is because otherwise i need to move target_ta_confidence in to ta_algos and then find some way
-    # to use it later in the flow
-    # i may still do this in future but not yet
+    # each job keeps its own target_ta_confidence and notify settings - calculate confidence regroups the results
+    # by job_id once the TA is done
 
     # validate the input parameters
-    validate_input(jobs["jobs"])
-
-    # flatten the jobs and move on
-    flat_jobs = job_enumerator(jobs)
-
-    return flat_jobs
+    with span("validate"):
+        validate_input(jobs["jobs"])
+
+    # flatten the jobs, then work out the smallest set of fetches that covers them all
+    with span("plan"):
+        flat_jobs = job_enumerator(jobs)
+        plan = plan_fetches(flat_jobs)
+    record("jobs", len(jobs["jobs"]))
+    record("fetches_planned", plan["fetches_planned"])
+    record("fetches_saved", plan["fetches_saved"])
+
+    return plan
 
 
 if __name__ == "__main__":
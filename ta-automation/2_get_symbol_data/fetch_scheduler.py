@@ -0,0 +1,222 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+# sits between get_symbol_data (and the OHLCV cache) and the quote provider, so we stop getting ourselves throttled
+#
+#   - a token bucket caps the request rate, with some burst allowance
+#   - a semaphore caps how many upstream calls are in flight at once
+#   - throttling (and connection trouble) is retried with exponential backoff and full jitter, so a burst of
+#     throttled callers doesn't come back all at the same moment
+#   - identical requests (same symbol, window and resolution) that arrive while one is already in flight wait for
+#     that one instead of making their own call - single flight
+#
+# it's per container - every warm get_symbol_data keeps its own - and a lambda container only runs one invocation at
+# a time. so the token bucket, the concurrency cap and single flight only ever see the fetches of a single
+# invocation: batch mode's per symbol fallback, and the local runner, where every stage shares one process. they
+# don't limit or merge anything across the state machine's concurrent "Per fetch group" iterations - the Map's
+# MaxConcurrency in statemachine/ta-automation.asl.json is what caps those
+#
+# it's a drop in for the provider: scheduler(symbol, start, end, interval) and scheduler.batch(symbols, start, end,
+# interval)
+
+
+# throttled, or the provider having a bad moment
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# matched by name anywhere in the exception's class hierarchy, so neither yfinance nor requests has to be imported to
+# check. requests' ConnectionError and Timeout don't subclass the builtin ones
+RETRYABLE_TYPES = {"YFRateLimitError", "ConnectionError", "TimeoutError", "Timeout"}
+
+
+def status_code(e):
+    # requests' (and curl_cffi's) HTTPError carry the response, other wrappers put the status on the exception
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None) or getattr(e, "status_code", None)
+
+
+def is_retryable(e):
+    # by type and HTTP status, never the message - that has the symbol and dates in it, which can say anything
+    if any(cls.__name__ in RETRYABLE_TYPES for cls in type(e).__mro__):
+        return True
+    return status_code(e) in RETRYABLE_STATUSES
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        # rate is tokens per second, burst is how many can be saved up
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # take a token, waiting until there is one. returns how long we waited
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # reserve ours even if it isn't there yet, so callers are served in the order they turned up
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class FetchScheduler:
+    def __init__(
+        self,
+        provider,
+        batch_provider=None,
+        rate=2.0,
+        burst=5,
+        max_concurrency=4,
+        max_retries=4,
+        base_delay=0.5,
+        max_delay=20.0,
+        retryable=is_retryable,
+        clock=time.monotonic,
+        sleep=time.sleep,
+        rng=None,
+    ):
+        # rate=None turns the rate limit off
+        self.provider = provider
+        self.batch_provider = batch_provider
+        self.bucket = TokenBucket(rate, burst, clock, sleep) if rate else None
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.queue_depth = 0
+        # running totals. get_symbol_data reports the change over each invocation, see since()
+        self.stats = {
+            "requests": 0,
+            "upstream_calls": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "wait_ms": 0.0,
+            "max_queue_depth": 0,
+        }
+
+    def __call__(self, symbol, start, end, interval):
+        key = ("one", symbol.upper(), start, end, interval)
+        return self.single_flight(
+            key, lambda: self.provider(symbol, start, end, interval)
+        )
+
+    def batch(self, symbols, start, end, interval):
+        # one token for the whole bulk call - it's one request as far as the rate limit's concerned
+        key = ("batch", tuple(sorted(s.upper() for s in symbols)), start, end, interval)
+        return self.single_flight(
+            key, lambda: self.batch_provider(symbols, start, end, interval)
+        )
+
+    def single_flight(self, key, fetch):
+        with self._lock:
+            self.stats["requests"] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            # a copy, so nobody can change the frame out from under the caller that actually fetched it
+            return copy_result(future.result())
+
+        try:
+            result = self.call_upstream(fetch)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def call_upstream(self, fetch):
+        attempt = 0
+        while True:
+            self.wait_for_turn()
+            try:
+                with self._lock:
+                    self.stats["upstream_calls"] += 1
+                return fetch()
+            except Exception as e:
+                if attempt >= self.max_retries or not self.retryable(e):
+                    raise
+                delay = self.backoff(attempt)
+                print(
+                    f"Upstream throttled or unavailable, retrying in {delay:.2f}s.  Error: {e}"
+                )
+                with self._lock:
+                    self.stats["retries"] += 1
+            finally:
+                self.slots.release()
+            # sleep without holding a slot, so other requests can go in the meantime
+            self.sleep(delay)
+            attempt += 1
+
+    def backoff(self, attempt):
+        # full jitter - anywhere between 0 and the exponential cap
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def wait_for_turn(self):
+        # a concurrency slot, then a token. the slot is released by call_upstream
+        started = time.perf_counter()
+        with self._lock:
+            self.queue_depth += 1
+            self.stats["max_queue_depth"] = max(
+                self.stats["max_queue_depth"], self.queue_depth
+            )
+        try:
+            self.slots.acquire()
+            if self.bucket is not None:
+                self.bucket.acquire()
+        finally:
+            with self._lock:
+                self.queue_depth -= 1
+                self.stats["wait_ms"] += (time.perf_counter() - started) * 1000
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self.stats)
+            # so since() reports the deepest queue over the invocation rather than ever
+            self.stats["max_queue_depth"] = self.queue_depth
+        return snapshot
+
+    def since(self, snapshot):
+        # what changed since snapshot(). max_queue_depth is the deepest it got in between
+        with self._lock:
+            changes = {
+                name: value - snapshot[name]
+                for name, value in self.stats.items()
+                if name != "max_queue_depth"
+            }
+            changes["max_queue_depth"] = self.stats["max_queue_depth"]
+        return changes
+
+
+def copy_result(result):
+    if hasattr(result, "copy"):
+        # a frame from provider, or {symbol: frame} from batch_provider
+        if isinstance(result, dict):
+            return {key: copy_result(value) for key, value in result.items()}
+        return result.copy()
+    return result
@@ -1,20 +1,223 @@
-import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import json
+import os
+from fetch_scheduler import FetchScheduler
+from ohlcv_cache import NO_DATA, OHLCVCache
+from ta_common.instrumentation import instrumented, record, span
+from ta_common.symbol_data import store_symbol_data
+from ta_common.wire_format import encode_frame
 
 # todo: probably need Pydantic or something to validate parameters
 
+# where the OHLCV cache lives. /tmp survives between warm invocations, point it at EFS to share it between
+# containers. set it to an empty string to turn the cache off
+CACHE_DIR = os.environ.get("OHLCV_CACHE_DIR", "/tmp/ohlcv_cache")
+
+# how many symbols batch mode fetches at once when it has to go one symbol at a time
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "8"))
+
+# upstream limits within one invocation - see fetch_scheduler.py. across invocations it's the state machine's
+# MaxConcurrency. FETCH_RATE is requests per second, 0 turns it off
+FETCH_RATE = float(os.environ.get("FETCH_RATE", "2"))
+FETCH_BURST = int(os.environ.get("FETCH_BURST", "5"))
+FETCH_CONCURRENCY = int(os.environ.get("FETCH_CONCURRENCY", "4"))
+FETCH_MAX_RETRIES = int(os.environ.get("FETCH_MAX_RETRIES", "4"))
+
+
+def yfinance_provider(symbol, start, end, interval):
+    # yfinance drags in requests, lxml and friends, and a warm OHLCV cache often doesn't need it at all
+    import yfinance as yf
+
+    ticker = yf.Ticker(symbol)
+    return ticker.history(start=start, end=end, interval=interval)
+
+
+def yfinance_batch_provider(symbols, start, end, interval):
+    # one bulk download for the lot. returns {symbol: frame} - anything yfinance couldn't get comes back as all nan
+    # rows, which are dropped, so it ends up empty
+    import pandas as pd
+    import yfinance as yf
+
+    data = yf.download(
+        list(symbols),
+        start=start,
+        end=end,
+        interval=interval,
+        group_by="ticker",
+        auto_adjust=True,
+        actions=True,
+        threads=True,
+        progress=False,
+    )
+
+    frames = {}
+    for symbol in symbols:
+        # yfinance upper cases tickers, and only nests the columns by ticker when there's more than one (depending
+        # on the version)
+        if isinstance(data.columns, pd.MultiIndex):
+            if symbol.upper() not in data.columns.get_level_values(0):
+                continue
+            frame = data[symbol.upper()]
+        else:
+            frame = data
+        if len(frame.columns) == 0:
+            continue
+        frames[symbol] = frame.dropna(
+            how="all", subset=["Open", "High", "Low", "Close"]
+        )
+    return frames
+
+
+def make_scheduler(provider, batch_provider):
+    return FetchScheduler(
+        provider,
+        batch_provider,
+        rate=FETCH_RATE or None,
+        burst=FETCH_BURST,
+        max_concurrency=FETCH_CONCURRENCY,
+        max_retries=FETCH_MAX_RETRIES,
+    )
+
+
+# module level so they're reused across warm invocations, and so they can be swapped for a stand-in provider
+# locally - see use_provider. everything upstream goes through the scheduler
+provider = yfinance_provider
+batch_provider = yfinance_batch_provider
+scheduler = make_scheduler(provider, batch_provider)
+ohlcv_cache = OHLCVCache(CACHE_DIR, scheduler) if CACHE_DIR else None
+
+
+def use_provider(new_provider, cache_dir=CACHE_DIR, new_batch_provider=None):
+    # without a batch provider, batch mode calls the single symbol one from a thread pool
+    global provider, batch_provider, scheduler, ohlcv_cache
+    provider = new_provider
+    batch_provider = new_batch_provider
+    scheduler = make_scheduler(provider, batch_provider)
+    ohlcv_cache = OHLCVCache(cache_dir, scheduler) if cache_dir else None
+
+
+def record_scheduler(snapshot):
+    # queue depth, time spent waiting on the rate limit/concurrency cap, retries and coalesced requests for this
+    # invocation
+    changes = scheduler.since(snapshot)
+    record("fetch_wait", changes["wait_ms"], "Milliseconds")
+    record("fetch_queue_depth", changes["max_queue_depth"])
+    record("fetch_retries", changes["retries"])
+    record("fetch_coalesced", changes["coalesced"])
+    record("fetch_upstream_calls", changes["upstream_calls"])
+
+
+def error_message(e):
+    return f"{type(e).__name__}: {e}"
+
+
+def fetch_each(symbols, start, end, interval):
+    # one provider call per symbol, BATCH_WORKERS at a time. one symbol blowing up doesn't stop the others
+    def fetch_one(symbol):
+        try:
+            return symbol, scheduler(symbol, start, end, interval), None
+        except Exception as e:
+            return symbol, None, error_message(e)
+
+    frames = {}
+    failures = {}
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(BATCH_WORKERS, len(symbols)))
+    ) as pool:
+        for symbol, frame, error in pool.map(fetch_one, symbols):
+            if error is None:
+                frames[symbol] = frame
+            else:
+                failures[symbol] = error
+    return frames, failures
+
+
+def fetch_batch(symbols, start, end, interval):
+    # ({symbol: frame}, {symbol: error}). a symbol with no bars at all counts as a failure (NO_DATA) here - in a big
+    # scan that's almost always a typo or a delisted ticker, and we'd rather say so than hand on an empty frame. the
+    # cache's history_many only fetches the gaps it's missing, and lets a symbol off when it's just one of those that
+    # was empty
+    if batch_provider is None:
+        frames, failures = fetch_each(symbols, start, end, interval)
+    else:
+        try:
+            frames = scheduler.batch(symbols, start, end, interval)
+            failures = {}
+        except Exception as e:
+            # the bulk call failed as a whole, so fall back to one at a time rather than fail every symbol
+            print(
+                f"Batch download failed, fetching one at a time.  Error: {error_message(e)}"
+            )
+            frames, failures = fetch_each(symbols, start, end, interval)
+
+    for symbol in symbols:
+        if symbol in failures:
+            continue
+        if symbol not in frames or len(frames[symbol]) == 0:
+            frames.pop(symbol, None)
+            failures[symbol] = NO_DATA
+    return frames, failures
+
+
+# batch mode - {"symbols": [...]} instead of "symbol", all sharing date_from, date_to and resolution. returns
+# {"symbol_data": {symbol: data or claim check}, "failures": {symbol: error}} so the symbols that worked can carry on
+def batch_handler(payload):
+    symbols = list(dict.fromkeys(payload["symbols"]))
+    start = datetime.fromisoformat(payload["date_from"])
+    end = datetime.fromisoformat(payload["date_to"])
+    interval = payload["resolution"]
+
+    snapshot = scheduler.snapshot()
+    with span("fetch"):
+        if ohlcv_cache:
+            frames, failures = ohlcv_cache.history_many(
+                symbols, start, end, interval, fetch_batch
+            )
+        else:
+            with span("provider"):
+                frames, failures = fetch_batch(symbols, start, end, interval)
+    record_scheduler(snapshot)
+    record("symbols", len(symbols))
+    record("failures", len(failures))
+    record("rows", sum(len(frame) for frame in frames.values()))
+
+    symbol_data = {}
+    for symbol in symbols:
+        if symbol in frames:
+            with span("encode"):
+                encoded = encode_frame(frames[symbol])
+            symbol_data[symbol] = store_symbol_data(encoded, symbol, interval)
+
+    return {"symbol_data": symbol_data, "failures": failures}
+
+
 # Function to add symbol data for the given symbol being queried
+@instrumented("get_symbol_data")
 def lambda_handler(event, context):
+    if "symbols" in event["Payload"]:
+        return batch_handler(event["Payload"])
+
     # get the history for the symbol
     symbol = event["Payload"]["symbol"]
     start = datetime.fromisoformat(event["Payload"]["date_from"])
     end = datetime.fromisoformat(event["Payload"]["date_to"])
     interval = event["Payload"]["resolution"]
-    ticker = yf.Ticker(symbol)
-    history = ticker.history(start=start, end=end, interval=interval)
 
-    return json.loads(history.to_json())
+    snapshot = scheduler.snapshot()
+    with span("fetch"):
+        if ohlcv_cache:
+            history = ohlcv_cache.history(symbol, start, end, interval)
+        else:
+            history = scheduler(symbol, start, end, interval)
+    record_scheduler(snapshot)
+    record("rows", len(history))
+
+    # compact columnar encoding rather than history.to_json(), see ta_common/wire_format.py
+    with span("encode"):
+        symbol_data = encode_frame(history)
+
+    # if a symbol data store is configured this hands back a claim check pointer instead of the data itself
+    return store_symbol_data(symbol_data, symbol, interval)
 
 
 payload = {
@@ -30,5 +233,15 @@ payload = {
     }
 }
 
+batch_payload = {
+    "Payload": {
+        "date_from": "2022-01-01T04:16:13+10:00",
+        "date_to": "2022-01-04T04:16:13+10:00",
+        "resolution": "1d",
+        "symbols": ["bhp", "rio", "fmg", "not-a-real-ticker"],
+    }
+}
+
 if __name__ == "__main__":
     lambda_handler(payload, None)
+    lambda_handler(batch_payload, None)
@@ -0,0 +1,336 @@
+import fcntl
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from ta_common.instrumentation import record, span
+from ta_common.resample import bar_span, resample, session_start, sources_for
+
+# on disk OHLCV cache, one file per symbol + resolution
+# each file is columnar (one numpy array per column plus an int64 UTC index) and records the time range it covers,
+# so repeat queries only go upstream for the leading or trailing bars we don't already have. it also records the
+# exchange's timezone, so a coarser resolution can be built from a finer one we hold without going upstream at all -
+# see ta_common/resample.py
+#
+# parquet would be nicer but pyarrow isn't in any of our lambda layers, and numpy already is
+#
+# several fetches for the same symbol + resolution can be merging into the same file at once - threads in the local
+# runner, and containers sharing the cache over EFS. the read-merge-write is done under a per file lock (a thread lock
+# for this process, flock on a .lock file next to it for everyone else), and each write goes to its own temp file
+
+
+# the error fetch_batch gives a symbol it got no bars for
+NO_DATA = "No data returned"
+
+# one thread lock per cache file, shared by every OHLCVCache in the process
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+
+class OHLCVCache:
+    def __init__(self, cache_dir, provider):
+        # provider is anything callable as provider(symbol, start, end, interval) that returns a DataFrame indexed
+        # by bar timestamp - yfinance in the lambda, a stand-in locally
+        self.cache_dir = cache_dir
+        self.provider = provider
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, symbol, resolution):
+        safe_symbol = re.sub(r"[^A-Za-z0-9._-]", "_", symbol.upper())
+        return os.path.join(self.cache_dir, f"{safe_symbol}_{resolution}.npz")
+
+    @contextmanager
+    def locked(self, symbol, resolution):
+        path = self.path(symbol, resolution)
+        with _file_locks_lock:
+            thread_lock = _file_locks.setdefault(path, threading.Lock())
+        with thread_lock, open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, symbol, resolution):
+        # returns (frame, covered_from, covered_to, tz) or None if we've never seen this symbol at this resolution
+        path = self.path(symbol, resolution)
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path, allow_pickle=False) as stored:
+            columns = stored["columns"].tolist()
+            frame = pd.DataFrame(
+                {column: stored[f"column_{i}"] for i, column in enumerate(columns)},
+                index=pd.DatetimeIndex(pd.to_datetime(stored["index"], utc=True)),
+            )
+            covered_from, covered_to = pd.to_datetime(stored["covered"], utc=True)
+            # files written before the timezone was kept don't have one, and get treated as UTC
+            tz = stored["tz"].item() if "tz" in stored.files else ""
+
+        return frame, covered_from, covered_to, tz or None
+
+    def save(self, symbol, resolution, frame, covered_from, covered_to, tz=None):
+        columns = list(frame.columns)
+        arrays = {
+            f"column_{i}": frame[column].to_numpy() for i, column in enumerate(columns)
+        }
+        arrays["columns"] = np.array(columns, dtype=str)
+        arrays["index"] = to_epoch_ns(frame.index)
+        arrays["covered"] = np.array(
+            [covered_from.value, covered_to.value], dtype=np.int64
+        )
+        arrays["tz"] = np.array(tz or "", dtype=str)
+
+        # write then rename, so a lambda that dies half way through a write can't leave a broken file behind. the
+        # temp file is unique to this write, so concurrent writers can't rename each other's away
+        path = self.path(symbol, resolution)
+        with tempfile.NamedTemporaryFile(
+            dir=self.cache_dir,
+            prefix=os.path.basename(path) + ".",
+            suffix=".tmp",
+            delete=False,
+        ) as f:
+            np.savez(f, **arrays)
+        os.replace(f.name, path)
+
+    def fetch(self, symbol, start, end, interval):
+        # only this part goes upstream, so it's timed separately from the cache as a whole
+        with span("provider"):
+            frame = self.provider(
+                symbol, start.to_pydatetime(), end.to_pydatetime(), interval
+            )
+        record("provider_calls", 1)
+        return to_utc_index(frame)
+
+    def plan(self, symbol, start, end, interval):
+        # work out what we'd need from upstream to answer [start, end) for this symbol. returns a CachePlan, whose
+        # gaps are the (from, to) ranges to fetch - empty if the cache already covers it
+        start = to_utc(start)
+        end = to_utc(end)
+        # we can't have seen bars from the future, so never claim coverage past now
+        fetched_to = min(end, pd.Timestamp.now(tz="UTC"))
+
+        cached = self.load(symbol, interval)
+        if cached is None:
+            return CachePlan(None, [(start, end)], start, fetched_to)
+
+        frame, covered_from, covered_to, tz = cached
+        gaps = []
+
+        # leading gap. fetching all the way up to the start of the cache keeps the covered range contiguous
+        if start < covered_from:
+            gaps.append((start, covered_from))
+            covered_from = start
+
+        # trailing gap. the last bar we hold may have been a partial bar (eg today's daily bar), so refetch
+        # from it rather than from the end of the covered range
+        if end > covered_to:
+            refetch_from = covered_to
+            if len(frame) > 0:
+                refetch_from = min(refetch_from, frame.index[-1])
+            gaps.append((refetch_from, end))
+            covered_to = max(covered_to, fetched_to)
+
+        return CachePlan(frame, gaps, covered_from, covered_to, tz)
+
+    def apply(self, symbol, start, end, interval, plan, fetched):
+        # merge the frames fetched for plan.gaps into the cache and return the bars in [start, end)
+        frame = plan.frame
+        tz = plan.tz
+        if plan.gaps:
+            with self.locked(symbol, interval):
+                frame, tz = self.merge(symbol, interval, plan, fetched)
+
+        start = to_utc(start)
+        end = to_utc(end)
+        frame = frame[(frame.index >= start) & (frame.index < end)]
+        # so the wire format can tell later stages which timezone the exchange is in
+        frame.attrs["tz"] = tz
+        return frame
+
+    def merge(self, symbol, interval, plan, fetched):
+        # called with the file locked. someone else may have written it since we planned, so what's there now is
+        # merged in too - as long as its range joins up with ours, since a cache file only has the one covered range.
+        # if it doesn't, ours replaces it. fetched bars go last so they win, since they're fresher
+        pieces = [] if plan.frame is None else [plan.frame]
+        covered_from, covered_to = plan.covered_from, plan.covered_to
+        tz = plan.tz
+        current = self.load(symbol, interval)
+        if current is not None:
+            frame, current_from, current_to, current_tz = current
+            if current_from <= covered_to and covered_from <= current_to:
+                pieces.append(frame)
+                covered_from = min(covered_from, current_from)
+                covered_to = max(covered_to, current_to)
+                tz = tz or current_tz
+        pieces += fetched
+
+        frame = merge_frames(pieces)
+        tz = next(
+            (piece.attrs["tz"] for piece in fetched if "tz" in piece.attrs),
+            tz,
+        )
+        self.save(symbol, interval, frame, covered_from, covered_to, tz)
+        return frame, tz
+
+    def derive(self, symbol, start, end, interval):
+        # the bars in [start, end) built from a finer resolution we already hold, or None if none of them cover
+        # enough of the range
+        start = to_utc(start)
+        end = to_utc(end)
+        now = pd.Timestamp.now(tz="UTC")
+
+        for source in sources_for(interval):
+            cached = self.load(symbol, source)
+            if cached is None:
+                continue
+            frame, covered_from, covered_to, tz = cached
+
+            # the first session's bins only line up if we resample it from its first bar, so we need the finer bars
+            # from the start of start's day. the last bin can run past end, so we need them up to where it finishes -
+            # or, when that's in the future, up to the last finer bar that could have closed
+            needed_from = session_start(start, tz)
+            needed_to = min(end + bar_span(interval), now - bar_span(source))
+            if covered_from > needed_from or covered_to < needed_to:
+                continue
+
+            with span("resample"):
+                window = frame[
+                    (frame.index >= needed_from)
+                    & (frame.index < end + bar_span(interval))
+                ]
+                derived = resample(window, interval, tz)
+            record("resampled", 1)
+            derived = derived[(derived.index >= start) & (derived.index < end)]
+            derived.attrs["tz"] = tz
+            return derived
+
+        return None
+
+    def history(self, symbol, start, end, interval):
+        # get the bars in [start, end), going upstream only for the parts the cache doesn't cover - and not at all if
+        # they can be built from a finer resolution we hold
+        plan = self.plan(symbol, start, end, interval)
+        if plan.gaps:
+            derived = self.derive(symbol, start, end, interval)
+            if derived is not None:
+                return derived
+
+        fetched = [
+            self.fetch(symbol, gap_from, gap_to, interval)
+            for gap_from, gap_to in plan.gaps
+        ]
+        return self.apply(symbol, start, end, interval, plan, fetched)
+
+    def history_many(self, symbols, start, end, interval, fetch_batch):
+        # history() for a lot of symbols at once. symbols that need the same range from upstream (on a cold cache,
+        # all of them) get it from one fetch_batch(symbols, from, to, interval) call, which returns
+        # ({symbol: frame}, {symbol: error}). returns the same pair - a failed symbol's cache is left alone
+        #
+        # a gap with no bars in it (a weekend, a holiday) comes back as NO_DATA, and that's fine - history() takes an
+        # empty frame for it too. only a symbol with no bars at all, cached or fetched, counts as a failure
+        plans = {symbol: self.plan(symbol, start, end, interval) for symbol in symbols}
+
+        derived = {}
+        for symbol, plan in plans.items():
+            if plan.gaps:
+                frame = self.derive(symbol, start, end, interval)
+                if frame is not None:
+                    derived[symbol] = frame
+        for symbol in derived:
+            del plans[symbol]
+
+        by_gap = {}
+        for symbol, plan in plans.items():
+            for gap in plan.gaps:
+                by_gap.setdefault(gap, []).append(symbol)
+
+        fetched = {}
+        failures = {}
+        for (gap_from, gap_to), gap_symbols in by_gap.items():
+            with span("provider"):
+                frames, errors = fetch_batch(
+                    gap_symbols,
+                    gap_from.to_pydatetime(),
+                    gap_to.to_pydatetime(),
+                    interval,
+                )
+            record("provider_calls", 1)
+            for symbol, error in errors.items():
+                if error != NO_DATA:
+                    failures[symbol] = error
+            for symbol, frame in frames.items():
+                fetched[(symbol, gap_from, gap_to)] = to_utc_index(frame)
+
+        frames = derived
+        for symbol, plan in plans.items():
+            if symbol in failures:
+                continue
+            pieces = [
+                fetched[(symbol, gap_from, gap_to)]
+                for gap_from, gap_to in plan.gaps
+                if (symbol, gap_from, gap_to) in fetched
+            ]
+            # nothing to cache - most likely a typo or a delisted ticker
+            if all(len(piece) == 0 for piece in pieces) and (
+                plan.frame is None or len(plan.frame) == 0
+            ):
+                failures[symbol] = NO_DATA
+                continue
+            frame = self.apply(symbol, start, end, interval, plan, pieces)
+            if len(frame) == 0:
+                failures[symbol] = NO_DATA
+                continue
+            frames[symbol] = frame
+
+        return frames, failures
+
+
+class CachePlan:
+    def __init__(self, frame, gaps, covered_from, covered_to, tz=None):
+        # frame is what's cached already (None if nothing), gaps what has to come from upstream, covered_* the
+        # range the cache will cover once the gaps are filled and tz the exchange's timezone, if we know it yet
+        self.frame = frame
+        self.gaps = gaps
+        self.covered_from = covered_from
+        self.covered_to = covered_to
+        self.tz = tz
+
+
+def to_utc(timestamp):
+    # naive datetimes are treated as UTC, which is what the lambda runtime's local time is anyway
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def to_utc_index(frame):
+    # the exchange's timezone (which yfinance indexes bars in) is kept in attrs, for the cache to hold on to
+    frame = frame.copy()
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is None:
+        frame.index = index.tz_localize("UTC")
+    else:
+        frame.attrs["tz"] = str(index.tz)
+        frame.index = index.tz_convert("UTC")
+    return frame
+
+
+def to_epoch_ns(index):
+    # int64 nanoseconds since epoch regardless of which unit this version of pandas stores the index in
+    naive = pd.DatetimeIndex(index).tz_convert(None)
+    return naive.values.astype("datetime64[ns]").view(np.int64)
+
+
+def merge_frames(frames):
+    # later pieces win when the same bar shows up twice, since they're fresher
+    with_data = [frame for frame in frames if len(frame.columns) > 0]
+    if not with_data:
+        return frames[0]
+    merged = pd.concat(with_data)
+    merged = merged[~merged.index.duplicated(keep="last")]
+    return merged.sort_index()
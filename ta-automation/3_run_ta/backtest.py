@@ -0,0 +1,146 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from indicators import IndicatorFrame, algo_windows
+from signals import (
+    BUY,
+    ao_signal,
+    ao_strategy,
+    divergence_events,
+    signal_state,
+    stoch_events,
+)
+
+# vectorised backtest for the signal generators, so a confidence can be backed by how the signals actually did
+#
+# the strategy is the simplest one the signals describe - long from the close of a buy signal to the close of the
+# next sell signal, flat otherwise. a trade still open at the end is marked to the last close and counted as open.
+# everything is whole array numpy, no stepping through bars
+#
+# cost is a fraction of the price paid on every entry and every exit (0.001 = 10bps each way)
+
+
+# signal generators - each takes an IndicatorFrame and the ta_algo, and returns a BUY/SELL/0 signal array the length
+# of the frame. the same signals run_algo finds, without building the json friendly ta_data
+def ao_strategy_signal(frame, ta_algo):
+    # every signal the strategy gives, whichever direction the job's looking for - the backtest needs both to trade
+    strategy, _ = ao_strategy(ta_algo)
+    return ao_signal(frame.awesome_oscillator(**algo_windows(ta_algo)), strategy)
+
+
+def stoch_crossover_signal(frame, ta_algo):
+    return stoch_events(*frame.stoch(**algo_windows(ta_algo)))[0]
+
+
+def ad_divergence_signal(frame, ta_algo):
+    return divergence_events(
+        frame.df["Close"], frame.acc_dist(), **algo_windows(ta_algo)
+    )[0]
+
+
+SIGNAL_GENERATORS = {
+    "awesome-oscillator": ao_strategy_signal,
+    "stoch": stoch_crossover_signal,
+    "accumulation-distribution": ad_divergence_signal,
+}
+
+
+def forward_fill_prices(close):
+    # a nan close can't be traded at, so it takes the last good close. anything before the first one stays nan
+    close = np.asarray(close, dtype=float)
+    good = np.where(np.isfinite(close), np.arange(len(close)), -1)
+    np.maximum.accumulate(good, out=good)
+    return np.where(good >= 0, close[np.maximum(good, 0)], np.nan)
+
+
+def backtest(close, signal, cost=0.0):
+    # stats for trading signal over close. returns a json friendly dict
+    close = forward_fill_prices(close)
+    position = (signal_state(signal) == BUY).astype(np.int8)
+    # can't buy before there's a price
+    position[np.isnan(close)] = 0
+
+    changes = np.diff(position, prepend=0)
+    entries = np.flatnonzero(changes == 1)
+    exits = np.flatnonzero(changes == -1)
+    open_trade = len(entries) > len(exits)
+    if open_trade:
+        exits = np.append(exits, len(close) - 1)
+
+    # an open trade is marked to the last close without paying to get out
+    exit_costs = np.full(len(exits), 1 - cost)
+    if open_trade:
+        exit_costs[-1] = 1
+    trade_returns = close[exits] * exit_costs / (close[entries] * (1 + cost)) - 1
+    closed = trade_returns[:-1] if open_trade else trade_returns
+
+    # bar by bar equity - holding from one close to the next earns that bar's return, and every entry and exit pays
+    # cost. the first bar has nothing before it, so it earns nothing
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bar_returns = np.zeros(len(close))
+        bar_returns[1:] = position[:-1] * (close[1:] / close[:-1] - 1)
+    bar_returns = np.nan_to_num(bar_returns)
+    growth = 1 + bar_returns
+    growth[entries] /= 1 + cost
+    growth[exits[: len(exits) - open_trade]] *= 1 - cost
+    equity = np.cumprod(growth)
+    drawdown = equity / np.maximum.accumulate(equity) - 1 if len(equity) else equity
+
+    return {
+        "trades": int(len(trade_returns)),
+        "closed_trades": int(len(closed)),
+        "open_trade": bool(open_trade),
+        "hit_rate": float(np.mean(closed > 0)) if len(closed) else None,
+        "average_trade_return": float(np.mean(closed)) if len(closed) else None,
+        "total_return": float(equity[-1] - 1) if len(equity) else 0.0,
+        "max_drawdown": float(drawdown.min()) if len(drawdown) else 0.0,
+        "exposure": float(position.mean()) if len(position) else 0.0,
+        "bars": int(len(close)),
+    }
+
+
+def has_signals(ta_algo):
+    return list(ta_algo.keys())[0] in SIGNAL_GENERATORS
+
+
+def backtest_algo(frame, ta_algo, cost=0.0):
+    # backtest one algo's signals over an IndicatorFrame, sharing whatever it has already worked out
+    selected_algo = list(ta_algo.keys())[0]
+    if selected_algo not in SIGNAL_GENERATORS:
+        raise ValueError(
+            f"Requested algorithm '{selected_algo}' has no signals to backtest"
+        )
+    signal = SIGNAL_GENERATORS[selected_algo](frame, ta_algo)
+    return backtest(frame.df["Close"].to_numpy(dtype=float), signal, cost)
+
+
+def backtest_frame(df, ta_algo, cost=0.0):
+    return backtest_algo(IndicatorFrame(df), ta_algo, cost)
+
+
+def backtest_chunk(frames, ta_algo, cost):
+    return {symbol: backtest_frame(df, ta_algo, cost) for symbol, df in frames.items()}
+
+
+def backtest_many(frames, ta_algo, cost=0.0, workers=None, chunk_size=50):
+    # backtest_frame for {symbol: frame}, spread over a process pool in chunks of chunk_size symbols. each symbol is
+    # cheap, so chunking keeps the pickling and scheduling from costing more than the maths. workers=1 runs here
+    workers = workers or os.cpu_count() or 1
+    symbols = list(frames)
+    chunks = [
+        {symbol: frames[symbol] for symbol in symbols[start : start + chunk_size]}
+        for start in range(0, len(symbols), chunk_size)
+    ]
+    if workers == 1 or len(chunks) <= 1:
+        return backtest_chunk(frames, ta_algo, cost)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        for chunk_results in pool.map(
+            backtest_chunk,
+            chunks,
+            [ta_algo] * len(chunks),
+            [cost] * len(chunks),
+        ):
+            results.update(chunk_results)
+    return results
@@ -0,0 +1,68 @@
+import numpy as np
+
+# rolling window highs and lows - rolling(window, min_periods=0).max()/.min() down a 1d array or each column of a 2d
+# one, with nans skipped (all nan windows come out nan), same as pandas and so the same as ta
+#
+# a window slid one bar at a time over and over is O(n*window). this is the van Herk/Gil-Werman trick instead: cut the
+# series into blocks of `window` bars and take a running max forwards and backwards inside each block. any window then
+# straddles at most one block boundary, so its max is the backwards max from its first bar to the end of that block
+# against the forwards max from the start of the next block to its last bar - three whole array passes, O(n) whatever
+# the window, and exact since max doesn't round. incremental.RollingExtreme is the same thing one bar at a time
+#
+# anything that wants window extremes should come through here - stochastic %K today, williams %R or donchian
+# channels are the same highest high/lowest low
+
+
+def rolling_extreme(values, window, highest=True):
+    values = np.asarray(values, dtype=float)
+    reduce = np.fmax if highest else np.fmin
+    rows = len(values)
+    if rows == 0 or window <= 1:
+        return values.copy()
+
+    columns = values.reshape(rows, -1)
+    # nan in front so the first bars see a partial window, and after so the blocks come out even
+    blocks = -(-(rows + window - 1) // window)
+    padded = np.full((blocks * window, columns.shape[1]), np.nan)
+    padded[window - 1 : window - 1 + rows] = columns
+    blocked = padded.reshape(blocks, window, -1)
+
+    # running max within each block, one block position at a time - window steps over every block at once, which is
+    # much quicker than ufunc.accumulate down the middle axis
+    forwards = blocked
+    backwards = blocked.copy()
+    for i in range(1, window):
+        reduce(forwards[:, i - 1], forwards[:, i], out=forwards[:, i])
+        reduce(backwards[:, -i], backwards[:, -i - 1], out=backwards[:, -i - 1])
+    forwards = forwards.reshape(padded.shape)
+    backwards = backwards.reshape(padded.shape)
+
+    # the window ending at padded row window - 1 + i starts at row i
+    return reduce(backwards[:rows], forwards[window - 1 : window - 1 + rows]).reshape(
+        values.shape
+    )
+
+
+def rolling_max(values, window):
+    return rolling_extreme(values, window, highest=True)
+
+
+def rolling_min(values, window):
+    return rolling_extreme(values, window, highest=False)
+
+
+def rolling_range(high, low, window):
+    # (highest high, lowest low) over the same window. the lows go in negated next to the highs so both come out of one
+    # pass over one array
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    both = rolling_max(np.column_stack([high, -low]), window)
+    columns = both.shape[1] // 2
+    return both[:, :columns].reshape(high.shape), -both[:, columns:].reshape(low.shape)
+
+
+def stochastic_k(high, low, close, window):
+    # unfilled %K - where close sits between the window's lowest low and highest high, 0 to 100
+    highest, lowest = rolling_range(high, low, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 * (np.asarray(close, dtype=float) - lowest) / (highest - lowest)
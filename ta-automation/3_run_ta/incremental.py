@@ -0,0 +1,407 @@
+import json
+import math
+import os
+from collections import deque
+import numpy as np
+from signals import BUY, SELL, ao_strategy
+
+# incremental (streaming) versions of the AO, stochastic and A/D indicators plus the AO crossover signal
+#
+# the full versions in indicators.py recompute everything over the whole history each run just to find out if the
+# last search_period bars have a signal in them. these keep the rolling state instead (SMA sums, min/max deques, the
+# running A/D total, the last crossover) so a re-scan only costs O(new bars). they give the same numbers as
+# IndicatorFrame over the same bars - partial windows at the start, nan aware rolling maths and the same fills
+#
+# the state for a symbol + resolution is saved as json in an object store between runs, see load_state/save_state
+
+# how many recent signals we keep around for the search_period lookback
+DEFAULT_HISTORY = 500
+
+INDICATOR_STATE_STORE = os.environ.get("INDICATOR_STATE_STORE")
+
+
+def streams_signals(ta_algo):
+    # whether ta_algo's signals are kept up to date here - only the AO crossover is. the AO patterns and the
+    # stochastic/A-D detectors in signals.py look back over the whole history, so jobs with those in them run in full
+    return (
+        list(ta_algo.keys())[0] == "awesome-oscillator"
+        and ao_strategy(ta_algo)[0] == "crossover"
+    )
+
+
+def is_nan(value):
+    return value is None or math.isnan(value)
+
+
+class Filler:
+    # streaming version of fill() in indicators.py - inf/nan carry the last good value forward, else the default
+    def __init__(self, default, last=None):
+        self.default = default
+        self.last = last
+
+    def push(self, value):
+        if is_nan(value) or math.isinf(value):
+            return self.default if self.last is None else self.last
+        self.last = value
+        return value
+
+    def to_dict(self):
+        return {"default": self.default, "last": self.last}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["default"], data["last"])
+
+
+class RollingMean:
+    # rolling(window, min_periods=0).mean() one value at a time. nans take up a slot but don't count
+    def __init__(self, window, values=None):
+        self.window = window
+        self.values = deque(values or [], maxlen=window)
+        finite = [value for value in self.values if not is_nan(value)]
+        self.total = math.fsum(finite)
+        self.count = len(finite)
+
+    def push(self, value):
+        if len(self.values) == self.window:
+            leaving = self.values[0]
+            if not is_nan(leaving):
+                self.total -= leaving
+                self.count -= 1
+        self.values.append(value)
+        if not is_nan(value):
+            self.total += value
+            self.count += 1
+
+        if self.count == 0:
+            return math.nan
+        return self.total / self.count
+
+    def to_dict(self):
+        return {"window": self.window, "values": list(self.values)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["window"], data["values"])
+
+
+class RollingExtreme:
+    # rolling(window, min_periods=0).max() (or .min()) one value at a time, with a monotonic deque of
+    # (position, value) so each bar is pushed and popped at most once
+    def __init__(self, window, highest=True, position=0, candidates=None):
+        self.window = window
+        self.highest = highest
+        self.position = position
+        self.candidates = deque(tuple(c) for c in (candidates or []))
+
+    def beats(self, new, old):
+        return new >= old if self.highest else new <= old
+
+    def push(self, value):
+        if not is_nan(value):
+            while self.candidates and self.beats(value, self.candidates[-1][1]):
+                self.candidates.pop()
+            self.candidates.append((self.position, value))
+
+        # drop anything that's slid out of the window
+        while self.candidates and self.candidates[0][0] <= self.position - self.window:
+            self.candidates.popleft()
+        self.position += 1
+
+        if not self.candidates:
+            return math.nan
+        return self.candidates[0][1]
+
+    def to_dict(self):
+        return {
+            "window": self.window,
+            "highest": self.highest,
+            "position": self.position,
+            "candidates": [list(c) for c in self.candidates],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["window"], data["highest"], data["position"], data["candidates"]
+        )
+
+
+class StreamingAO:
+    def __init__(self, window1=5, window2=34, short=None, long=None, filler=None):
+        self.short = short or RollingMean(window1)
+        self.long = long or RollingMean(window2)
+        self.filler = filler or Filler(0)
+
+    def push(self, high, low):
+        median = 0.5 * (high + low)
+        return self.filler.push(self.short.push(median) - self.long.push(median))
+
+    def to_dict(self):
+        return {
+            "short": self.short.to_dict(),
+            "long": self.long.to_dict(),
+            "filler": self.filler.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            short=RollingMean.from_dict(data["short"]),
+            long=RollingMean.from_dict(data["long"]),
+            filler=Filler.from_dict(data["filler"]),
+        )
+
+
+class StreamingStochastic:
+    def __init__(
+        self,
+        window=14,
+        smooth_window=3,
+        highest=None,
+        lowest=None,
+        signal=None,
+        k_filler=None,
+        d_filler=None,
+    ):
+        self.highest = highest or RollingExtreme(window, highest=True)
+        self.lowest = lowest or RollingExtreme(window, highest=False)
+        # %D smooths the unfilled %K, same as ta
+        self.signal = signal or RollingMean(smooth_window)
+        self.k_filler = k_filler or Filler(50)
+        self.d_filler = d_filler or Filler(50)
+
+    def push(self, high, low, close):
+        highest = self.highest.push(high)
+        lowest = self.lowest.push(low)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            raw = float(
+                np.float64(100) * (close - lowest) / np.float64(highest - lowest)
+            )
+        return self.k_filler.push(raw), self.d_filler.push(self.signal.push(raw))
+
+    def to_dict(self):
+        return {
+            "highest": self.highest.to_dict(),
+            "lowest": self.lowest.to_dict(),
+            "signal": self.signal.to_dict(),
+            "k_filler": self.k_filler.to_dict(),
+            "d_filler": self.d_filler.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            highest=RollingExtreme.from_dict(data["highest"]),
+            lowest=RollingExtreme.from_dict(data["lowest"]),
+            signal=RollingMean.from_dict(data["signal"]),
+            k_filler=Filler.from_dict(data["k_filler"]),
+            d_filler=Filler.from_dict(data["d_filler"]),
+        )
+
+
+class StreamingAccDist:
+    def __init__(self, total=0.0, filler=None):
+        self.total = total
+        self.filler = filler or Filler(0)
+
+    def push(self, high, low, close, volume):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            clv = float(
+                np.float64((close - low) - (high - close)) / np.float64(high - low)
+            )
+        if math.isnan(clv):
+            clv = 0.0
+        flow = clv * volume
+        # cumsum skips nans but still reports nan at that bar
+        if is_nan(flow):
+            return self.filler.push(math.nan)
+        self.total += flow
+        return self.filler.push(self.total)
+
+    def to_dict(self):
+        return {"total": self.total, "filler": self.filler.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["total"], Filler.from_dict(data["filler"]))
+
+
+class StreamingCrossover:
+    # the AO crossover signal from signals.py, one bar at a time
+    def __init__(
+        self, history=DEFAULT_HISTORY, previous=None, last_event=0, recent=None
+    ):
+        self.history = history
+        self.previous = previous
+        self.last_event = last_event
+        self.recent = deque(recent or [], maxlen=history)
+
+    def push(self, value):
+        event = 0
+        if self.previous is not None:
+            if value > 0 and self.previous < 0:
+                event = BUY
+            elif value < 0 and self.previous > 0:
+                event = SELL
+        self.previous = value
+
+        signal = 0
+        if event != 0 and event != self.last_event:
+            signal = event
+            self.last_event = event
+        self.recent.append(signal)
+        return signal
+
+    def found(self, search_period, value=BUY):
+        recent = list(self.recent)
+        return value in recent[-search_period:]
+
+    def to_dict(self):
+        return {
+            "history": self.history,
+            "previous": self.previous,
+            "last_event": self.last_event,
+            "recent": list(self.recent),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["history"], data["previous"], data["last_event"], data["recent"]
+        )
+
+
+class IndicatorState:
+    # everything we carry between runs for one symbol + resolution
+    def __init__(self, history=DEFAULT_HISTORY):
+        # the first bar and the last one we've pushed, epoch ms
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.bars = 0
+        self.ao = StreamingAO()
+        self.stoch = StreamingStochastic()
+        self.acc_dist = StreamingAccDist()
+        self.crossover = StreamingCrossover(history)
+        self.latest = {}
+
+    def push(self, timestamp, high, low, close, volume):
+        ao = self.ao.push(high, low)
+        stoch, stoch_signal = self.stoch.push(high, low, close)
+        acc_dist = self.acc_dist.push(high, low, close, volume)
+        signal = self.crossover.push(ao)
+
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+        self.bars += 1
+        self.latest = {
+            "awesome-oscillator": ao,
+            "awesome-oscillator-signal": signal,
+            "stoch": stoch,
+            "stoch_signal": stoch_signal,
+            "accumulation-distribution": acc_dist,
+        }
+        return self.latest
+
+    def to_dict(self):
+        return {
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+            "bars": self.bars,
+            "ao": self.ao.to_dict(),
+            "stoch": self.stoch.to_dict(),
+            "acc_dist": self.acc_dist.to_dict(),
+            "crossover": self.crossover.to_dict(),
+            "latest": self.latest,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        # states saved before the first bar was kept don't have one, and get rebuilt
+        state.first_timestamp = data.get("first_timestamp")
+        state.last_timestamp = data["last_timestamp"]
+        state.bars = data["bars"]
+        state.ao = StreamingAO.from_dict(data["ao"])
+        state.stoch = StreamingStochastic.from_dict(data["stoch"])
+        state.acc_dist = StreamingAccDist.from_dict(data["acc_dist"])
+        state.crossover = StreamingCrossover.from_dict(data["crossover"])
+        state.latest = data["latest"]
+        return state
+
+    def copy(self):
+        return IndicatorState.from_dict(json.loads(json.dumps(self.to_dict())))
+
+
+def bar_timestamps(df):
+    # epoch ms, which is what goes in the saved state
+    return df.index.values.astype("datetime64[ms]").astype(np.int64)
+
+
+def advance(state, df, history=DEFAULT_HISTORY):
+    # bring the state up to the end of df. returns (live state, checkpoint state, bars processed)
+    #
+    # the last bar of a query is often still forming (today's daily bar, the current minute), so the checkpoint we
+    # save is taken *before* the last bar and the next run replays it. the live state includes it and is what the
+    # current run reports from
+    #
+    # if the saved state doesn't line up with df we can't trust it, so we start again from the start of df. that's
+    # when df doesn't include the bar we stopped at, and also when it doesn't start where the state did - a job whose
+    # date_from has moved. the full run's windows fill up from df's first bar and its crossover only dedupes against
+    # signals from there on, so carrying on from the older bars would give a different answer. jobs with a fixed
+    # date_from (and a date_to that keeps moving) are the ones that stay incremental
+    timestamps = bar_timestamps(df)
+    # a checkpoint from a run with a single bar hasn't seen any bars yet, so it starts from the beginning too
+    start = 0
+    if state is not None and state.last_timestamp is not None:
+        position = np.searchsorted(timestamps, state.last_timestamp)
+        if (
+            position < len(timestamps)
+            and timestamps[position] == state.last_timestamp
+            and state.first_timestamp == timestamps[0]
+        ):
+            start = position + 1
+        else:
+            state = None
+    if state is None:
+        state = IndicatorState(history)
+
+    high = df["High"].to_numpy(dtype=float)
+    low = df["Low"].to_numpy(dtype=float)
+    close = df["Close"].to_numpy(dtype=float)
+    volume = df["Volume"].to_numpy(dtype=float)
+
+    processed = len(timestamps) - start
+    checkpoint = state
+    for i in range(start, len(timestamps)):
+        if i == len(timestamps) - 1:
+            checkpoint = state.copy()
+        state.push(
+            int(timestamps[i]),
+            float(high[i]),
+            float(low[i]),
+            float(close[i]),
+            float(volume[i]),
+        )
+
+    return state, checkpoint, processed
+
+
+def state_key(symbol, resolution):
+    return f"{symbol.lower()}/{resolution}.json"
+
+
+def load_state(store, symbol, resolution):
+    key = state_key(symbol, resolution)
+    if not store.exists(key):
+        return None
+    return IndicatorState.from_dict(json.loads(store.get(key)))
+
+
+def save_state(store, symbol, resolution, state):
+    store.put(
+        state_key(symbol, resolution),
+        json.dumps(state.to_dict()).encode("utf-8"),
+        content_type="application/json",
+    )
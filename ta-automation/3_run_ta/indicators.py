@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+from extrema import rolling_range
+from ta_common.algo_params import ALGO_WINDOWS, algo_windows, has_custom_windows
+
+# indicators computed straight from one parsed frame, with intermediates shared between them
+# the maths is the same as the ta library's AwesomeOscillatorIndicator, StochasticOscillator and AccDistIndexIndicator
+# with fillna=True (partial windows at the start, inf/nan filled with the same values) - we just don't rebuild the
+# rolling windows for every indicator that wants them, or build StochasticOscillator twice to get %K and %D
+
+
+def fill(series, value):
+    # same as ta's _check_fillna - gaps carry the last good value forward, anything before that gets the default
+    return series.replace([np.inf, -np.inf], np.nan).ffill().fillna(value)
+
+
+class IndicatorFrame:
+    def __init__(self, df):
+        self.df = df
+        self._cache = {}
+
+    def cached(self, key, build):
+        # anything expensive goes through here, so the second algo to ask for it gets it for free
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def median_price(self):
+        return self.cached(
+            ("median-price",), lambda: 0.5 * (self.df["High"] + self.df["Low"])
+        )
+
+    def sma(self, series_name, window):
+        # min_periods=0 so the start of the series is averaged over what we have, same as ta with fillna=True
+        def build():
+            if series_name == "median-price":
+                series = self.median_price()
+            else:
+                series = self.df[series_name]
+            return series.rolling(window, min_periods=0).mean()
+
+        return self.cached(("sma", series_name, window), build)
+
+    def rolling_range(self, window):
+        # (highest high, lowest low) over the window, both out of one pass - see extrema.py
+        def build():
+            highest, lowest = rolling_range(self.df["High"], self.df["Low"], window)
+            return (
+                pd.Series(highest, index=self.df.index),
+                pd.Series(lowest, index=self.df.index),
+            )
+
+        return self.cached(("rolling-range", window), build)
+
+    def rolling_high(self, window):
+        return self.rolling_range(window)[0]
+
+    def rolling_low(self, window):
+        return self.rolling_range(window)[1]
+
+    def awesome_oscillator(self, window1=5, window2=34):
+        def build():
+            ao = self.sma("median-price", window1) - self.sma("median-price", window2)
+            return fill(ao, 0)
+
+        return self.cached(("awesome-oscillator", window1, window2), build)
+
+    def stoch_raw(self, window=14):
+        # %K before any filling. %D is smoothed from this rather than the filled version, same as ta
+        def build():
+            lowest = self.rolling_low(window)
+            highest = self.rolling_high(window)
+            return 100 * (self.df["Close"] - lowest) / (highest - lowest)
+
+        return self.cached(("stoch-raw", window), build)
+
+    def stoch(self, window=14, smooth_window=3):
+        # returns (%K, %D)
+        def build():
+            raw = self.stoch_raw(window)
+            signal = raw.rolling(smooth_window, min_periods=0).mean()
+            return fill(raw, 50), fill(signal, 50)
+
+        return self.cached(("stoch", window, smooth_window), build)
+
+    def acc_dist(self):
+        def build():
+            high = self.df["High"]
+            low = self.df["Low"]
+            close = self.df["Close"]
+            clv = ((close - low) - (high - close)) / (high - low)
+            clv = clv.fillna(0.0)
+            return fill((clv * self.df["Volume"]).cumsum(), 0)
+
+        return self.cached(("accumulation-distribution",), build)
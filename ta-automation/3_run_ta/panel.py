@@ -0,0 +1,233 @@
+import numpy as np
+from extrema import stochastic_k
+from signals import AO_STRATEGIES, BUY, SELL, divergence_events, stoch_events
+
+# panel TA - the same indicators and AO crossover as indicators.py/signals.py, for a lot of symbols at once
+#
+# each OHLCV column is stacked into one (bar, symbol) array, so every rolling window, fill and crossover runs once
+# over the whole panel instead of once per symbol on a small DataFrame, where the pandas overhead is most of the cost
+#
+# rows are bar positions rather than shared timestamps. symbols on different exchanges (or crypto, which trades every
+# day) don't share a calendar, and the indicators count each symbol's own bars, so lining them up on timestamps would
+# put holes in the windows. instead every column is right aligned - the last row is each symbol's latest bar - and a
+# symbol with a shorter history is padded with nan at the top. `valid` marks the real bars. nan already means
+# "doesn't count" in the rolling maths (same as pandas with min_periods=0), so the padding drops out by itself and the
+# results match the per symbol path
+
+PANEL_COLUMNS = ("High", "Low", "Close", "Volume")
+
+
+def prefix_sums(values):
+    # running totals (and counts of the values that aren't nan) down each column. any rolling mean of values is a
+    # difference of two rows of these, so one pass serves every window - see window_mean
+    finite = ~np.isnan(values)
+    return np.cumsum(np.where(finite, values, 0.0), axis=0), np.cumsum(finite, axis=0)
+
+
+def rolling_mean(values, window):
+    # rolling(window, min_periods=0).mean() down each column. nans take up a slot but don't count
+    return window_mean(prefix_sums(values), window)
+
+
+def window_mean(prefix, window):
+    sums, counts = prefix
+    window_sums = sums.copy()
+    window_sums[window:] -= sums[:-window]
+    window_counts = counts.copy()
+    window_counts[window:] -= counts[:-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(window_counts > 0, window_sums / window_counts, np.nan)
+
+
+def fill_columns(values, default):
+    # fill() from indicators.py down each column - inf/nan carry the last good value forward, anything before that
+    # gets the default
+    values = np.where(np.isinf(values), np.nan, values)
+    rows = np.arange(len(values))[:, None]
+    last_good = np.where(~np.isnan(values), rows, -1)
+    np.maximum.accumulate(last_good, axis=0, out=last_good)
+    filled = np.take_along_axis(values, np.maximum(last_good, 0), axis=0)
+    return np.where(last_good >= 0, filled, default)
+
+
+def crossover_signal_columns(series, valid):
+    # crossover_signal from signals.py down each column. a crossing needs a real bar on both sides of it
+    events = np.zeros(series.shape, dtype=np.int8)
+    if len(series) < 2:
+        return events
+
+    previous = series[:-1]
+    current = series[1:]
+    events[1:][(current > 0) & (previous < 0)] = BUY
+    events[1:][(current < 0) & (previous > 0)] = SELL
+    events = paired(events, valid)
+
+    return dedupe_columns(events)
+
+
+def dedupe_columns(events):
+    # dedupe_events from signals.py down each column - an event only counts when it differs from the previous event
+    # in the same column
+    if len(events) == 0:
+        return events.astype(np.int8)
+    rows = np.arange(len(events))[:, None]
+    last_fired = np.where(events != 0, rows, -1)
+    np.maximum.accumulate(last_fired, axis=0, out=last_fired)
+    previous_fired = np.vstack([np.full((1, events.shape[1]), -1), last_fired[:-1]])
+    previous_event = np.where(
+        previous_fired >= 0,
+        np.take_along_axis(events, np.maximum(previous_fired, 0), axis=0),
+        0,
+    )
+    return np.where((events != 0) & (events != previous_event), events, 0).astype(
+        np.int8
+    )
+
+
+def paired(events, valid):
+    # events that need the bar before - drop any without a real bar on both sides
+    events[1:][~(valid[:-1] & valid[1:])] = 0
+    return events
+
+
+class Panel:
+    def __init__(self, frames):
+        # frames is {symbol: DataFrame} - parsed symbol data, one frame per symbol
+        self.symbols = list(frames)
+        self.lengths = np.array([len(frame) for frame in frames.values()], dtype=int)
+        rows = int(self.lengths.max()) if len(self.lengths) else 0
+        self.valid = np.arange(rows)[:, None] >= (rows - self.lengths)[None, :]
+
+        self.columns = {}
+        for column in PANEL_COLUMNS:
+            stacked = np.full((rows, len(self.symbols)), np.nan)
+            for i, frame in enumerate(frames.values()):
+                if self.lengths[i]:
+                    stacked[rows - self.lengths[i] :, i] = frame[column].to_numpy(
+                        dtype=float
+                    )
+            self.columns[column] = stacked
+        self._cache = {}
+
+    def cached(self, key, build):
+        # same idea as IndicatorFrame.cached - the second algo to want something gets it for free
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def median_price(self):
+        return self.cached(
+            ("median-price",),
+            lambda: 0.5 * (self.columns["High"] + self.columns["Low"]),
+        )
+
+    def sma_median_price(self, window):
+        # every window comes off the same prefix sums
+        return self.cached(
+            ("sma", "median-price", window),
+            lambda: window_mean(
+                self.cached(
+                    ("prefix-sums", "median-price"),
+                    lambda: prefix_sums(self.median_price()),
+                ),
+                window,
+            ),
+        )
+
+    def awesome_oscillator(self, window1=5, window2=34):
+        def build():
+            ao = self.sma_median_price(window1) - self.sma_median_price(window2)
+            return fill_columns(ao, 0)
+
+        return self.cached(("awesome-oscillator", window1, window2), build)
+
+    def ao_signal(self, window1=5, window2=34, strategy="crossover"):
+        # ao_signal from signals.py down each column. the patterns are worked out with the padding as nan, so none of
+        # them can be made out of bars a symbol doesn't have
+        def build():
+            ao = self.awesome_oscillator(window1, window2)
+            if strategy == "crossover":
+                return crossover_signal_columns(ao, self.valid)
+            return AO_STRATEGIES[strategy](np.where(self.valid, ao, np.nan))
+
+        return self.cached(
+            ("awesome-oscillator-signal", window1, window2, strategy), build
+        )
+
+    def stoch(self, window=14, smooth_window=3):
+        # returns (%K, %D)
+        def build():
+            raw = stochastic_k(
+                self.columns["High"], self.columns["Low"], self.columns["Close"], window
+            )
+            signal = rolling_mean(raw, smooth_window)
+            return fill_columns(raw, 50), fill_columns(signal, 50)
+
+        return self.cached(("stoch", window, smooth_window), build)
+
+    def acc_dist(self):
+        def build():
+            high = self.columns["High"]
+            low = self.columns["Low"]
+            close = self.columns["Close"]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                clv = ((close - low) - (high - close)) / (high - low)
+            clv = np.where(np.isnan(clv), 0.0, clv)
+            flow = clv * self.columns["Volume"]
+            # like pandas cumsum, a nan bar stays nan but doesn't stop the running total
+            total = np.cumsum(np.where(np.isnan(flow), 0.0, flow), axis=0)
+            total[np.isnan(flow)] = np.nan
+            return fill_columns(total, 0)
+
+        return self.cached(("accumulation-distribution",), build)
+
+    def stoch_crossover(self, window=14, smooth_window=3):
+        # returns (signal, strength), see stoch_events in signals.py
+        def build():
+            events, strength = stoch_events(*self.stoch(window, smooth_window))
+            return paired(events, self.valid), strength
+
+        return self.cached(("stoch-crossover", window, smooth_window), build)
+
+    def ad_divergence(self, window=20):
+        # returns (signal, strength), see divergence_events in signals.py. the padding goes back to nan first - A/D
+        # fills it with 0, which would count as a low
+        def build():
+            acc_dist = np.where(self.valid, self.acc_dist(), np.nan)
+            events, strength = divergence_events(
+                self.columns["Close"], acc_dist, window
+            )
+            return paired(events, self.valid), strength
+
+        return self.cached(("accumulation-distribution-divergence", window), build)
+
+    def graded_confidence(self, signal, strength, search_period):
+        # graded_confidence from signals.py for every symbol, as a list
+        rows = np.arange(len(signal))[:, None]
+        in_window = rows >= len(signal) - search_period if search_period else True
+        buys = (signal == BUY) & in_window & self.valid
+        latest = np.where(buys, rows, -1).max(axis=0, initial=-1)
+        return [
+            0 if row < 0 else 5 + 5 * float(strength[row, i])
+            for i, row in enumerate(latest)
+        ]
+
+    def signal_found(self, signal, search_period, value=BUY):
+        # signal_found from signals.py for every symbol - did value fire in its last search_period bars. as there,
+        # search_period=0 means the whole history
+        rows = len(signal)
+        if search_period:
+            in_window = np.arange(rows)[:, None] >= rows - search_period
+        else:
+            in_window = np.ones((rows, 1), dtype=bool)
+        return np.any((signal == value) & in_window & self.valid, axis=0)
+
+    def latest(self, values):
+        # each symbol's value at its last bar, None for a symbol with no bars or a nan
+        if len(values) == 0:
+            return [None] * len(self.symbols)
+        last = values[-1]
+        return [
+            None if length == 0 or np.isnan(value) else value.item()
+            for length, value in zip(self.lengths, last)
+        ]
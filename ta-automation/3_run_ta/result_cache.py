@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from ta_common.fingerprint import combine, params_fingerprint, payload_fingerprint
+from ta_common.instrumentation import record, span
+from ta_common.object_store import object_store_from_url
+
+# result cache for run TA
+#
+# the same job (symbol, resolution, dates, algo and its parameters) turns up over and over - slack requests, the
+# scheduled scans - and the bars usually haven't changed in between. results are cached against a fingerprint of the
+# symbol data as it arrives in the payload plus the parameters that change the answer, so a repeat is answered
+# before the data is even parsed, let alone run through the indicators. that fingerprint is the claim check pointer,
+# which is content addressed - payloads with the data inline aren't cached, hashing all of it every time would cost
+# close to what a hit saves
+#
+# two tiers. an LRU in memory, bounded by the results' json size, which warm containers keep between invocations.
+# and optionally an object store shared between containers - RESULT_CACHE_STORE, s3://bucket/prefix or a local path
+# (eg an EFS mount), where results are kept as json. a memory hit hands back the very result it cached, without
+# copying it - nothing changes a result once run TA has returned it, it only gets serialised. the memory tier is
+# locked, since the local runner shares it between threads
+
+RESULT_CACHE_STORE = os.environ.get("RESULT_CACHE_STORE")
+
+# the memory tier's budget. 0 turns it off
+RESULT_CACHE_MB = float(os.environ.get("RESULT_CACHE_MB", "64"))
+
+# bump this whenever what run TA returns changes, so old results aren't reused
+RESULT_VERSION = 4
+
+# everything in a payload that changes the answer, apart from the data itself
+RESULT_PARAMS = (
+    "symbol",
+    "symbols",
+    "resolution",
+    "resolutions",
+    "date_from",
+    "date_to",
+    "search_period",
+    "ta_algo",
+    "ta_algos",
+    "backtest",
+    "backtest_cost",
+    "ta_output",
+    "ta_window",
+)
+
+
+def result_key(payload):
+    # None if the payload can't be cached
+    if "symbols" in payload:
+        # panel mode - every symbol's data, in the order they were asked for. symbols that failed to fetch aren't
+        # there at all
+        parts = []
+        for symbol in payload["symbols"]:
+            symbol_data = payload["symbol_data"].get(symbol)
+            fingerprint = "missing"
+            if symbol_data is not None:
+                fingerprint = payload_fingerprint(symbol_data)
+                if fingerprint is None:
+                    return None
+            parts.append(f"{symbol}:{fingerprint}")
+        data = combine(*parts)
+    else:
+        data = payload_fingerprint(payload["symbol_data"])
+        if data is None:
+            return None
+    params = params_fingerprint({name: payload.get(name) for name in RESULT_PARAMS})
+    return combine(RESULT_VERSION, data, params)
+
+
+class ResultCache:
+    def __init__(self, max_bytes, store=None):
+        self.max_bytes = max_bytes
+        self.store = store
+        # key -> (result, json size), least recently used first
+        self.entries = OrderedDict()
+        self.size = 0
+        self.stats = {"hits": 0, "store_hits": 0, "misses": 0, "evictions": 0}
+        self.lock = threading.Lock()
+
+    def count(self, name):
+        self.stats[name] += 1
+        record(f"result_cache_{name}", 1)
+
+    def get(self, key):
+        # the cached result, or None
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.count("hits")
+                return self.entries[key][0]
+
+        if self.store is not None:
+            with span("result_cache_load"):
+                body = self.store.get(key) if self.store.exists(key) else None
+            if body is not None:
+                with self.lock:
+                    self.count("store_hits")
+                result = json.loads(body)
+                self.remember(key, result, len(body))
+                return result
+
+        with self.lock:
+            self.count("misses")
+        return None
+
+    def put(self, key, result):
+        body = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        if self.store is not None:
+            with span("result_cache_save"):
+                self.store.put(key, body, content_type="application/json")
+        self.remember(key, result, len(body))
+
+    def remember(self, key, result, size):
+        # anything bigger than the whole budget only goes in the store
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (result, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+                self.count("evictions")
+
+
+def result_cache_from_env():
+    store = object_store_from_url(RESULT_CACHE_STORE) if RESULT_CACHE_STORE else None
+    if RESULT_CACHE_MB <= 0 and store is None:
+        return None
+    return ResultCache(int(max(RESULT_CACHE_MB, 0) * 1024 * 1024), store)
+
+
+def cached_result(cache, payload, run):
+    # run() unless cache already has the answer for payload. no cache (or a payload it can't key), no caching
+    if cache is None:
+        return run()
+
+    key = result_key(payload)
+    if key is None:
+        return run()
+    result = cache.get(key)
+    if result is None:
+        result = run()
+        cache.put(key, result)
+    return result
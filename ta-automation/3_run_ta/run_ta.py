@@ -1,68 +1,57 @@
-import pandas as pd
-import json
-from ta.momentum import AwesomeOscillatorIndicator
-from ta.momentum import StochasticOscillator
-from ta.volume import AccDistIndexIndicator
-
-# shamelessly stolen from https://medium.com/codex/bitcoin-trade-automation-with-awesome-oscillator-in-python-51f2c52c5b25
-def implement_ao_crossover(price, ao):
-    import numpy as np
-
-    buy_price = []
-    sell_price = []
-    ao_signal = []
-    signal = 0
-
-    for i in range(len(ao)):
-        if ao[i] > 0 and ao[i - 1] < 0:
-            if signal != 1:
-                buy_price.append(price[i])
-                sell_price.append(None)
-                signal = 1
-                ao_signal.append(signal)
-            else:
-                buy_price.append(None)
-                sell_price.append(None)
-                ao_signal.append(0)
-        elif ao[i] < 0 and ao[i - 1] > 0:
-            if signal != -1:
-                buy_price.append(None)
-                sell_price.append(price[i])
-                signal = -1
-                ao_signal.append(signal)
-            else:
-                buy_price.append(None)
-                sell_price.append(None)
-                ao_signal.append(0)
-        else:
-            buy_price.append(None)
-            sell_price.append(None)
-            ao_signal.append(0)
-    return buy_price, sell_price, ao_signal
+import os
+from result_cache import cached_result, result_cache_from_env
+from ta_common.instrumentation import instrumented, record, span
 
+# numpy and pandas (via indicators, signals, incremental and ta_common.symbol_data) are imported where they're used
+# rather than up here, so a cold start that's going to fail on a bad algo name doesn't pay for them first
 
-def lambda_handler(event, context):
+KNOWN_ALGOS = ("awesome-oscillator", "stoch", "accumulation-distribution")
+
+# what ta_data looks like in the response, for jobs that don't say - "full" (every series, full length) or "compact"
+# (the last TA_WINDOW bars of each series plus the signals as sparse events, see ta_common/ta_output.py)
+TA_OUTPUTS = ("full", "compact")
+TA_OUTPUT = os.environ.get("TA_OUTPUT", "full")
+TA_WINDOW = int(os.environ.get("TA_WINDOW", "250"))
+
+# repeat jobs over unchanged data are answered from here, see result_cache.py. kept for as long as the container is
+result_cache = result_cache_from_env()
+
+
+def check_algos(ta_algos):
+    # fail before we've loaded anything
+    for ta_algo in ta_algos:
+        selected_algo = list(ta_algo.keys())[0]
+        if selected_algo not in KNOWN_ALGOS:
+            raise ValueError(
+                f"Requested algorithm '{selected_algo}' is invalid/not implemented"
+            )
+
+
+# run a single algo against an already parsed frame and return {"confidence": x, "ta_data": y}
+# anything the algos have in common (rolling windows etc) is shared through the IndicatorFrame
+def run_algo(frame, ta_algo, search_period):
     # default confidence level
     confidence = 0
     return_data = {}
-
-    # don't ask me why i need to stringify the json for read_json to be able to read it. whatever trevor.
-    df_json = json.dumps(event["Payload"]["symbol_data"])
-    df = pd.read_json(df_json)
+    df = frame.df
 
     # easy reference to the name of the algo key in the payload
-    selected_algo = list(event["Payload"]["ta_algo"].keys())[0]
+    selected_algo = list(ta_algo.keys())[0]
 
     if selected_algo == "awesome-oscillator":
-        # i wish the documentation for this library was even semi existent. it would make life better.
-        df["awesome-oscillator"] = AwesomeOscillatorIndicator(
-            high=df["High"], low=df["Low"], window1=5, window2=34, fillna=True
-        ).awesome_oscillator()
+        from indicators import algo_windows
+        from signals import DIRECTIONS, ao_strategy, implement_ao_strategy, signal_found
+
+        strategy, direction = ao_strategy(ta_algo)
+
+        with span("indicator"):
+            df["awesome-oscillator"] = frame.awesome_oscillator(**algo_windows(ta_algo))
 
         # data series for buy/sell price when we'd want to do those things, and signal marking those positions with a 1 or 0
-        buy, sell, signal = implement_ao_crossover(
-            df["Close"], df["awesome-oscillator"]
-        )
+        with span("signal_search"):
+            buy, sell, signal = implement_ao_strategy(
+                df["Close"], df["awesome-oscillator"], strategy
+            )
         # put it into a dict
         data = {
             "awesome-oscillator-buy-price": buy,
@@ -71,54 +60,59 @@ def lambda_handler(event, context):
             "awesome-oscillator": df["awesome-oscillator"].values.tolist(),
         }
 
-        # look at the requested search period to see if we found a signal
-        found = False
-        for signal in data["awesome-oscillator-signal"][
-            -event["Payload"]["search_period"] :
-        ]:
-            if signal == 1:
-                found = True
-
-        if found:
-            confidence = 10
+        # look at the requested search period to see if we found a signal in the direction we're after
+        with span("signal_search"):
+            if signal_found(signal, search_period, DIRECTIONS[direction]):
+                confidence = 10
 
         return_data["confidence"] = confidence
         return_data["ta_data"] = data
 
-        # return json.dumps(return_data)
-        # return {"ta_confidence": confidence, "ta_data": data}
-
     elif selected_algo == "stoch":
-        df["stoch"] = StochasticOscillator(
-            close=df["Close"],
-            high=df["High"],
-            low=df["Low"],
-            fillna=True,
-        ).stoch()
-        df["stoch_signal"] = StochasticOscillator(
-            close=df["Close"],
-            high=df["High"],
-            low=df["Low"],
-            fillna=True,
-        ).stoch_signal()
-
-        # not implemented yet
-        confidence = 10
+        from indicators import algo_windows
+        from signals import graded_confidence, stoch_events
+
+        # one pass gives both %K and %D
+        with span("indicator"):
+            df["stoch"], df["stoch_signal"] = frame.stoch(**algo_windows(ta_algo))
+
+        # %K crossing %D on the way out of oversold/overbought, graded by how deep into the zone it was. every
+        # crossing counts - unlike the AO crossover it isn't a buy/sell state machine, so two buys in a row are two
+        # signals and the latest one is graded
+        with span("signal_search"):
+            signal, strength = stoch_events(df["stoch"], df["stoch_signal"])
+            confidence = graded_confidence(signal, strength, search_period)
+
+        # no buy/sell price series - generate graph marks the signals on the close itself
         return_data["confidence"] = confidence
-        return_data["ta_data"] = None
+        return_data["ta_data"] = {
+            "stoch": df["stoch"].values.tolist(),
+            "stoch_signal": df["stoch_signal"].values.tolist(),
+            "stoch-crossover": signal.tolist(),
+        }
 
     elif selected_algo == "accumulation-distribution":
-        df["accumulation-distribution"] = AccDistIndexIndicator(
-            close=df["Close"],
-            high=df["High"],
-            low=df["Low"],
-            volume=df["Volume"],
-            fillna=True,
-        ).acc_dist_index()
-        # not implemented yet
-        confidence = 10
+        from indicators import algo_windows
+        from signals import divergence_events, graded_confidence
+
+        with span("indicator"):
+            df["accumulation-distribution"] = frame.acc_dist()
+
+        # price making a new low (high) over the window while A/D doesn't, graded by how far A/D held off its own.
+        # every divergence counts, same as the stochastic
+        with span("signal_search"):
+            signal, strength = divergence_events(
+                df["Close"], df["accumulation-distribution"], **algo_windows(ta_algo)
+            )
+            confidence = graded_confidence(signal, strength, search_period)
+
         return_data["confidence"] = confidence
-        return_data["ta_data"] = None
+        return_data["ta_data"] = {
+            "accumulation-distribution": df[
+                "accumulation-distribution"
+            ].values.tolist(),
+            "accumulation-distribution-divergence": signal.tolist(),
+        }
 
     else:
         raise ValueError(
@@ -131,6 +125,371 @@ def lambda_handler(event, context):
     return return_data
 
 
+# incremental version of run_algo. the indicators have already been brought up to date in state, so all that's
+# left is reading the answer out of it. there's no full length ta_data in this mode, so nothing to graph
+def run_algo_incremental(state, ta_algo, search_period):
+    selected_algo = list(ta_algo.keys())[0]
+
+    if selected_algo == "awesome-oscillator":
+        from signals import DIRECTIONS, ao_strategy
+
+        _, direction = ao_strategy(ta_algo)
+        found = state.crossover.found(search_period, DIRECTIONS[direction])
+        confidence = 10 if found else 0
+    else:
+        raise ValueError(
+            f"Requested algorithm '{selected_algo}' has no incremental signals"
+        )
+
+    return {"confidence": confidence, "ta_data": None, "latest": state.latest}
+
+
+# load the saved indicator state for this symbol + resolution, bring it up to date with whatever bars are new in
+# df, and save the checkpoint for next time
+def update_indicator_state(df, payload):
+    from incremental import INDICATOR_STATE_STORE, advance, load_state, save_state
+    from ta_common.object_store import object_store_from_url
+
+    store = object_store_from_url(INDICATOR_STATE_STORE)
+    with span("state_load"):
+        state = load_state(store, payload["symbol"], payload["resolution"])
+    with span("indicator"):
+        live, checkpoint, processed = advance(state, df)
+    with span("state_save"):
+        save_state(store, payload["symbol"], payload["resolution"], checkpoint)
+    record("bars_processed", processed)
+    return live
+
+
+# the ta_data key each algo's signal series is under, for confluence. algos without one are scored on the average
+# of their per timeframe confidence instead
+SIGNAL_KEYS = {
+    "awesome-oscillator": "awesome-oscillator-signal",
+    "stoch": "stoch-crossover",
+    "accumulation-distribution": "accumulation-distribution-divergence",
+}
+
+
+# multi timeframe version of run_algo. runs the algo on every timeframe, puts each timeframe's signal state (the
+# direction of its most recent signal, if that's within the last search_period of the timeframe's own bars) onto the
+# base timeframe's bars, and scores how many timeframes point the way the job is after at the latest bar. a signal
+# older than that doesn't count, same as it wouldn't for the timeframe's own confidence
+def run_algo_confluence(frames, base_resolution, ta_algo, search_period):
+    from signals import BUY, DIRECTIONS, ao_strategy, signal_state
+    from timeframes import align_state
+
+    selected_algo = list(ta_algo.keys())[0]
+    # an AO job can be after bearish signals. the stochastic and A/D only grade buys
+    wanted = BUY
+    if selected_algo == "awesome-oscillator":
+        wanted = DIRECTIONS[ao_strategy(ta_algo)[1]]
+    base_index = frames[base_resolution].df.index
+
+    analyses = {}
+    aligned = {}
+    for resolution, frame in frames.items():
+        analyses[resolution] = run_algo(frame, ta_algo, search_period)
+        ta_data = analyses[resolution]["ta_data"]
+        if selected_algo in SIGNAL_KEYS and ta_data is not None:
+            with span("align"):
+                state = signal_state(ta_data[SIGNAL_KEYS[selected_algo]], search_period)
+                aligned[resolution] = align_state(state, base_index, frame.df.index)
+
+    if aligned and len(base_index) > 0:
+        agreeing = sum(1 for state in aligned.values() if state[-1] == wanted)
+        confidence = 10 * agreeing / len(aligned)
+    else:
+        confidence = sum(
+            analysis["confidence"] for analysis in analyses.values()
+        ) / len(analyses)
+
+    return {
+        "confidence": confidence,
+        # the base timeframe's, so generate graph draws the same thing it would for a single resolution
+        "ta_data": analyses.get(base_resolution, {}).get("ta_data"),
+        "timeframes": {
+            resolution: {
+                "confidence": analysis["confidence"],
+                "bars": len(frames[resolution].df),
+                "state": (
+                    int(aligned[resolution][-1])
+                    if resolution in aligned and len(base_index) > 0
+                    else None
+                ),
+            }
+            for resolution, analysis in analyses.items()
+        },
+        "aligned_states": {
+            resolution: state.tolist() for resolution, state in aligned.items()
+        },
+    }
+
+
+# panel version of run_algo - the algo for every symbol in the panel at once. returns {symbol: analysis}. like the
+# incremental mode there's no full length ta_data (for hundreds of symbols it wouldn't fit in a step functions
+# payload), just each symbol's latest values
+def run_panel_algo(panel, ta_algo, search_period):
+    from indicators import algo_windows
+
+    selected_algo = list(ta_algo.keys())[0]
+
+    if selected_algo == "awesome-oscillator":
+        from signals import DIRECTIONS, ao_strategy
+
+        strategy, direction = ao_strategy(ta_algo)
+        with span("indicator"):
+            ao = panel.awesome_oscillator(**algo_windows(ta_algo))
+        with span("signal_search"):
+            signal = panel.ao_signal(**algo_windows(ta_algo), strategy=strategy)
+            found = panel.signal_found(signal, search_period, DIRECTIONS[direction])
+        confidences = [10 if symbol_found else 0 for symbol_found in found]
+        latest = {
+            "awesome-oscillator": panel.latest(ao),
+            "awesome-oscillator-signal": panel.latest(signal),
+        }
+
+    elif selected_algo == "stoch":
+        with span("indicator"):
+            stoch, stoch_signal = panel.stoch(**algo_windows(ta_algo))
+        with span("signal_search"):
+            signal, strength = panel.stoch_crossover(**algo_windows(ta_algo))
+            confidences = panel.graded_confidence(signal, strength, search_period)
+        latest = {
+            "stoch": panel.latest(stoch),
+            "stoch_signal": panel.latest(stoch_signal),
+            "stoch-crossover": panel.latest(signal),
+        }
+
+    elif selected_algo == "accumulation-distribution":
+        with span("indicator"):
+            acc_dist = panel.acc_dist()
+        with span("signal_search"):
+            signal, strength = panel.ad_divergence(**algo_windows(ta_algo))
+            confidences = panel.graded_confidence(signal, strength, search_period)
+        latest = {
+            "accumulation-distribution": panel.latest(acc_dist),
+            "accumulation-distribution-divergence": panel.latest(signal),
+        }
+
+    else:
+        raise ValueError(
+            f"Requested algorithm '{selected_algo}' is invalid/not implemented"
+        )
+
+    return {
+        symbol: {
+            "confidence": confidences[i],
+            "ta_data": None,
+            "latest": {name: values[i] for name, values in latest.items()},
+        }
+        for i, symbol in enumerate(panel.symbols)
+    }
+
+
+# panel mode - {"symbols": [...], "symbol_data": {symbol: data}}, which is what get_symbol_data's batch mode hands
+# back, with the usual date_from/date_to/search_period and ta_algo or ta_algos. every symbol goes through the
+# indicators together as (bar, symbol) arrays, see panel.py. returns {symbol: x}, where x is what a single symbol
+# call would have returned. symbols without data (ones the batch fetch failed on) are left out
+def panel_handler(payload):
+    from panel import Panel
+    from ta_common.symbol_data import load_job_frame
+
+    frames = {}
+    for symbol in dict.fromkeys(payload["symbols"]):
+        if symbol in payload["symbol_data"]:
+            job = dict(payload, symbol_data=payload["symbol_data"][symbol])
+            frames[symbol] = load_job_frame(job)
+    record("symbols", len(frames))
+    record("rows", sum(len(frame) for frame in frames.values()))
+
+    with span("stack"):
+        panel = Panel(frames)
+
+    search_period = payload["search_period"]
+    if "ta_algos" in payload:
+        analyses = [
+            run_panel_algo(panel, ta_algo, search_period)
+            for ta_algo in payload["ta_algos"]
+        ]
+        return {
+            symbol: [
+                {"ta_algo": ta_algo, "ta_analysis": by_symbol[symbol]}
+                for ta_algo, by_symbol in zip(payload["ta_algos"], analyses)
+            ]
+            for symbol in panel.symbols
+        }
+
+    return run_panel_algo(panel, payload["ta_algo"], search_period)
+
+
+def with_backtest(run, frame, cost):
+    from backtest import backtest_algo, has_signals
+
+    def run_and_backtest(ta_algo):
+        result = run(ta_algo)
+        if has_signals(ta_algo):
+            with span("backtest"):
+                result["backtest"] = backtest_algo(frame, ta_algo, cost)
+        return result
+
+    return run_and_backtest
+
+
+# the AO's buy/sell price lists are just the close at each signal, so they don't make it into compact output
+DERIVED_KEYS = ("awesome-oscillator-buy-price", "awesome-oscillator-sell-price")
+
+
+def with_output_options(payload):
+    # the payload with "ta_output" and "ta_window" filled in from the defaults, so they're part of the result cache key
+    # however they were set. the window always covers search_period, and a 0 for either means the whole series
+    ta_output = payload.get("ta_output") or TA_OUTPUT
+    if ta_output not in TA_OUTPUTS:
+        raise ValueError(
+            f"Requested ta_output '{ta_output}' must be one of {TA_OUTPUTS}"
+        )
+    ta_window = payload.get("ta_window")
+    if ta_window is None:
+        ta_window = TA_WINDOW
+    if ta_window > 0 and payload["search_period"] > 0:
+        ta_window = max(ta_window, payload["search_period"])
+    else:
+        ta_window = 0
+    return dict(payload, ta_output=ta_output, ta_window=ta_window)
+
+
+def with_compact_output(run, window):
+    from ta_common.ta_output import compact_ta_data, window_start
+
+    def run_and_compact(ta_algo):
+        result = run(ta_algo)
+        ta_data = result.get("ta_data")
+        if ta_data is not None:
+            selected_algo = list(ta_algo.keys())[0]
+            with span("compact"):
+                result["ta_data"] = compact_ta_data(
+                    {
+                        name: values
+                        for name, values in ta_data.items()
+                        if name not in DERIVED_KEYS
+                    },
+                    window,
+                    events=[SIGNAL_KEYS[selected_algo]],
+                )
+        # multi timeframe runs' per bar states are as long as the base timeframe too
+        for resolution, states in result.get("aligned_states", {}).items():
+            result["aligned_states"][resolution] = states[
+                window_start(len(states), window) :
+            ]
+        return result
+
+    return run_and_compact
+
+
+def use_incremental(payload):
+    # "incremental": true only processes bars we haven't seen before for this symbol + resolution, using the
+    # indicator state saved last time. needs INDICATOR_STATE_STORE to be set, otherwise it's the normal full run
+    if not payload.get("incremental") or payload.get("resolutions"):
+        return False
+
+    from incremental import DEFAULT_HISTORY, INDICATOR_STATE_STORE, streams_signals
+    from indicators import has_custom_windows
+
+    # the saved state is for the default windows only, and only some algos' signals are kept in it
+    ta_algos = payload.get("ta_algos") or [payload["ta_algo"]]
+    if any(has_custom_windows(ta_algo) for ta_algo in ta_algos):
+        return False
+    if not all(streams_signals(ta_algo) for ta_algo in ta_algos):
+        return False
+
+    # only the last DEFAULT_HISTORY signals are kept, so a longer search_period - or 0, which means search everything -
+    # needs the full run
+    return (
+        bool(INDICATOR_STATE_STORE) and 0 < payload["search_period"] <= DEFAULT_HISTORY
+    )
+
+
+def analyse(payload, incremental=False):
+    if "symbols" in payload:
+        return panel_handler(payload)
+
+    from ta_common.symbol_data import load_job_frame
+
+    # multi timeframe jobs keep the bars before date_from, build_timeframes needs them to line up the coarser
+    # timeframes' bins. it cuts them back to date_from itself
+    multi_timeframe = not incremental and bool(payload.get("resolutions"))
+
+    # the symbol data only gets parsed once, however many algos we're running over it
+    df = load_job_frame(dict(payload, date_from=None) if multi_timeframe else payload)
+    record("rows", len(df))
+    search_period = payload["search_period"]
+
+    if incremental:
+        state = update_indicator_state(df, payload)
+        run = lambda ta_algo: run_algo_incremental(state, ta_algo, search_period)
+    elif multi_timeframe:
+        # multi timeframe mode - "resolutions": ["15m", "1h", "1d"] alongside "resolution", which is what the symbol
+        # data was fetched at (the finest of them). the coarser ones are resampled from it once and shared by every
+        # algo. see run_algo_confluence
+        from indicators import IndicatorFrame
+        from timeframes import build_timeframes
+
+        base_resolution = payload["resolution"]
+        resolutions = list(payload["resolutions"])
+        if base_resolution not in resolutions:
+            resolutions.insert(0, base_resolution)
+        with span("resample"):
+            timeframes = build_timeframes(
+                df, base_resolution, resolutions, payload.get("date_from")
+            )
+        frames = {
+            resolution: IndicatorFrame(timeframe)
+            for resolution, timeframe in timeframes.items()
+        }
+        run = lambda ta_algo: run_algo_confluence(
+            frames, base_resolution, ta_algo, search_period
+        )
+    else:
+        from indicators import IndicatorFrame
+
+        frame = IndicatorFrame(df)
+        run = lambda ta_algo: run_algo(frame, ta_algo, search_period)
+
+        # "backtest": true adds how the algo's signals would have done over this data, for the algos that have
+        # signals. "backtest_cost" is the fraction paid each way per trade. see backtest.py
+        if payload.get("backtest"):
+            run = with_backtest(run, frame, payload.get("backtest_cost") or 0.0)
+
+    # "ta_output": "compact" trims ta_data down to the last "ta_window" bars plus the signal events, for long jobs
+    # whose full series would mostly be padding in the step functions state. see with_output_options
+    if payload.get("ta_output") == "compact":
+        run = with_compact_output(run, payload["ta_window"])
+
+    # multi algo mode - "ta_algos": [{...}, {...}] runs them all over the same frame and returns a list of
+    # {"ta_algo": ..., "ta_analysis": ...}, where each ta_analysis is what a single algo call would have returned
+    if "ta_algos" in payload:
+        return [
+            {"ta_algo": ta_algo, "ta_analysis": run(ta_algo)}
+            for ta_algo in payload["ta_algos"]
+        ]
+
+    return run(payload["ta_algo"])
+
+
+@instrumented("run_ta")
+def lambda_handler(event, context):
+    if "ta_algos" in event["Payload"]:
+        check_algos(event["Payload"]["ta_algos"])
+    else:
+        check_algos([event["Payload"]["ta_algo"]])
+    payload = with_output_options(event["Payload"])
+
+    # an incremental run moves the saved indicator state on, so it always runs. anything else is answered from the
+    # result cache if this exact job over this exact data has been seen before
+    if use_incremental(payload):
+        return analyse(payload, incremental=True)
+    return cached_result(result_cache, payload, lambda: analyse(payload))
+
+
 payload = {
     "Payload": {
         "date_from": "2022-01-01T04:16:13+10:00",
@@ -0,0 +1,272 @@
+import numpy as np
+from extrema import rolling_range
+
+# vectorised signal engine for the TA algos
+# everything in here works on whole numpy arrays rather than stepping through bars one at a time, since the
+# bar by bar loops were the bulk of the cpu time in the run TA lambda once we started doing 1m resolution jobs
+
+BUY = 1
+SELL = -1
+
+
+def crossover_events(series):
+    # raw zero line crossings. +1 where the series goes from negative to positive, -1 where it goes from positive
+    # to negative, 0 everywhere else. the first bar has nothing before it so it can never be a crossing
+    # (the old loop compared it against the last bar via ao[-1], which was a bug)
+    values = np.asarray(series, dtype=float)
+    events = np.zeros(values.shape, dtype=np.int8)
+    if len(values) < 2:
+        return events
+
+    previous = values[:-1]
+    current = values[1:]
+    events[1:][(current > 0) & (previous < 0)] = BUY
+    events[1:][(current < 0) & (previous > 0)] = SELL
+    return events
+
+
+def dedupe_events(events):
+    # the signal is a state machine - once we've said buy we don't say buy again until we've said sell, and vice
+    # versa. that's the same as only keeping an event when it differs from the previous non-zero event
+    events = np.asarray(events, dtype=np.int8)
+    signal = np.zeros(len(events), dtype=np.int8)
+
+    positions = np.flatnonzero(events)
+    if len(positions) == 0:
+        return signal
+
+    fired = events[positions]
+    previous = np.concatenate(([0], fired[:-1]))
+    keep = fired != previous
+    signal[positions[keep]] = fired[keep]
+    return signal
+
+
+def crossover_signal(series):
+    # the full crossover engine - zero line crossings, deduped into buy/sell signals
+    return dedupe_events(crossover_events(series))
+
+
+def signal_state(signal, search_period=0):
+    # +1/-1 signal events to the state they leave things in - the direction of the most recent signal, 0 before the
+    # first one. with a search_period, a signal only holds for that many bars (its own included), the same bars
+    # signal_found would look at - after that the state goes back to 0. 0 means it holds until the next one
+    signal = np.asarray(signal, dtype=np.int8)
+    fired = np.flatnonzero(signal)
+    state = np.zeros(len(signal), dtype=np.int8)
+    if len(fired) == 0:
+        return state
+    bars = np.arange(len(signal))
+    latest = np.searchsorted(fired, bars, side="right") - 1
+    has_fired = latest >= 0
+    if search_period:
+        has_fired &= bars - fired[np.maximum(latest, 0)] < search_period
+    state[has_fired] = signal[fired[latest[has_fired]]]
+    return state
+
+
+def signal_prices(price, signal):
+    # turn a signal array into the buy price/sell price series the graph stage plots. None where nothing happened
+    # built as object arrays so the output is json serialisable without walking every bar
+    prices = np.asarray(price, dtype=float)
+    buy_price = np.full(len(signal), None, dtype=object)
+    sell_price = np.full(len(signal), None, dtype=object)
+
+    buys = np.flatnonzero(signal == BUY)
+    sells = np.flatnonzero(signal == SELL)
+    buy_price[buys] = prices[buys].tolist()
+    sell_price[sells] = prices[sells].tolist()
+    return buy_price, sell_price
+
+
+# shamelessly stolen from https://medium.com/codex/bitcoin-trade-automation-with-awesome-oscillator-in-python-51f2c52c5b25
+# and then rewritten to not loop through every bar
+def implement_ao_crossover(price, ao):
+    signal = crossover_signal(ao)
+    buy_price, sell_price = signal_prices(price, signal)
+    return buy_price.tolist(), sell_price.tolist(), signal.tolist()
+
+
+# the AO strategies job scan accepts. every one of these works down a 1d series or each column of a 2d one and returns
+# raw +1/-1 events - bullish patterns are BUY, bearish ones SELL, and a job's direction says which it's looking for
+
+
+def saucer_events(ao):
+    # bullish saucer - above zero, two falling bars then a rising one, which fires on the rising bar. bearish is the
+    # same upside down below zero
+    ao = np.asarray(ao, dtype=float)
+    events = np.zeros(ao.shape, dtype=np.int8)
+    if len(ao) < 4:
+        return events
+
+    before, first, second, current = ao[:-3], ao[1:-2], ao[2:-1], ao[3:]
+    bullish = (before > first) & (first > second) & (second < current)
+    bullish &= (first > 0) & (second > 0) & (current > 0)
+    bearish = (before < first) & (first < second) & (second > current)
+    bearish &= (first < 0) & (second < 0) & (current < 0)
+    events[3:][bullish] = BUY
+    events[3:][bearish] = SELL
+    return events
+
+
+def higher_troughs(values):
+    # for each bar from the third on - is the bar before it a trough below zero that's higher than the trough before
+    # that, without values getting back up to zero in between. the trough is confirmed by the bar after it turning up
+    middle = values[1:-1]
+    trough = (middle < 0) & (values[:-2] > middle) & (values[2:] > middle)
+
+    # where each trough is, and where the one before it was, found with a running max over the trough positions
+    rows = np.arange(1, len(values) - 1).reshape((-1,) + (1,) * (values.ndim - 1))
+    positions = np.where(trough, rows, -1)
+    latest = np.maximum.accumulate(positions, axis=0)
+    previous = np.concatenate([np.full((1,) + latest.shape[1:], -1), latest[:-1]])
+    has_previous = previous >= 0
+    previous = np.maximum(previous, 0)
+
+    # how many bars at or above zero there have been by each bar - none between the troughs means none in the
+    # difference of the two counts
+    above = np.cumsum(values >= 0, axis=0)
+    stayed_below = above[:-2] == np.take_along_axis(above, previous, axis=0)
+    higher = np.take_along_axis(values, previous, axis=0) < middle
+    return trough & has_previous & higher & stayed_below
+
+
+def twin_peaks_events(ao):
+    # bullish twin peaks - two troughs below zero with the second higher and the AO staying below zero between them,
+    # firing on the rising bar after the second. bearish is two peaks above zero with the second lower
+    ao = np.asarray(ao, dtype=float)
+    events = np.zeros(ao.shape, dtype=np.int8)
+    if len(ao) < 3:
+        return events
+
+    events[2:][higher_troughs(ao)] = BUY
+    events[2:][higher_troughs(-ao)] = SELL
+    return events
+
+
+AO_STRATEGIES = {
+    "crossover": crossover_events,
+    "saucer": saucer_events,
+    "twin-peaks": twin_peaks_events,
+}
+
+# the signal each direction is looking for
+DIRECTIONS = {"bullish": BUY, "bearish": SELL}
+
+
+def ao_strategy(ta_algo):
+    # (strategy, direction) from an AO ta_algo - a plain bullish crossover if they're not given
+    params = list(ta_algo.values())[0] or {}
+    return params.get("strategy") or "crossover", params.get("direction") or "bullish"
+
+
+def ao_signal(ao, strategy="crossover"):
+    # the crossover is a state machine (see dedupe_events). the patterns aren't - two saucers in a row are two signals
+    events = AO_STRATEGIES[strategy](ao)
+    if strategy == "crossover":
+        return dedupe_events(events)
+    return events
+
+
+def implement_ao_strategy(price, ao, strategy="crossover"):
+    # implement_ao_crossover for any of the AO strategies
+    signal = ao_signal(ao, strategy)
+    buy_price, sell_price = signal_prices(price, signal)
+    return buy_price.tolist(), sell_price.tolist(), signal.tolist()
+
+
+def signal_found(signal, search_period, value=BUY):
+    # look at the last search_period bars to see if the given signal fired
+    # slicing matches the old list slicing, including search_period=0 meaning the whole series
+    signal = np.asarray(signal)
+    return bool(np.any(signal[-search_period:] == value))
+
+
+def crossing_events(fast, slow):
+    # +1 where fast goes from below slow to above it, -1 the other way, 0 otherwise. works down a 1d series or each
+    # column of a 2d one, same as everything below here
+    fast = np.asarray(fast, dtype=float)
+    slow = np.asarray(slow, dtype=float)
+    events = np.zeros(fast.shape, dtype=np.int8)
+    if len(fast) < 2:
+        return events
+
+    gap = fast - slow
+    previous = gap[:-1]
+    current = gap[1:]
+    events[1:][(current > 0) & (previous < 0)] = BUY
+    events[1:][(current < 0) & (previous > 0)] = SELL
+    return events
+
+
+# stochastic - %K crossing %D only counts coming out of the oversold or overbought zone
+OVERSOLD = 20
+OVERBOUGHT = 80
+
+
+def stoch_events(k, d):
+    # returns (events, strength). a buy is %K crossing up through %D from below OVERSOLD, a sell is crossing down from
+    # above OVERBOUGHT. strength is 0 to 1 - how deep into the zone the bar before the crossing was
+    k = np.asarray(k, dtype=float)
+    d = np.asarray(d, dtype=float)
+    events = crossing_events(k, d)
+    strength = np.zeros(k.shape)
+    if len(k) < 2:
+        return events, strength
+
+    low = np.fmin(k[:-1], d[:-1])
+    high = np.fmax(k[:-1], d[:-1])
+    events[1:][(events[1:] == BUY) & ~(low < OVERSOLD)] = 0
+    events[1:][(events[1:] == SELL) & ~(high > OVERBOUGHT)] = 0
+    strength[1:] = np.where(
+        events[1:] == BUY,
+        (OVERSOLD - low) / OVERSOLD,
+        (high - OVERBOUGHT) / (100 - OVERBOUGHT),
+    )
+    return events, np.clip(np.where(events != 0, strength, 0), 0, 1)
+
+
+def divergence_events(price, indicator, window):
+    # returns (events, strength). a buy is price closing below its lowest close of the window bars before while the
+    # indicator stays above its own low over them (price makes a lower low, the indicator doesn't), a sell is the same
+    # at the highs. strength is 0 to 1 - how far the indicator held off its extreme, as a share of its range over those
+    # bars. nans don't count, same as the rolling windows
+    price = np.asarray(price, dtype=float)
+    indicator = np.asarray(indicator, dtype=float)
+    events = np.zeros(price.shape, dtype=np.int8)
+    strength = np.zeros(price.shape)
+    if len(price) < 2:
+        return events, strength
+
+    # the extremes of the window bars before each bar, not counting the bar itself
+    price_high, price_low = (
+        values[:-1] for values in rolling_range(price, price, window)
+    )
+    indicator_high, indicator_low = (
+        values[:-1] for values in rolling_range(indicator, indicator, window)
+    )
+    current_price = price[1:]
+    current = indicator[1:]
+
+    bullish = (current_price < price_low) & (current > indicator_low)
+    bearish = (current_price > price_high) & (current < indicator_high)
+    events[1:][bullish] = BUY
+    events[1:][bearish] = SELL
+
+    spread = indicator_high - indicator_low
+    held = np.where(bullish, current - indicator_low, indicator_high - current)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # a flat indicator that's moved off it at all has moved its whole range
+        held = np.where(spread > 0, held / spread, 1.0)
+    strength[1:] = np.where(bullish | bearish, held, 0)
+    return events, np.clip(strength, 0, 1)
+
+
+def graded_confidence(signal, strength, search_period):
+    # 0 if there's no buy in the last search_period bars, otherwise 5 to 10 by the strength of the latest one.
+    # search_period=0 means the whole series, same as signal_found
+    signal = np.asarray(signal)
+    buys = np.flatnonzero(signal[-search_period:] == BUY)
+    if len(buys) == 0:
+        return 0
+    return 5 + 5 * float(np.asarray(strength)[-search_period:][buys[-1]])
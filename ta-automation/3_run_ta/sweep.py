@@ -0,0 +1,174 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from backtest import SIGNAL_GENERATORS, backtest
+from indicators import ALGO_WINDOWS, IndicatorFrame
+from panel import crossover_signal_columns, fill_columns, prefix_sums, window_mean
+from signals import AO_STRATEGIES, ao_strategy
+
+# parameter sweep for the indicator windows. every point in a grid is backtested over every symbol (see backtest.py)
+# and the points are ranked by hit rate across all of their trades. the best point's params go straight into a job's
+# ta_algo, eg {"awesome-oscillator": {"window1": 8, "window2": 26}}
+#
+# nothing is recomputed per grid point that doesn't have to be. for AO each symbol's median price gets one set of
+# prefix sums, every SMA window comes off those, and every (window1, window2) pair's AO and signals are worked out
+# at once as the columns of one array. other algos share an IndicatorFrame per symbol, so each rolling window is only
+# built once however many grid points use it. symbols are spread over a process pool in chunks
+
+DEFAULT_GRIDS = {
+    "awesome-oscillator": {
+        "window1": [3, 5, 8, 10, 13],
+        "window2": [21, 26, 34, 40, 55],
+    },
+    "stoch": {"window": [5, 9, 14, 21], "smooth_window": [3, 5]},
+    "accumulation-distribution": {"window": [10, 20, 40, 60]},
+}
+
+# a point needs at least this many closed trades across the symbol set to be ranked, otherwise one lucky trade wins
+DEFAULT_MIN_TRADES = 20
+
+
+def grid_points(algo, grid=None):
+    # every combination in the grid as a params dict. AO's short window has to be shorter than its long one
+    grid = grid or DEFAULT_GRIDS[algo]
+    names = [name for name in ALGO_WINDOWS[algo] if name in grid]
+    points = [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+    if algo == "awesome-oscillator":
+        points = [
+            point
+            for point in points
+            if with_defaults(algo, point)["window1"]
+            < with_defaults(algo, point)["window2"]
+        ]
+    return points
+
+
+def with_defaults(algo, point):
+    return {**ALGO_WINDOWS[algo], **point}
+
+
+def ao_grid_signals(df, points, strategy="crossover"):
+    # (bar, point) signals for every AO point, off one set of prefix sums
+    median = 0.5 * (df["High"].to_numpy(dtype=float) + df["Low"].to_numpy(dtype=float))
+    prefix = prefix_sums(median[:, None])
+    pairs = [
+        (point["window1"], point["window2"])
+        for point in (with_defaults("awesome-oscillator", point) for point in points)
+    ]
+    means = {
+        window: window_mean(prefix, window)[:, 0]
+        for window in set(itertools.chain(*pairs))
+    }
+    ao = np.column_stack(
+        [means[window1] - means[window2] for window1, window2 in pairs]
+    )
+    ao = fill_columns(ao, 0)
+    if strategy == "crossover":
+        return crossover_signal_columns(ao, np.ones(ao.shape, dtype=bool))
+    return AO_STRATEGIES[strategy](ao)
+
+
+def sweep_symbol(df, algo, points, cost, params=None):
+    # backtest stats for each point over one symbol, in the same order as points
+    close = df["Close"].to_numpy(dtype=float)
+    if len(df) == 0:
+        return [backtest(close, np.zeros(0, dtype=np.int8), cost) for _ in points]
+
+    if algo == "awesome-oscillator":
+        strategy, _ = ao_strategy({algo: params})
+        signals = ao_grid_signals(df, points, strategy)
+        return [backtest(close, signals[:, i], cost) for i in range(len(points))]
+
+    if algo not in SIGNAL_GENERATORS:
+        raise ValueError(f"Requested algorithm '{algo}' has no signals to backtest")
+    frame = IndicatorFrame(df)
+    generate = SIGNAL_GENERATORS[algo]
+    return [
+        backtest(close, generate(frame, {algo: {**(params or {}), **point}}), cost)
+        for point in points
+    ]
+
+
+def sweep_chunk(frames, algo, points, cost, params=None):
+    return [sweep_symbol(df, algo, points, cost, params) for df in frames]
+
+
+def sweep(
+    frames,
+    algo,
+    grid=None,
+    cost=0.0,
+    workers=None,
+    chunk_size=25,
+    min_trades=DEFAULT_MIN_TRADES,
+    params=None,
+):
+    # frames is {symbol: parsed frame}. params are the algo's other parameters, the same for every point (eg the AO
+    # {"strategy": "saucer"}). returns every grid point, best first, as
+    # {"ta_algo": {algo: params}, "hit_rate", "closed_trades", "mean_total_return", "mean_max_drawdown", "ranked"}
+    # points with fewer than min_trades closed trades come last with ranked=False
+    points = grid_points(algo, grid)
+    symbol_frames = list(frames.values())
+    chunks = [
+        symbol_frames[start : start + chunk_size]
+        for start in range(0, len(symbol_frames), chunk_size)
+    ]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        per_symbol = sweep_chunk(symbol_frames, algo, points, cost, params)
+    else:
+        per_symbol = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            for chunk_results in pool.map(
+                sweep_chunk,
+                chunks,
+                [algo] * len(chunks),
+                [points] * len(chunks),
+                [cost] * len(chunks),
+                [params] * len(chunks),
+            ):
+                per_symbol.extend(chunk_results)
+
+    results = []
+    for i, point in enumerate(points):
+        stats = [symbol_stats[i] for symbol_stats in per_symbol]
+        closed = sum(s["closed_trades"] for s in stats)
+        wins = sum(
+            round(s["hit_rate"] * s["closed_trades"])
+            for s in stats
+            if s["hit_rate"] is not None
+        )
+        results.append(
+            {
+                "ta_algo": {algo: {**(params or {}), **point}},
+                "hit_rate": wins / closed if closed else None,
+                "closed_trades": closed,
+                "mean_total_return": (
+                    float(np.mean([s["total_return"] for s in stats]))
+                    if stats
+                    else None
+                ),
+                "mean_max_drawdown": (
+                    float(np.mean([s["max_drawdown"] for s in stats]))
+                    if stats
+                    else None
+                ),
+                "ranked": closed >= min_trades,
+            }
+        )
+
+    # best hit rate first, more trades breaking ties
+    results.sort(
+        key=lambda result: (
+            result["ranked"],
+            result["hit_rate"] or 0,
+            result["closed_trades"],
+        ),
+        reverse=True,
+    )
+    return results
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from ta_common.resample import bar_span, derivable, resample, session_start
+
+# multi timeframe support for run TA. the job's symbol data is fetched once at the finest resolution asked for, and
+# every coarser timeframe is resampled from it here rather than fetched separately. each timeframe is built from the
+# coarsest one already built that it can come from (1d from 1h rather than from 15m), so the work is shared
+#
+# intraday bins count from each session's first bar, so the coarser timeframes are resampled from the start of the
+# session the job's date_from is in and cut back to date_from afterwards - resampling from date_from itself would
+# shift the first session's bins whenever it's part way through one. job scan fetches multi timeframe jobs from a day
+# early so those bars are there
+
+
+def build_timeframes(df, base_resolution, resolutions, start=None):
+    # returns {resolution: frame}, each with a naive UTC index like the decoded base frame. start is the job's
+    # date_from - df should have the bars before it, back to the start of its session at least
+    tz = df.attrs.get("tz")
+    for resolution in resolutions:
+        if not derivable(base_resolution, resolution):
+            raise ValueError(
+                f"Resolution {resolution} can't be built from {base_resolution} bars"
+            )
+
+    if start is not None:
+        start = to_utc(start)
+        df = df[df.index >= session_start(start, tz).tz_localize(None)]
+
+    built = {base_resolution: df}
+    utc = {base_resolution: df.tz_localize("UTC")}
+    for resolution in sorted(set(resolutions), key=bar_span):
+        if resolution in built:
+            continue
+        source = max(
+            (
+                built_resolution
+                for built_resolution in utc
+                if derivable(built_resolution, resolution)
+            ),
+            key=bar_span,
+        )
+        utc[resolution] = resample(utc[source], resolution, tz)
+        built[resolution] = utc[resolution].tz_localize(None)
+
+    if start is not None:
+        start = start.tz_localize(None)
+        built = {
+            resolution: frame[frame.index >= start]
+            for resolution, frame in built.items()
+        }
+
+    return {resolution: built[resolution] for resolution in resolutions}
+
+
+def to_utc(timestamp):
+    # job dates without an offset are UTC, same as everywhere else
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def closed_bar_positions(base_index, index):
+    # for each base bar, the position in index of the latest coarser bar that had closed by then, or -1 if none had.
+    # a coarser bar counts as closed at the last base bar inside it, so nothing looks ahead - except the bar still
+    # being built at the end of the series, which is as closed as it's going to get
+    base_times = pd.DatetimeIndex(base_index).values
+    if len(base_times) == 0:
+        return np.zeros(0, dtype=np.int64)
+    containing = (
+        np.searchsorted(pd.DatetimeIndex(index).values, base_times, side="right") - 1
+    )
+    last = np.r_[containing[1:] != containing[:-1], True]
+    closed_at = base_times[last]
+    closed_bars = containing[last]
+    positions = np.searchsorted(closed_at, base_times, side="right") - 1
+    return np.where(positions >= 0, closed_bars[np.maximum(positions, 0)], -1)
+
+
+def align_state(state, base_index, index):
+    # a timeframe's state series put onto the base timeframe's bars
+    positions = closed_bar_positions(base_index, index)
+    state = np.asarray(state, dtype=np.int8)
+    return np.where(positions >= 0, state[np.maximum(positions, 0)], 0).astype(np.int8)
@@ -1,114 +1,287 @@
-import matplotlib.pyplot as plt
-import pandas as pd
-import json
-import boto3
 import os
-from botocore.exceptions import ClientError
-
-
-def upload_file(file_name, bucket, object_name=None):
-    """Upload a file to an S3 bucket
-
-    :param file_name: File to upload
-    :param bucket: Bucket to upload to
-    :param object_name: S3 object name. If not specified then file_name is used
-    :return: True if file was uploaded, else False
-    """
-
-    # If S3 object_name was not specified, use file_name
-    if object_name is None:
-        object_name = os.path.basename(file_name)
-
-    try:
-        # Upload the file
-        # s3_client = boto3.client(
-        #   "s3",
-        # )
-        # response = s3_client.upload_file(
-        #    file_name,
-        #    bucket,
-        #    object_name,
-        #    StorageClass="STANDARD_IA",
-        #    ExtraArgs={"StorageClass": "STANDARD_IA"},
-        #    ContentType="image/png",
-        # )
-
-        # response = s3.meta.client.Bucket('<bucket-name>').put_object(Key='folder/{}'.format(filename), Body=file)
-
-        file = open(file_name, "rb")
-        s3 = boto3.resource("s3")
-        response = s3.meta.client.Bucket(bucket).put_object(
-            Key=object_name,
-            Body=file,
-            ContentType="image/png",
-            StorageClass="STANDARD_IA",
-        )
-    except ClientError as e:
-        return False
-    return True
+import threading
+from ta_common.instrumentation import instrumented, record, span
+from ta_common.object_store import object_store_from_url
+
+# matplotlib, numpy, pandas and boto3 are most of this function's cold start, and the "Graph not available" and
+# "Algo not implemented" paths don't need any of them - so they're imported where they're used rather than up here
+
+
+# where finished graphs go. graphs are content addressed, so if one already exists we hand back its url instead
+# of drawing and uploading it again
+GRAPH_STORE = os.environ.get("GRAPH_STORE", "s3://mfers-graphs")
+
+# graphs are written once and rarely looked at again, so they're kept as infrequent access like they always were
+GRAPH_STORAGE_CLASS = "STANDARD_IA"
+
+# bump this whenever the way graphs are drawn changes, so old cached graphs aren't reused
+RENDER_VERSION = 3
+
+UP_COLOUR = "#26a69a"
+DOWN_COLOUR = "#f44336"
+
+# one figure per container, cleared and reused between invocations. it's a plain Figure on an Agg canvas rather
+# than pyplot's global figure, so nothing gets registered anywhere and nothing piles up across warm invocations.
+# thread local, because the local runner can render from several threads at once
+_figures = threading.local()
+
+
+def get_figure():
+    figure = getattr(_figures, "figure", None)
+    if figure is None:
+        import matplotlib
+
+        # say so explicitly, rather than have matplotlib go looking for a GUI backend that isn't there
+        matplotlib.use("Agg")
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        _figures.figure = figure
+    figure.clear()
+    return figure
+
+
+def histogram_colours(values):
+    # red where the bar is lower than the one before it, green otherwise. the first bar has nothing before it so
+    # it's green
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    falling = np.zeros(len(values), dtype=bool)
+    falling[1:] = values[:-1] > values[1:]
+    return np.where(falling, DOWN_COLOUR, UP_COLOUR)
+
+
+def draw_histogram(ax, index, values, colours):
+    # the whole histogram as a single collection of rectangles built with numpy. even a single bar() call still
+    # makes one Rectangle artist per bar, which is what made 1m charts take longer than the TA
+    import matplotlib.dates as mdates
+    import numpy as np
+    import pandas as pd
+    from matplotlib.collections import PolyCollection
+
+    x = mdates.date2num(pd.DatetimeIndex(index).to_pydatetime())
+    if len(x) > 1:
+        # 80% of the bar spacing, same look as bar() on daily data but without intraday bars overlapping
+        width = 0.8 * np.median(np.diff(x))
+    else:
+        width = 0.8
+    left = x - width / 2
+    right = x + width / 2
+    heights = np.nan_to_num(values)
+    zeros = np.zeros(len(x))
+
+    # (bars, 4 corners, x/y)
+    verts = np.stack(
+        [
+            np.column_stack([left, zeros]),
+            np.column_stack([left, heights]),
+            np.column_stack([right, heights]),
+            np.column_stack([right, zeros]),
+        ],
+        axis=1,
+    )
+    ax.add_collection(PolyCollection(verts, facecolors=colours, edgecolors="none"))
+    ax.xaxis_date()
+    ax.autoscale_view()
+
+
+def render_ao_graph(df, ta_data, symbol, graph_file, ta_algo=None):
+    import numpy as np
+    from ta_common.algo_params import algo_windows
+
+    windows = algo_windows(ta_algo or {"awesome-oscillator": None})
+
+    figure = get_figure()
+    grid = figure.add_gridspec(10, 1)
+    ax1 = figure.add_subplot(grid[0:5, 0])
+    ax2 = figure.add_subplot(grid[6:10, 0])
+
+    # off the signal rather than the buy/sell price lists, which compact ta_data leaves out. it's the same markers
+    draw_signal_prices(ax1, df, ta_data["awesome-oscillator-signal"], symbol)
+
+    ao = np.asarray(ta_data["awesome-oscillator"], dtype=float)
+    draw_histogram(ax2, df.index, ao, histogram_colours(ao))
+    ax2.set_title(
+        f"{symbol} AWESOME OSCILLATOR {windows['window1']},{windows['window2']}"
+    )
+
+    figure.savefig(graph_file)
+    # drop the artists now rather than holding onto them until the next invocation
+    figure.clear()
+
+
+def draw_signal_prices(ax, df, signal, symbol):
+    # the close with a marker at each buy/sell signal
+    import numpy as np
 
+    signal = np.asarray(signal)
+    close = df["Close"].to_numpy(dtype=float)
+    ax.plot(df["Close"], label=symbol, color="skyblue")
+    ax.plot(
+        df.index,
+        np.where(signal == 1, close, np.nan),
+        marker="^",
+        markersize=12,
+        color=UP_COLOUR,
+        linewidth=0,
+        label="BUY SIGNAL",
+    )
+    ax.plot(
+        df.index,
+        np.where(signal == -1, close, np.nan),
+        marker="v",
+        markersize=12,
+        color=DOWN_COLOUR,
+        linewidth=0,
+        label="SELL SIGNAL",
+    )
+    ax.legend()
+    ax.set_title(f"{symbol} CLOSING PRICE")
 
+
+def render_stoch_graph(df, ta_data, symbol, graph_file, ta_algo=None):
+    import numpy as np
+    from ta_common.algo_params import algo_windows
+
+    windows = algo_windows(ta_algo or {"stoch": None})
+
+    figure = get_figure()
+    grid = figure.add_gridspec(10, 1)
+    ax1 = figure.add_subplot(grid[0:5, 0])
+    ax2 = figure.add_subplot(grid[6:10, 0])
+
+    draw_signal_prices(ax1, df, ta_data["stoch-crossover"], symbol)
+
+    ax2.plot(df.index, np.asarray(ta_data["stoch"], dtype=float), label="%K")
+    ax2.plot(df.index, np.asarray(ta_data["stoch_signal"], dtype=float), label="%D")
+    # the oversold/overbought lines the crossovers have to come out of
+    ax2.axhline(20, color=UP_COLOUR, linestyle="--", linewidth=1)
+    ax2.axhline(80, color=DOWN_COLOUR, linestyle="--", linewidth=1)
+    ax2.set_ylim(0, 100)
+    ax2.legend()
+    ax2.set_title(f"{symbol} STOCHASTIC {windows['window']},{windows['smooth_window']}")
+
+    figure.savefig(graph_file)
+    figure.clear()
+
+
+def render_ad_graph(df, ta_data, symbol, graph_file, ta_algo=None):
+    import numpy as np
+
+    figure = get_figure()
+    grid = figure.add_gridspec(10, 1)
+    ax1 = figure.add_subplot(grid[0:5, 0])
+    ax2 = figure.add_subplot(grid[6:10, 0])
+
+    signal = ta_data["accumulation-distribution-divergence"]
+    draw_signal_prices(ax1, df, signal, symbol)
+
+    acc_dist = np.asarray(ta_data["accumulation-distribution"], dtype=float)
+    ax2.plot(df.index, acc_dist, color="slategrey")
+    # mark the divergences on the A/D line too, so you can see it not following the price
+    signal = np.asarray(signal)
+    ax2.plot(
+        df.index,
+        np.where(signal == 1, acc_dist, np.nan),
+        marker="^",
+        color=UP_COLOUR,
+        linewidth=0,
+    )
+    ax2.plot(
+        df.index,
+        np.where(signal == -1, acc_dist, np.nan),
+        marker="v",
+        color=DOWN_COLOUR,
+        linewidth=0,
+    )
+    ax2.set_title(f"{symbol} ACCUMULATION/DISTRIBUTION")
+
+    figure.savefig(graph_file)
+    figure.clear()
+
+
+# each is render(df, ta_data, symbol, graph_file, ta_algo) - ta_algo for the windows in the titles
+RENDERERS = {
+    "awesome-oscillator": render_ao_graph,
+    "stoch": render_stoch_graph,
+    "accumulation-distribution": render_ad_graph,
+}
+
+
+def graph_cache_key(df, symbol, ta_algo, start=None):
+    from ta_common.fingerprint import combine, frame_fingerprint, params_fingerprint
+
+    parts = [RENDER_VERSION, symbol, params_fingerprint(ta_algo), frame_fingerprint(df)]
+    # compact ta_data only draws from bar start on. the key is still the whole frame, since the indicators in the
+    # window (A/D especially) depend on every bar before it
+    if start is not None:
+        parts.append(start)
+    return f"{combine(*parts)}.png"
+
+
+@instrumented("generate_graph")
 def lambda_handler(event, context):
-    df_json = json.dumps(event["Payload"]["symbol_data"])
-    df = pd.read_json(df_json)
+    # incremental TA runs don't send back the full series, so there's nothing to draw
+    if event["Payload"]["ta_analysis"]["ta_data"] is None:
+        return "Graph not available"
 
-    if list(event["Payload"]["ta_algo"].keys())[0] == "awesome-oscillator":
+    render = RENDERERS.get(list(event["Payload"]["ta_algo"].keys())[0])
+    if render is not None:
+        # only load the symbol data (and pandas with it) once we know we're going to draw something
+        from ta_common.symbol_data import load_job_frame
+        from ta_common.ta_output import is_compact, window_ta_data
+
+        df = load_job_frame(event["Payload"])
         ta_data = event["Payload"]["ta_analysis"]["ta_data"]
-        buy = ta_data["awesome-oscillator-buy-price"]
-        sell = ta_data["awesome-oscillator-sell-price"]
-        signal = ta_data["awesome-oscillator-signal"]
-        ao = ta_data["awesome-oscillator"]
-
-        ax1 = plt.subplot2grid((10, 1), (0, 0), rowspan=5, colspan=1)
-        ax2 = plt.subplot2grid((10, 1), (6, 0), rowspan=4, colspan=1)
-        ax1.plot(df["Close"], label=event["Payload"]["symbol"], color="skyblue")
-        ax1.plot(
-            df.index,
-            ta_data["awesome-oscillator-buy-price"],
-            marker="^",
-            markersize=12,
-            color="#26a69a",
-            linewidth=0,
-            label="BUY SIGNAL",
-        )
-        ax1.plot(
-            df.index,
-            ta_data["awesome-oscillator-sell-price"],
-            marker="v",
-            markersize=12,
-            color="#f44336",
-            linewidth=0,
-            label="SELL SIGNAL",
-        )
-        ax1.legend()
-        ax1.set_title(f'{event["Payload"]["symbol"]} CLOSING PRICE')
-        for i in range(len(df)):
-            if ta_data["awesome-oscillator"][i - 1] > ta_data["awesome-oscillator"][i]:
-                ax2.bar(df.index[i], ta_data["awesome-oscillator"][i], color="#f44336")
-            else:
-                ax2.bar(df.index[i], ta_data["awesome-oscillator"][i], color="#26a69a")
-        ax2.set_title(f'{event["Payload"]["symbol"]} AWESOME OSCILLATOR 5,34')
-
-        # make a hash out of the things that make this query unique - symbol, dates and algo used
-        graph_file = (
-            str(
-                hash(
-                    event["Payload"]["symbol"]
-                    + str(event["Payload"]["date_from"])
-                    + str(event["Payload"]["date_to"])
-                    + list(event["Payload"]["ta_algo"].keys())[0]
-                )
-            )
-            + ".png"
+        record("rows", len(df))
+
+        # make a hash out of the things that actually change the image - the data, the algo and its parameters, the
+        # symbol (it's in the titles), where the window starts and how we draw it
+        start = ta_data["start"] if is_compact(ta_data) else None
+        graph_key = graph_cache_key(
+            df, event["Payload"]["symbol"], event["Payload"]["ta_algo"], start
         )
 
-        graph_path = "/tmp"
-        save_success = plt.savefig(graph_path + "/" + graph_file)
+        store = object_store_from_url(GRAPH_STORE)
+        with span("cache_check"):
+            cached = store.exists(graph_key)
+        record("cache_hits", int(cached))
+        if cached:
+            return store.url(graph_key)
 
-        s3 = boto3.client("s3")
-        with open(graph_path + "/" + graph_file, "rb") as f:
-            s3.upload_fileobj(f, "mfers-graphs", graph_file)
+        # compact ta_data only covers the last ta_window bars, so that's what gets drawn
+        if is_compact(ta_data):
+            if len(df) != ta_data["bars"]:
+                raise ValueError(
+                    f"ta_data is for {ta_data['bars']} bars but the symbol data has {len(df)}"
+                )
+            df = df.iloc[start:]
+            ta_data = window_ta_data(ta_data)
+
+        graph_file = "/tmp/" + graph_key
+        with span("render"):
+            render(
+                df,
+                ta_data,
+                event["Payload"]["symbol"],
+                graph_file,
+                event["Payload"]["ta_algo"],
+            )
+        with open(graph_file, "rb") as f:
+            body = f.read()
+        record("graph_bytes", len(body), "Bytes")
+        with span("upload"):
+            store.put(
+                graph_key,
+                body,
+                content_type="image/png",
+                storage_class=GRAPH_STORAGE_CLASS,
+            )
+        os.remove(graph_file)
 
-        return f"http://s3-ap-southeast-2.amazonaws.com/mfers-graphs/{graph_file}"
+        return store.url(graph_key)
     else:
         return "Algo not implemented"
@@ -1,32 +1,25 @@
-def lambda_handler(event, context):
+from ta_common.instrumentation import instrumented, record
 
-    # https://stackoverflow.com/questions/58774789/merging-json-outputs-of-parallel-states-in-step-function
-    #
-    # really annoyingly, there is no way using Step Functions to append stuff to a json array
-    # so we need to get into the data flow here instead of using Step Functions to do it
-    # this is really disappointing, since as soon as you run a map function, you get an array back - so
-    # every time you map, you also need a lambda function to pull the bits you care about out of an array
-    # and back into a dict so that Step Functions can address them ongoing
-    #
-    # i am really quite dirty about this.
 
+# pulls the results for one job back together into a single dict
+def summarise_job(results):
     total = 0
-    for job in event["Payload"]:
+    for job in results:
         total += job["ta_analysis"]["confidence"]
 
-    average_confidence = total / len(event["Payload"])
+    average_confidence = total / len(results)
 
     jobs = {}
     jobs["job"] = {
-        "symbol": event["Payload"][0]["symbol"],
-        "date_from": event["Payload"][0]["date_from"],
-        "date_to": event["Payload"][0]["date_to"],
-        "ta_algo": event["Payload"][0]["ta_algo"],
-        "resolution": event["Payload"][0]["resolution"],
-        "search_period": event["Payload"][0]["search_period"],
-        "notify_method": event["Payload"][0]["notify_method"],
-        "notify_recipient": event["Payload"][0]["notify_recipient"],
-        "target_ta_confidence": event["Payload"][0]["target_ta_confidence"],
+        "symbol": results[0]["symbol"],
+        "date_from": results[0]["date_from"],
+        "date_to": results[0]["date_to"],
+        "ta_algo": results[0]["ta_algo"],
+        "resolution": results[0]["resolution"],
+        "search_period": results[0]["search_period"],
+        "notify_method": results[0]["notify_method"],
+        "notify_recipient": results[0]["notify_recipient"],
+        "target_ta_confidence": results[0]["target_ta_confidence"],
     }
 
     jobs["ta_summary"] = {
@@ -35,13 +28,15 @@ def lambda_handler(event, context):
         # but also im not 100% sure why I'd want this
         # i think this part is going to be super complex
         "overall_ta_confidence": average_confidence,
-        "target_ta_confidence": event["Payload"][0]["target_ta_confidence"],
+        "target_ta_confidence": results[0]["target_ta_confidence"],
     }
 
-    jobs["symbol_data"] = event["Payload"][0]["symbol_data"]
+    # this is either the data itself or a claim check pointer to it, depending on how get_symbol_data is configured.
+    # either way we just pass it along
+    jobs["symbol_data"] = results[0]["symbol_data"]
 
     jobs["ta_analyses"] = []
-    for ta_result in event["Payload"]:
+    for ta_result in results:
         this_job = ta_result.copy()
         del this_job["symbol_data"]
         jobs["ta_analyses"].append(this_job)
@@ -49,6 +44,42 @@ def lambda_handler(event, context):
     return jobs
 
 
+# the map is now map-of-maps (one per fetch group, then one per algo inside that) so the results come back as a list
+# of lists. flatten it, and cope with the old flat list too
+def flatten_results(payload):
+    results = []
+    for result in payload:
+        if isinstance(result, list):
+            results.extend(flatten_results(result))
+        else:
+            results.append(result)
+    return results
+
+
+@instrumented("calculate_confidence")
+def lambda_handler(event, context):
+
+    # https://stackoverflow.com/questions/58774789/merging-json-outputs-of-parallel-states-in-step-function
+    #
+    # really annoyingly, there is no way using Step Functions to append stuff to a json array
+    # so we need to get into the data flow here instead of using Step Functions to do it
+    # this is really disappointing, since as soon as you run a map function, you get an array back - so
+    # every time you map, you also need a lambda function to pull the bits you care about out of an array
+    # and back into a dict so that Step Functions can address them ongoing
+    #
+    # i am really quite dirty about this.
+
+    results = flatten_results(event["Payload"])
+    record("results", len(results))
+
+    # put each job's results back together, in the order the jobs were submitted
+    by_job = {}
+    for result in results:
+        by_job.setdefault(result.get("job_id", 0), []).append(result)
+
+    return {"job_results": [summarise_job(by_job[job_id]) for job_id in sorted(by_job)]}
+
+
 if __name__ == "__main__":
     payload = {
         "Payload": [
@@ -1,7 +1,23 @@
-from pushover import init, Client
-import boto3
+from ta_common.instrumentation import instrumented, span
 
 
+# the two things notify talks to, pulled out so they can be swapped for stand-ins when running locally
+def get_ssm_client():
+    # boto3 is a big import, and jobs that don't notify through pushover never need it
+    import boto3
+
+    return boto3.client("ssm")
+
+
+def send_pushover(api_key, recipient, message, title):
+    # only imported when we actually send something
+    from pushover import init, Client
+
+    init(api_key)
+    Client(recipient).send_message(message, title=title)
+
+
+@instrumented("notify")
 def lambda_handler(event, context):
     report_string = f'Symbol: {event["Payload"]["job"]["symbol"]}\n'
     report_string += f'Date from: {event["Payload"]["job"]["date_from"]}\n'
@@ -33,14 +49,17 @@ def lambda_handler(event, context):
             report_string += f"\n"
 
     if event["Payload"]["job"]["notify_method"] == "pushover":
-        ssm = boto3.client("ssm")
+        ssm = get_ssm_client()
 
         try:
-            pushover_api_key = (
-                ssm.get_parameter(Name="/tabot/pushover/api_key", WithDecryption=False)
-                .get("Parameter")
-                .get("Value")
-            )
+            with span("ssm"):
+                pushover_api_key = (
+                    ssm.get_parameter(
+                        Name="/tabot/pushover/api_key", WithDecryption=False
+                    )
+                    .get("Parameter")
+                    .get("Value")
+                )
 
         #        pushover_user_key = (
         #            ssm.get_parameter(Name="/tabot/pushover/user_key", WithDecryption=False)
@@ -52,11 +71,13 @@ def lambda_handler(event, context):
             print(f"Failed to retrieve Pushover config.  Error: {str(e)}")
             raise e
 
-        init(pushover_api_key)
-        Client(event["Payload"]["job"]["notify_recipient"]).send_message(
-            report_string,
-            title=f'Technical analysis for {event["Payload"]["job"]["symbol"]} complete',
-        )
+        with span("notify"):
+            send_pushover(
+                pushover_api_key,
+                event["Payload"]["job"]["notify_recipient"],
+                report_string,
+                title=f'Technical analysis for {event["Payload"]["job"]["symbol"]} complete',
+            )
 
     return True
 
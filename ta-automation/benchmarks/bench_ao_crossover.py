@@ -0,0 +1,112 @@
+# benchmark for the AO crossover + signal search, old python loop vs the vectorised engine in 3_run_ta/signals.py
+# run from the ta-automation folder: python benchmarks/bench_ao_crossover.py
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "3_run_ta"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+from signals import crossover_signal, implement_ao_crossover, signal_found
+
+SIZES = [10_000, 100_000, 1_000_000]
+SEARCH_PERIOD = 20
+
+
+# the original bar by bar implementation, kept here as the baseline
+def legacy_ao_crossover(price, ao):
+    buy_price = []
+    sell_price = []
+    ao_signal = []
+    signal = 0
+
+    for i in range(len(ao)):
+        if ao[i] > 0 and ao[i - 1] < 0:
+            if signal != 1:
+                buy_price.append(price[i])
+                sell_price.append(None)
+                signal = 1
+                ao_signal.append(signal)
+            else:
+                buy_price.append(None)
+                sell_price.append(None)
+                ao_signal.append(0)
+        elif ao[i] < 0 and ao[i - 1] > 0:
+            if signal != -1:
+                buy_price.append(None)
+                sell_price.append(price[i])
+                signal = -1
+                ao_signal.append(signal)
+            else:
+                buy_price.append(None)
+                sell_price.append(None)
+                ao_signal.append(0)
+        else:
+            buy_price.append(None)
+            sell_price.append(None)
+            ao_signal.append(0)
+    return buy_price, sell_price, ao_signal
+
+
+def legacy_search(signal, search_period):
+    found = False
+    for this_signal in signal[-search_period:]:
+        if this_signal == 1:
+            found = True
+    return found
+
+
+def make_series(size, seed=42):
+    rng = np.random.default_rng(seed)
+    price = 100 + np.cumsum(rng.normal(0, 1, size))
+    # something oscillator shaped that crosses zero a lot. first bar is 0 like the real AO with fillna=True
+    ao = np.sin(np.arange(size) / 7) + rng.normal(0, 0.3, size)
+    ao[0] = 0
+    return price, ao
+
+
+def best_of(func, *args, repeats=3):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def legacy_run(price, ao):
+    buy, sell, signal = legacy_ao_crossover(price, ao)
+    return buy, sell, signal, legacy_search(signal, SEARCH_PERIOD)
+
+
+def vectorised_run(price, ao):
+    buy, sell, signal = implement_ao_crossover(price, ao)
+    return buy, sell, signal, signal_found(signal, SEARCH_PERIOD)
+
+
+def engine_only_run(price, ao):
+    # just the signal state machine + search, without building the json friendly output lists
+    signal = crossover_signal(ao)
+    return signal_found(signal, SEARCH_PERIOD)
+
+
+if __name__ == "__main__":
+    print(
+        f"{'bars':>10} {'legacy (s)':>12} {'vectorised (s)':>15} {'speedup':>8} {'engine only (s)':>16} {'speedup':>8}"
+    )
+    for size in SIZES:
+        price, ao = make_series(size)
+
+        legacy_time, legacy = best_of(legacy_run, price, ao)
+        fast_time, fast = best_of(vectorised_run, price, ao)
+        engine_time, _ = best_of(engine_only_run, price, ao)
+
+        if legacy != fast:
+            raise AssertionError(
+                f"Vectorised output does not match legacy for {size} bars"
+            )
+
+        print(
+            f"{size:>10} {legacy_time:>12.4f} {fast_time:>15.4f} {legacy_time / fast_time:>7.1f}x"
+            f" {engine_time:>16.4f} {legacy_time / engine_time:>7.1f}x"
+        )
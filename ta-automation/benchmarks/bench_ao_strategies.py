@@ -0,0 +1,134 @@
+# benchmark for the AO strategies in 3_run_ta/signals.py - crossover, saucer and twin peaks, bullish and bearish -
+# on one 100k bar series. the vectorised side works the AO out once and runs each strategy's detector once, which
+# answers both directions. the reference side is bar by bar python, one loop per strategy and direction, and the two
+# have to find the same signals
+#
+# run from the ta-automation folder: python benchmarks/bench_ao_strategies.py [--bars 100000]
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "3_run_ta"))
+sys.path.insert(0, os.path.join(ROOT, "common"))
+from indicators import IndicatorFrame
+from local_runner.synthetic import synthetic_frame
+from signals import AO_STRATEGIES, DIRECTIONS, ao_signal, signal_found
+
+BARS = 100_000
+SEARCH_PERIOD = 20
+
+
+def legacy_crossover(ao, value):
+    # the crossover state machine, only keeping the direction we're after
+    signal = [0] * len(ao)
+    last = 0
+    for i in range(1, len(ao)):
+        event = 0
+        if ao[i] > 0 and ao[i - 1] < 0:
+            event = 1
+        elif ao[i] < 0 and ao[i - 1] > 0:
+            event = -1
+        if event != 0 and event != last:
+            last = event
+            if event == value:
+                signal[i] = event
+    return signal
+
+
+def legacy_saucer(ao, value):
+    signal = [0] * len(ao)
+    for i in range(3, len(ao)):
+        a, b, c, d = (
+            ao[i - 3] * value,
+            ao[i - 2] * value,
+            ao[i - 1] * value,
+            ao[i] * value,
+        )
+        if a > b > c < d and b > 0 and c > 0 and d > 0:
+            signal[i] = value
+    return signal
+
+
+def legacy_twin_peaks(ao, value):
+    # flipped for bearish, so it's always troughs below zero
+    signal = [0] * len(ao)
+    last_trough = None
+    crossed = False
+    for i in range(1, len(ao) - 1):
+        previous, current, following = (
+            value * ao[i - 1],
+            value * ao[i],
+            value * ao[i + 1],
+        )
+        if current >= 0:
+            crossed = True
+        if current < 0 and previous > current and following > current:
+            if last_trough is not None and not crossed and last_trough < current:
+                signal[i + 1] = value
+            last_trough = current
+            crossed = False
+    return signal
+
+
+LEGACY = {
+    "crossover": legacy_crossover,
+    "saucer": legacy_saucer,
+    "twin-peaks": legacy_twin_peaks,
+}
+
+
+def vectorised(df):
+    # every strategy and direction off one AO
+    ao = IndicatorFrame(df).awesome_oscillator().to_numpy()
+    results = {}
+    for strategy in AO_STRATEGIES:
+        signal = ao_signal(ao, strategy)
+        for direction, value in DIRECTIONS.items():
+            results[(strategy, direction)] = (
+                (signal == value) * value,
+                signal_found(signal, SEARCH_PERIOD, value),
+            )
+    return results
+
+
+def legacy(df):
+    ao = IndicatorFrame(df).awesome_oscillator().tolist()
+    results = {}
+    for strategy, detect in LEGACY.items():
+        for direction, value in DIRECTIONS.items():
+            signal = detect(ao, value)
+            results[(strategy, direction)] = (
+                signal,
+                value in signal[-SEARCH_PERIOD:],
+            )
+    return results
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=BARS)
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.bars, resolution="1m", seed=7)
+    fast_time, fast = timed(vectorised, df)
+    slow_time, slow = timed(legacy, df)
+
+    print(f"{args.bars} bars, all six strategy/direction variants")
+    for variant, (signal, found) in fast.items():
+        legacy_signal, legacy_found = slow[variant]
+        if signal.tolist() != legacy_signal or found != legacy_found:
+            raise AssertionError(f"{variant} doesn't match the bar by bar version")
+        print(
+            f"  {variant[0]:>10} {variant[1]:>8} {int((signal != 0).sum()):>6} signals"
+        )
+    print(f"  vectorised  {fast_time:>8.4f}s")
+    print(f"  bar by bar  {slow_time:>8.4f}s  ({slow_time / fast_time:.1f}x)")
@@ -0,0 +1,108 @@
+# benchmark for the vectorised backtest in 3_run_ta/backtest.py - 500 symbols x 10 years of daily bars by default,
+# in this process and on a process pool. a bar by bar python backtest is kept here as the reference, and checked
+# against the vectorised one on the first few symbols
+#
+# run from the ta-automation folder: python benchmarks/bench_backtest.py [--symbols 500] [--bars 2520] [--workers 4]
+import argparse
+import math
+import os
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "3_run_ta"))
+sys.path.insert(0, os.path.join(ROOT, "common"))
+from backtest import SIGNAL_GENERATORS, backtest, backtest_many
+from indicators import IndicatorFrame
+from local_runner.synthetic import synthetic_frame
+
+SYMBOLS = 500
+BARS = 252 * 10
+COST = 0.001
+ALGO = {"awesome-oscillator": {"strategy": "crossover", "direction": "bullish"}}
+CHECKED = 20
+
+
+def legacy_backtest(close, signal, cost):
+    # one bar at a time, the obvious way
+    holding = False
+    entry = None
+    equity = 1.0
+    peak = 1.0
+    max_drawdown = 0.0
+    trades = []
+    for i in range(len(close)):
+        if i > 0 and holding:
+            equity *= close[i] / close[i - 1]
+        if signal[i] == 1 and not holding:
+            holding = True
+            entry = close[i]
+            equity /= 1 + cost
+        elif signal[i] == -1 and holding:
+            holding = False
+            trades.append(close[i] * (1 - cost) / (entry * (1 + cost)) - 1)
+            equity *= 1 - cost
+        peak = max(peak, equity)
+        max_drawdown = min(max_drawdown, equity / peak - 1)
+    return {
+        "closed_trades": len(trades),
+        "hit_rate": (
+            sum(1 for trade in trades if trade > 0) / len(trades) if trades else None
+        ),
+        "total_return": equity - 1,
+        "max_drawdown": max_drawdown,
+    }
+
+
+def check(frames):
+    generate = SIGNAL_GENERATORS[list(ALGO.keys())[0]]
+    for symbol in list(frames)[:CHECKED]:
+        df = frames[symbol]
+        close = df["Close"].to_numpy(dtype=float)
+        signal = generate(IndicatorFrame(df), ALGO)
+        fast = backtest(close, signal, COST)
+        slow = legacy_backtest(close, signal, COST)
+        for key, value in slow.items():
+            same = (
+                value == fast[key]
+                if value is None or isinstance(value, int)
+                else math.isclose(value, fast[key], rel_tol=1e-9, abs_tol=1e-12)
+            )
+            if not same:
+                raise AssertionError(
+                    f"{symbol} {key}: vectorised {fast[key]} != legacy {value}"
+                )
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=SYMBOLS)
+    parser.add_argument("--bars", type=int, default=BARS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    frames = {
+        f"sym{i}": synthetic_frame(args.bars, seed=i) for i in range(args.symbols)
+    }
+    check(frames)
+
+    single_time, results = timed(backtest_many, frames, ALGO, COST, workers=1)
+    pool_time, pooled = timed(backtest_many, frames, ALGO, COST, workers=args.workers)
+    if pooled != results:
+        raise AssertionError("Process pool results do not match the in process ones")
+
+    hit_rates = [r["hit_rate"] for r in results.values() if r["hit_rate"] is not None]
+    print(f"{args.symbols} symbols x {args.bars} bars, cost {COST} each way")
+    print(f"  in process                {single_time:>8.3f}s")
+    print(f"  process pool ({args.workers} workers)  {pool_time:>8.3f}s")
+    print(
+        f"  mean hit rate {np.mean(hit_rates):.3f}, mean trades {np.mean([r['trades'] for r in results.values()]):.1f}"
+    )
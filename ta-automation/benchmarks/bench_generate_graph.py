@@ -0,0 +1,104 @@
+# render time and memory for the AO graph, old pyplot + one bar() per row vs the reused Agg figure with the
+# histogram drawn as one collection. run from the ta-automation folder: python benchmarks/bench_generate_graph.py
+import gc
+import os
+import resource
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "4_generate_graph"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+from generate_graph import render_ao_graph
+
+SIZES = [100, 10_000, 100_000]
+# the old renderer makes one artist per bar, so it's only run up to here or it takes forever
+LEGACY_LIMIT = 10_000
+RENDERS = 3
+
+
+def legacy_render(df, ta_data, symbol, graph_file):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    ax1 = plt.subplot2grid((10, 1), (0, 0), rowspan=5, colspan=1)
+    ax2 = plt.subplot2grid((10, 1), (6, 0), rowspan=4, colspan=1)
+    ax1.plot(df["Close"], label=symbol, color="skyblue")
+    ax1.plot(df.index, ta_data["awesome-oscillator-buy-price"], marker="^", linewidth=0)
+    ax1.plot(
+        df.index, ta_data["awesome-oscillator-sell-price"], marker="v", linewidth=0
+    )
+    ax1.legend()
+    for i in range(len(df)):
+        if ta_data["awesome-oscillator"][i - 1] > ta_data["awesome-oscillator"][i]:
+            ax2.bar(df.index[i], ta_data["awesome-oscillator"][i], color="#f44336")
+        else:
+            ax2.bar(df.index[i], ta_data["awesome-oscillator"][i], color="#26a69a")
+    # never closed, same as the old lambda
+    plt.savefig(graph_file)
+
+
+def make_inputs(size, seed=42):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, size))
+    df = pd.DataFrame(
+        {"Close": close}, index=pd.date_range("2022-01-03", periods=size, freq="min")
+    )
+    ao = np.sin(np.arange(size) / 20) + rng.normal(0, 0.1, size)
+    signal = [0] * size
+    buy = [None] * size
+    sell = [None] * size
+    for i in range(0, size, max(size // 10, 1)):
+        signal[i] = 1
+        buy[i] = float(close[i])
+    # the price lists for the legacy renderer, the signal for the current one - it marks the close at each signal
+    ta_data = {
+        "awesome-oscillator-buy-price": buy,
+        "awesome-oscillator-sell-price": sell,
+        "awesome-oscillator-signal": signal,
+        "awesome-oscillator": ao.tolist(),
+    }
+    return df, ta_data
+
+
+def current_rss_mb():
+    # current resident set size where /proc is available, otherwise peak RSS
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench(render, df, ta_data, graph_file):
+    # several renders in a row, like a warm lambda would do, to see whether memory keeps climbing
+    timings = []
+    for _ in range(RENDERS):
+        started = time.perf_counter()
+        render(df, ta_data, "BENCH", graph_file)
+        timings.append(time.perf_counter() - started)
+        gc.collect()
+    return min(timings), current_rss_mb()
+
+
+if __name__ == "__main__":
+    graph_file = os.path.join(tempfile.mkdtemp(), "bench.png")
+    print(f"{'bars':>8} {'renderer':>10} {'render (s)':>11} {'rss after (MB)':>15}")
+    for size in SIZES:
+        df, ta_data = make_inputs(size)
+        render_time, rss = bench(render_ao_graph, df, ta_data, graph_file)
+        print(f"{size:>8} {'reused':>10} {render_time:>11.3f} {rss:>15.1f}")
+
+    # legacy last, since it leaks figures into pyplot and would skew the numbers above
+    for size in SIZES:
+        if size > LEGACY_LIMIT:
+            print(f"{size:>8} {'legacy':>10} {'skipped':>11} {'':>15}")
+            continue
+        df, ta_data = make_inputs(size)
+        render_time, rss = bench(legacy_render, df, ta_data, graph_file)
+        print(f"{size:>8} {'legacy':>10} {render_time:>11.3f} {rss:>15.1f}")
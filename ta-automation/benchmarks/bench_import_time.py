@@ -0,0 +1,266 @@
+# cold start cost per stage - how long importing each lambda module takes, which of its imports that time goes to,
+# and how long a fresh process takes to import it and run its cheapest path (bad algo name, "Algo not implemented",
+# no notify method...). each measurement is its own python process, since a module only costs anything the first
+# time it's imported
+#
+# run from the ta-automation folder:
+#   python benchmarks/bench_import_time.py                   this tree
+#   python benchmarks/bench_import_time.py --ref HEAD~1      this tree next to an older commit, as before/after
+#   python benchmarks/bench_import_time.py --save            also write benchmarks/baselines/import_time.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "baselines", "import_time.json")
+
+# legacy to_json shape, which every version of the stages can read
+TINY_SYMBOL_DATA = {
+    column: {"1641168000000": 1.0}
+    for column in ("Open", "High", "Low", "Close", "Volume")
+}
+JOB = {
+    "symbol": "bhp",
+    "date_from": "2022-01-01T04:16:13+10:00",
+    "date_to": "2022-03-30T04:16:13+10:00",
+    "resolution": "1d",
+    "search_period": 20,
+    "notify_method": None,
+    "notify_recipient": None,
+    "target_ta_confidence": 7,
+}
+
+# stage dir, module, and the payload for a path that shouldn't need any of the heavy imports (None to only time
+# the import)
+STAGES = [
+    (
+        "1_job_scan",
+        "job_scan",
+        {"jobs": [{**JOB, "ta_algos": [{"stoch": None}]}]},
+    ),
+    ("2_get_symbol_data", "get_symbol_data", None),
+    (
+        "3_run_ta",
+        "run_ta",
+        {**JOB, "ta_algo": {"not-an-algo": None}, "symbol_data": TINY_SYMBOL_DATA},
+    ),
+    (
+        "4_generate_graph",
+        "generate_graph",
+        {
+            **JOB,
+            "ta_algo": {"stoch": None},
+            "ta_analysis": {"confidence": 10, "ta_data": {}},
+            "symbol_data": TINY_SYMBOL_DATA,
+        },
+    ),
+    (
+        "5_calculate_confidence",
+        "calculate_confidence",
+        [
+            {
+                **JOB,
+                "ta_algo": {"stoch": None},
+                "ta_analysis": {"confidence": 10, "ta_data": None},
+                "symbol_data": TINY_SYMBOL_DATA,
+                "graph_url": "Graph not available",
+            }
+        ],
+    ),
+    (
+        "6_notify",
+        "notify",
+        {
+            "job": JOB,
+            "ta_summary": {"overall_ta_confidence": 10, "target_ta_confidence": 7},
+            "ta_analyses": [],
+        },
+    ),
+    ("slackbot", "slackbot", None),
+]
+
+COLD_PATH_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+payload = json.loads(sys.argv[1])
+if payload is not None:
+    try:
+        {module}.lambda_handler({{"Payload": payload}}, None)
+    except ValueError:
+        # bad algo names are supposed to fail
+        pass
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def run_python(tree, stage_dir, args):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.join(tree, "common")
+    # don't let metrics or stores configured in this shell change what gets imported
+    for name in ("TA_METRICS", "SYMBOL_DATA_STORE", "INDICATOR_STATE_STORE"):
+        env.pop(name, None)
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=os.path.join(tree, stage_dir),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+
+def parse_importtime(stderr, module):
+    # -X importtime prints "import time: self | cumulative | name" as each import finishes, children first,
+    # indented two spaces per level. returns (total us, {direct import: cumulative us})
+    direct = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            # the header line
+            continue
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        name = name.strip()
+        if depth == 0 and name == module:
+            return int(cumulative), direct
+        if depth == 0:
+            direct = {}
+        elif depth == 1:
+            direct[name] = int(cumulative)
+    return None, {}
+
+
+def measure_stage(tree, stage_dir, module, payload, repeats):
+    imports = []
+    direct = {}
+    cold_paths = []
+    for _ in range(repeats):
+        result = run_python(
+            tree, stage_dir, ["-X", "importtime", "-c", f"import {module}"]
+        )
+        total, direct = parse_importtime(result.stderr, module)
+        if result.returncode != 0 or total is None:
+            # usually a dependency that isn't installed here
+            return {"error": result.stderr.strip().splitlines()[-1]}
+        imports.append(total / 1000)
+
+        result = run_python(
+            tree,
+            stage_dir,
+            ["-c", COLD_PATH_SCRIPT.format(module=module), json.dumps(payload)],
+        )
+        if result.returncode == 0:
+            cold_paths.append(float(result.stdout.strip().splitlines()[-1]))
+
+    heaviest = sorted(direct.items(), key=lambda item: -item[1])[:5]
+    return {
+        "import_ms": statistics.median(imports),
+        "cold_path_ms": statistics.median(cold_paths) if cold_paths else None,
+        "heaviest": {name: us / 1000 for name, us in heaviest},
+    }
+
+
+def measure_tree(tree, repeats):
+    return {
+        module: measure_stage(tree, stage_dir, module, payload, repeats)
+        for stage_dir, module, payload in STAGES
+    }
+
+
+def export_ref(ref, into):
+    # the ta-automation folder as it was at ref
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, check=True
+        ).stdout
+
+    prefix = git("rev-parse", "--show-prefix").decode().strip()
+    top = git("rev-parse", "--show-toplevel").decode().strip()
+    # archive from the top of the repo, git won't do it from a subdirectory
+    archive = subprocess.run(
+        ["git", "archive", f"{ref}:{prefix}"], cwd=top, capture_output=True, check=True
+    ).stdout
+    subprocess.run(["tar", "-x", "-C", into], input=archive, check=True)
+    return into
+
+
+def fmt(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_report(results, before=None):
+    if before:
+        print(
+            f"{'module':<22} {'import ms':>10} {'before':>10} {'cold path ms':>13} {'before':>10}  heaviest imports"
+        )
+    else:
+        print(
+            f"{'module':<22} {'import ms':>10} {'cold path ms':>13}  heaviest imports"
+        )
+
+    for module, stats in results.items():
+        if "error" in stats:
+            print(f"{module:<22} {stats['error']}")
+            continue
+        heaviest = ", ".join(
+            f"{name} {ms:.0f}" for name, ms in stats["heaviest"].items()
+        )
+        if before:
+            old = before.get(module, {})
+            print(
+                f"{module:<22} {fmt(stats['import_ms']):>10} {fmt(old.get('import_ms')):>10}"
+                f" {fmt(stats['cold_path_ms']):>13} {fmt(old.get('cold_path_ms')):>10}  {heaviest}"
+            )
+        else:
+            print(
+                f"{module:<22} {fmt(stats['import_ms']):>10} {fmt(stats['cold_path_ms']):>13}  {heaviest}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ref", help="git revision to compare against, eg HEAD~1")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    args = parser.parse_args()
+
+    results = measure_tree(ROOT, args.repeats)
+    before = None
+    if args.ref:
+        with tempfile.TemporaryDirectory() as workdir:
+            before = measure_tree(export_ref(args.ref, workdir), args.repeats)
+
+    print_report(results, before)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {
+                    "python": sys.version.split()[0],
+                    "repeats": args.repeats,
+                    # the commit, since HEAD~1 etc won't mean the same thing later
+                    "ref": args.ref
+                    and subprocess.run(
+                        ["git", "rev-parse", "--short", args.ref],
+                        cwd=ROOT,
+                        capture_output=True,
+                        text=True,
+                    ).stdout.strip(),
+                    "results": results,
+                    "before": before,
+                },
+                f,
+                indent=2,
+            )
+        print(f"baseline written to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmark for run TA's panel mode (3_run_ta/panel.py) against the per symbol path, at 10, 100 and 1000 symbols
+# both sides start from parsed frames and run AO (with the crossover and signal search), stochastic and A/D, so this
+# is indicator time only. histories are ragged - each symbol gets a random number of bars up to --bars
+#
+# run from the ta-automation folder: python benchmarks/bench_panel.py [--bars 1000] [--symbols 10 100 1000]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "3_run_ta"))
+sys.path.insert(0, os.path.join(ROOT, "common"))
+from indicators import IndicatorFrame
+from local_runner.synthetic import synthetic_frame
+from panel import Panel
+from run_ta import run_algo, run_panel_algo
+
+SYMBOLS = [10, 100, 1000]
+BARS = 1000
+SEARCH_PERIOD = 20
+ALGOS = [
+    {"awesome-oscillator": {"strategy": "crossover", "direction": "bullish"}},
+    {"stoch": None},
+    {"accumulation-distribution": None},
+]
+
+
+def make_frames(count, bars, seed=42):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(bars // 2, bars + 1, count)
+    return {
+        f"sym{i}": synthetic_frame(int(length), seed=i)
+        for i, length in enumerate(lengths)
+    }
+
+
+def best_of(func, *args, repeats=3):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def per_symbol_run(frames):
+    # what run_ta does today, one symbol per invocation. the frame is copied since run_algo adds columns to it
+    return {
+        symbol: [
+            run_algo(IndicatorFrame(frame.copy()), ta_algo, SEARCH_PERIOD)["confidence"]
+            for ta_algo in ALGOS
+        ]
+        for symbol, frame in frames.items()
+    }
+
+
+def panel_run(frames):
+    panel = Panel(frames)
+    analyses = [run_panel_algo(panel, ta_algo, SEARCH_PERIOD) for ta_algo in ALGOS]
+    return {
+        symbol: [by_symbol[symbol]["confidence"] for by_symbol in analyses]
+        for symbol in frames
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, nargs="+", default=SYMBOLS)
+    parser.add_argument("--bars", type=int, default=BARS)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'symbols':>8} {'bars':>9} {'per symbol (s)':>15} {'panel (s)':>10} {'speedup':>8} {'per symbol/sym (ms)':>20}"
+    )
+    for count in args.symbols:
+        frames = make_frames(count, args.bars)
+        bars = sum(len(frame) for frame in frames.values())
+
+        per_symbol_time, per_symbol = best_of(
+            per_symbol_run, frames, repeats=args.repeats
+        )
+        panel_time, panel = best_of(panel_run, frames, repeats=args.repeats)
+
+        if per_symbol != panel:
+            raise AssertionError(
+                f"Panel confidences do not match the per symbol path for {count} symbols"
+            )
+
+        print(
+            f"{count:>8} {bars:>9} {per_symbol_time:>15.4f} {panel_time:>10.4f}"
+            f" {per_symbol_time / panel_time:>7.1f}x {1000 * per_symbol_time / count:>20.2f}"
+        )
@@ -0,0 +1,76 @@
+# benchmark for run TA's result cache (3_run_ta/result_cache.py) - the same job three times at each size: a miss that
+# runs the indicators, a hit from the memory tier, and a hit from the store tier with memory cleared, as a fresh
+# container would see it. the three results have to be the same. the data goes by claim check, like it does deployed -
+# inline data isn't cached
+#
+# run from the ta-automation folder: python benchmarks/bench_result_cache.py [--sizes 2000 20000 200000]
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "common"))
+sys.path.insert(0, os.path.join(ROOT, "3_run_ta"))
+from local_runner.synthetic import synthetic_frame
+from ta_common.object_store import LocalObjectStore
+from ta_common.symbol_data import store_symbol_data
+from ta_common.wire_format import encode_frame
+
+SIZES = [2_000, 20_000, 200_000]
+ALGOS = [
+    {"awesome-oscillator": None},
+    {"stoch": None},
+    {"accumulation-distribution": None},
+]
+
+
+def payload(size, symbol_store):
+    df = synthetic_frame(size, resolution="1m", seed=4)
+    return {
+        "symbol": "BENCH",
+        "resolution": "1m",
+        "date_from": str(df.index[0]),
+        "date_to": str(df.index[-1]),
+        "search_period": 20,
+        "ta_algos": ALGOS,
+        "symbol_data": store_symbol_data(encode_frame(df), "BENCH", "1m", symbol_store),
+    }
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    args = parser.parse_args()
+
+    import run_ta
+    from result_cache import ResultCache
+
+    with tempfile.TemporaryDirectory() as store, tempfile.TemporaryDirectory() as symbol_store:
+        cache = ResultCache(256 * 1024 * 1024, LocalObjectStore(store))
+        run_ta.result_cache = cache
+
+        print(f"{'bars':>9} {'miss (s)':>10} {'memory (s)':>11} {'store (s)':>10}")
+        for size in args.sizes:
+            event = {"Payload": payload(size, symbol_store)}
+            miss_time, miss = timed(run_ta.lambda_handler, event, None)
+            memory_time, memory = timed(run_ta.lambda_handler, event, None)
+            cache.entries.clear()
+            cache.size = 0
+            store_time, stored = timed(run_ta.lambda_handler, event, None)
+
+            if not json.dumps(miss) == json.dumps(memory) == json.dumps(stored):
+                raise AssertionError(f"cached results at {size} bars don't match")
+            print(
+                f"{size:>9} {miss_time:>10.4f} {memory_time:>11.4f} {store_time:>10.4f}"
+            )
+        print(cache.stats)
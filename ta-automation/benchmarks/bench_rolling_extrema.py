@@ -0,0 +1,99 @@
+# benchmark for the rolling extrema kernel in 3_run_ta/extrema.py against pandas rolling max/min and the sliding
+# window reduce the panel used before it (O(n*window)), over a (bar, symbol) panel at a few window sizes. %K and %D
+# from IndicatorFrame and Panel are checked against ta's StochasticOscillator first, where ta is installed
+#
+# run from the ta-automation folder: python benchmarks/bench_rolling_extrema.py [--bars 2520] [--symbols 500]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "3_run_ta"))
+sys.path.insert(0, os.path.join(ROOT, "common"))
+from extrema import rolling_max
+from indicators import IndicatorFrame
+from local_runner.synthetic import synthetic_frame
+from panel import Panel
+
+BARS = 252 * 10
+SYMBOLS = 500
+WINDOWS = [5, 14, 50, 200]
+CHECKED = 20
+
+
+def sliding_max(values, window):
+    # what panel.py did before extrema.py - every window reduced on its own
+    padding = np.full((window - 1, values.shape[1]), np.nan)
+    windows = sliding_window_view(np.vstack([padding, values]), window, axis=0)
+    return np.fmax.reduce(windows, axis=-1)
+
+
+def pandas_max(values, window):
+    return pd.DataFrame(values).rolling(window, min_periods=0).max().to_numpy()
+
+
+def check_stoch(frames):
+    try:
+        from ta.momentum import StochasticOscillator
+    except ImportError:
+        print("ta isn't installed, skipping the StochasticOscillator check")
+        return
+
+    checked = dict(list(frames.items())[:CHECKED])
+    panel_k, panel_d = Panel(checked).stoch()
+    for i, (symbol, df) in enumerate(checked.items()):
+        expected = StochasticOscillator(df["High"], df["Low"], df["Close"], fillna=True)
+        k, d = IndicatorFrame(df).stoch()
+        for name, got, want in [
+            ("%K", k.to_numpy(), expected.stoch().to_numpy()),
+            ("%D", d.to_numpy(), expected.stoch_signal().to_numpy()),
+            ("panel %K", panel_k[-len(df) :, i], expected.stoch().to_numpy()),
+            ("panel %D", panel_d[-len(df) :, i], expected.stoch_signal().to_numpy()),
+        ]:
+            if not np.allclose(got, want, rtol=0, atol=1e-9):
+                raise AssertionError(f"{symbol} {name} doesn't match ta")
+
+
+def best_of(func, *args, repeats=3):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=BARS)
+    parser.add_argument("--symbols", type=int, default=SYMBOLS)
+    parser.add_argument("--windows", type=int, nargs="+", default=WINDOWS)
+    args = parser.parse_args()
+
+    frames = {
+        f"sym{i}": synthetic_frame(args.bars, seed=i) for i in range(args.symbols)
+    }
+    check_stoch(frames)
+    highs = np.column_stack(
+        [df["High"].to_numpy(dtype=float) for df in frames.values()]
+    )
+
+    print(f"{args.symbols} symbols x {args.bars} bars")
+    print(f"{'window':>7} {'kernel (s)':>11} {'pandas (s)':>11} {'sliding (s)':>12}")
+    for window in args.windows:
+        kernel_time, kernel = best_of(rolling_max, highs, window)
+        pandas_time, expected = best_of(pandas_max, highs, window)
+        sliding_time, sliding = best_of(sliding_max, highs, window)
+        if not (
+            np.array_equal(kernel, expected, equal_nan=True)
+            and np.array_equal(sliding, expected, equal_nan=True)
+        ):
+            raise AssertionError(f"Rolling max doesn't match pandas at window {window}")
+        print(
+            f"{window:>7} {kernel_time:>11.4f} {pandas_time:>11.4f} {sliding_time:>12.4f}"
+        )
@@ -0,0 +1,109 @@
+# benchmark for the stochastic crossover and A/D divergence detectors in 3_run_ta/signals.py on long intraday series
+# (a year of 1m bars is ~100k, five years ~500k). a bar by bar python version of each is kept here as the reference
+# and checked against the vectorised one on the first --checked bars, then everything from the indicators to the
+# graded confidence is timed at each size
+#
+# run from the ta-automation folder: python benchmarks/bench_signal_detectors.py [--sizes 10000 100000 500000]
+import argparse
+import math
+import os
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "3_run_ta"))
+sys.path.insert(0, os.path.join(ROOT, "common"))
+from indicators import IndicatorFrame
+from local_runner.synthetic import synthetic_frame
+from signals import (
+    OVERBOUGHT,
+    OVERSOLD,
+    divergence_events,
+    graded_confidence,
+    stoch_events,
+)
+
+SIZES = [10_000, 100_000, 500_000]
+SEARCH_PERIOD = 20
+WINDOW = 20
+CHECKED = 5_000
+
+
+def legacy_stoch_events(k, d):
+    events = [0] * len(k)
+    for i in range(1, len(k)):
+        if k[i] > d[i] and k[i - 1] < d[i - 1] and min(k[i - 1], d[i - 1]) < OVERSOLD:
+            events[i] = 1
+        elif (
+            k[i] < d[i] and k[i - 1] > d[i - 1] and max(k[i - 1], d[i - 1]) > OVERBOUGHT
+        ):
+            events[i] = -1
+    return events
+
+
+def legacy_divergence_events(price, indicator, window):
+    events = [0] * len(price)
+    for i in range(1, len(price)):
+        before = range(max(0, i - window), i)
+        prices = [price[j] for j in before if not math.isnan(price[j])]
+        if not prices or math.isnan(price[i]):
+            continue
+        if price[i] < min(prices) and indicator[i] > min(indicator[j] for j in before):
+            events[i] = 1
+        elif price[i] > max(prices) and indicator[i] < max(
+            indicator[j] for j in before
+        ):
+            events[i] = -1
+    return events
+
+
+def check(df):
+    frame = IndicatorFrame(df.iloc[:CHECKED])
+    k, d = frame.stoch()
+    k, d = k.to_numpy(), d.to_numpy()
+    if stoch_events(k, d)[0].tolist() != legacy_stoch_events(k, d):
+        raise AssertionError("Stochastic events don't match the bar by bar version")
+
+    close = frame.df["Close"].to_numpy(dtype=float)
+    acc_dist = frame.acc_dist().to_numpy()
+    if divergence_events(close, acc_dist, WINDOW)[
+        0
+    ].tolist() != legacy_divergence_events(close, acc_dist, WINDOW):
+        raise AssertionError("Divergence events don't match the bar by bar version")
+
+
+def stoch_confidence(df):
+    signal, strength = stoch_events(*IndicatorFrame(df).stoch())
+    return graded_confidence(signal, strength, SEARCH_PERIOD)
+
+
+def divergence_confidence(df):
+    frame = IndicatorFrame(df)
+    signal, strength = divergence_events(df["Close"], frame.acc_dist(), WINDOW)
+    return graded_confidence(signal, strength, SEARCH_PERIOD)
+
+
+def best_of(func, *args, repeats=3):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    args = parser.parse_args()
+
+    check(synthetic_frame(CHECKED, resolution="1m", seed=1))
+
+    print(f"{'bars':>9} {'stoch (s)':>10} {'A/D (s)':>10}")
+    for size in args.sizes:
+        df = synthetic_frame(size, resolution="1m", seed=1)
+        stoch_time, _ = best_of(stoch_confidence, df)
+        divergence_time, _ = best_of(divergence_confidence, df)
+        print(f"{size:>9} {stoch_time:>10.4f} {divergence_time:>10.4f}")
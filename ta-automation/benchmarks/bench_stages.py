@@ -0,0 +1,257 @@
+# latency percentiles, payload bytes in/out and peak memory for every stage's lambda_handler at a few data sizes,
+# driven with the same {"Payload": ...} Step Functions sends. the data comes from the seeded synthetic generator in
+# local_runner, and yfinance/SSM/Pushover are the local_runner stand-ins, so runs are repeatable and offline
+#
+# run from the ta-automation folder:
+#   python benchmarks/bench_stages.py                       print the table
+#   python benchmarks/bench_stages.py --save                 also write benchmarks/baselines/stages.json
+#   python benchmarks/bench_stages.py --compare              flag anything slower/bigger than the saved baseline
+#
+# the symbol data is passed inline (no claim check) and the OHLCV cache is off, so get_symbol_data always goes to
+# the provider and the payload sizes are the worst case. job_scan doesn't look at bars, so its "size" is the number
+# of jobs (one per 100 bars) instead
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from local_runner.synthetic import RESOLUTION_FREQUENCIES
+
+SIZES = [100, 1_000, 10_000, 100_000]
+DEFAULT_RESOLUTION = "1m"
+START = pd.Timestamp("2022-01-03", tz="UTC")
+ALGOS = [
+    {"awesome-oscillator": {"strategy": "crossover", "direction": "bullish"}},
+    {"stoch": None},
+    {"accumulation-distribution": None},
+]
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baselines", "stages.json"
+)
+
+# what the functions get in template.yaml - the Globals timeout, and the default memory since none is set
+LAMBDA_MEMORY_MB = 128
+LAMBDA_TIMEOUT_S = 30
+
+# how much worse than the baseline counts as a regression
+TOLERANCE = 1.25
+
+
+def payload_bytes(value):
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+def make_job(size, resolution, symbol="bench"):
+    # a date range that holds exactly `size` synthetic bars at this resolution
+    frequency = RESOLUTION_FREQUENCIES[resolution]
+    date_to = pd.date_range(START, periods=size + 1, freq=frequency)[-1]
+    return {
+        "symbol": symbol,
+        "date_from": START.isoformat(),
+        "date_to": date_to.isoformat(),
+        "ta_algos": ALGOS,
+        "resolution": resolution,
+        "search_period": 20,
+        "notify_method": "pushover",
+        "notify_recipient": "bench-recipient",
+        "target_ta_confidence": 7,
+    }
+
+
+def measure(stages, stage, payload, repeats, before=None):
+    # latency with nothing else running, then one more call under tracemalloc for the peak - tracing slows numpy
+    # and pandas down a lot, so it can't be on while we time things. tracemalloc sees python and numpy allocations
+    # but not matplotlib's Agg buffers, so treat the graph numbers as a lower bound
+    event = {"Payload": payload}
+    durations = []
+    result = None
+    for _ in range(repeats):
+        if before:
+            before()
+        started = time.perf_counter()
+        result = stages[stage].lambda_handler(event, None)
+        durations.append(time.perf_counter() - started)
+
+    if before:
+        before()
+    tracemalloc.start()
+    stages[stage].lambda_handler(event, None)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations = np.array(durations) * 1000
+    return result, {
+        "p50_ms": float(np.percentile(durations, 50)),
+        "p90_ms": float(np.percentile(durations, 90)),
+        "p99_ms": float(np.percentile(durations, 99)),
+        "max_ms": float(durations.max()),
+        "bytes_in": payload_bytes(payload),
+        "bytes_out": payload_bytes(result),
+        "peak_mb": peak / 2**20,
+    }
+
+
+def bench_size(stages, size, resolution, repeats):
+    job = make_job(size, resolution)
+    results = {}
+
+    # job scan, with one job per 100 bars. it fills in optional keys in place, so it gets a fresh copy every call
+    jobs = {
+        "jobs": [
+            make_job(size, resolution, f"bench{i}") for i in range(max(1, size // 100))
+        ]
+    }
+    scan_payload = json.loads(json.dumps(jobs))
+    _, results["job_scan"] = measure(
+        stages,
+        "job_scan",
+        scan_payload,
+        repeats,
+        before=lambda: scan_payload.update(json.loads(json.dumps(jobs))),
+    )
+
+    scan = stages["job_scan"].lambda_handler({"Payload": {"jobs": [job]}}, None)
+    group = scan["fetch_groups"][0]
+    symbol_data, results["get_symbol_data"] = measure(
+        stages, "get_symbol_data", group, repeats
+    )
+
+    analysed = []
+    for item in group["items"]:
+        algo_name = list(item["ta_algo"].keys())[0]
+        item = {**item, "symbol_data": symbol_data}
+        item["ta_analysis"], results[f"run_ta[{algo_name}]"] = measure(
+            stages, "run_ta", item, repeats
+        )
+
+        # empty the graph store before every call, otherwise we'd only be timing the cache hit
+        graph_dir = os.environ["GRAPH_STORE"]
+        item["graph_url"], results[f"generate_graph[{algo_name}]"] = measure(
+            stages,
+            "generate_graph",
+            item,
+            repeats,
+            before=lambda: shutil.rmtree(graph_dir, ignore_errors=True),
+        )
+        analysed.append(item)
+
+    confidence, results["calculate_confidence"] = measure(
+        stages, "calculate_confidence", [analysed], repeats
+    )
+    _, results["notify"] = measure(
+        stages, "notify", confidence["job_results"][0], repeats
+    )
+    return results
+
+
+def over_budget(stats):
+    problems = []
+    if stats["max_ms"] > LAMBDA_TIMEOUT_S * 1000:
+        problems.append(f"max {stats['max_ms']:.0f}ms > {LAMBDA_TIMEOUT_S}s timeout")
+    if stats["peak_mb"] > LAMBDA_MEMORY_MB:
+        problems.append(f"peak {stats['peak_mb']:.0f}MB > {LAMBDA_MEMORY_MB}MB memory")
+    return problems
+
+
+def regressions(stats, baseline):
+    problems = []
+    for metric in ("p50_ms", "p90_ms", "bytes_out", "peak_mb"):
+        # tiny numbers are all noise
+        floor = {"p50_ms": 1, "p90_ms": 1, "bytes_out": 1024, "peak_mb": 1}[metric]
+        if stats[metric] > max(baseline[metric], floor) * TOLERANCE:
+            problems.append(f"{metric} {baseline[metric]:.1f} -> {stats[metric]:.1f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument(
+        "--resolution",
+        choices=sorted(RESOLUTION_FREQUENCIES),
+        default=DEFAULT_RESOLUTION,
+    )
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument(
+        "--save", action="store_true", help="write the results as the new baseline"
+    )
+    parser.add_argument(
+        "--compare", action="store_true", help="compare against the saved baseline"
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-stages-")
+    os.environ["SYMBOL_DATA_STORE"] = ""
+    os.environ["OHLCV_CACHE_DIR"] = ""
+    # every repeat has to actually run TA
+    os.environ["RESULT_CACHE_STORE"] = ""
+    os.environ["RESULT_CACHE_MB"] = "0"
+    os.environ["GRAPH_STORE"] = os.path.join(workdir, "graphs")
+
+    from local_runner.runner import load_stages
+
+    stages = load_stages(workdir)
+
+    baseline = None
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    print(
+        f"{'bars':>7} {'stage':<42} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}"
+        f" {'in bytes':>10} {'out bytes':>10} {'peak MB':>8}"
+    )
+    all_results = {}
+    failed = False
+    for size in args.sizes:
+        results = bench_size(stages, size, args.resolution, args.repeats)
+        all_results[str(size)] = results
+        for stage, stats in results.items():
+            problems = over_budget(stats)
+            if baseline and stage in baseline.get(str(size), {}):
+                problems += regressions(stats, baseline[str(size)][stage])
+            failed = failed or bool(problems)
+            print(
+                f"{size:>7} {stage:<42} {stats['p50_ms']:>9.2f} {stats['p90_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+                f" {stats['bytes_in']:>10} {stats['bytes_out']:>10} {stats['peak_mb']:>8.1f}"
+                + (f"  !! {'; '.join(problems)}" if problems else "")
+            )
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "repeats": args.repeats,
+                    "resolution": args.resolution,
+                    "budget": {
+                        "memory_mb": LAMBDA_MEMORY_MB,
+                        "timeout_s": LAMBDA_TIMEOUT_S,
+                    },
+                    "results": all_results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"baseline written to {args.baseline}")
+
+    # non zero exit when something's over budget or regressed, so it can gate a build
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmark for the parameter sweep in 3_run_ta/sweep.py against backtesting every grid point from scratch (a fresh
+# IndicatorFrame and backtest per point per symbol), then the top of the ranking
+#
+# run from the ta-automation folder: python benchmarks/bench_sweep.py [--symbols 100] [--bars 2520] [--workers 4]
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "3_run_ta"))
+sys.path.insert(0, os.path.join(ROOT, "common"))
+from backtest import backtest_frame
+from local_runner.synthetic import synthetic_frame
+from sweep import grid_points, sweep
+
+SYMBOLS = 100
+BARS = 252 * 10
+ALGO = "awesome-oscillator"
+COST = 0.001
+
+
+def from_scratch(frames):
+    # every point backtested on its own
+    return [
+        [backtest_frame(frame.copy(), {ALGO: point}, COST) for frame in frames.values()]
+        for point in grid_points(ALGO)
+    ]
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=SYMBOLS)
+    parser.add_argument("--bars", type=int, default=BARS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    frames = {
+        f"sym{i}": synthetic_frame(args.bars, seed=i) for i in range(args.symbols)
+    }
+    points = len(grid_points(ALGO))
+
+    scratch_time, _ = timed(from_scratch, frames)
+    shared_time, ranking = timed(sweep, frames, ALGO, cost=COST, workers=1)
+    pool_time, pooled = timed(sweep, frames, ALGO, cost=COST, workers=args.workers)
+    if pooled != ranking:
+        raise AssertionError("Process pool ranking does not match the in process one")
+
+    print(f"{points} grid points x {args.symbols} symbols x {args.bars} bars")
+    print(f"  from scratch                 {scratch_time:>8.3f}s")
+    print(
+        f"  shared, in process           {shared_time:>8.3f}s  {scratch_time / shared_time:>5.1f}x"
+    )
+    print(
+        f"  shared, {args.workers} workers{'':<{13 - len(str(args.workers))}}{pool_time:>8.3f}s  {scratch_time / pool_time:>5.1f}x"
+    )
+    print()
+    for result in ranking[:5]:
+        print(
+            f"  {result['ta_algo']}  hit rate {result['hit_rate']:.3f} over {result['closed_trades']} trades,"
+            f" mean return {result['mean_total_return']:.3f}"
+        )
@@ -0,0 +1,81 @@
+# benchmark for run TA's compact output (ta_common/ta_output.py) - the size of the response going back into the step
+# functions state, and the time to produce and serialise it, for "ta_output": "full" and "compact" at a few sizes of
+# 1m data. the compact window, expanded back out, has to match the end of the full series
+#
+# run from the ta-automation folder: python benchmarks/bench_ta_output.py [--sizes 10000 100000 500000] [--window 250]
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ["RESULT_CACHE_STORE"] = ""
+os.environ["RESULT_CACHE_MB"] = "0"
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "common"))
+sys.path.insert(0, os.path.join(ROOT, "3_run_ta"))
+from local_runner.synthetic import synthetic_frame
+from ta_common.ta_output import window_ta_data
+from ta_common.wire_format import encode_frame
+
+SIZES = [10_000, 100_000, 500_000]
+WINDOW = 250
+ALGOS = [
+    {"awesome-oscillator": None},
+    {"stoch": None},
+    {"accumulation-distribution": None},
+]
+
+
+def respond(handler, payload):
+    # what leaves the lambda - the response, serialised
+    started = time.perf_counter()
+    body = json.dumps(handler({"Payload": payload}, None))
+    return time.perf_counter() - started, body
+
+
+def check(full, compact, window):
+    for full_result, compact_result in zip(json.loads(full), json.loads(compact)):
+        full_data = full_result["ta_analysis"]["ta_data"]
+        for name, values in window_ta_data(
+            compact_result["ta_analysis"]["ta_data"]
+        ).items():
+            if values != full_data[name][-window:]:
+                raise AssertionError(f"compact {name} doesn't match the full series")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--window", type=int, default=WINDOW)
+    args = parser.parse_args()
+
+    from run_ta import lambda_handler
+
+    print(
+        f"{'bars':>9} {'full (bytes)':>13} {'compact (bytes)':>16} "
+        f"{'full (s)':>9} {'compact (s)':>12}"
+    )
+    for size in args.sizes:
+        df = synthetic_frame(size, resolution="1m", seed=2)
+        payload = {
+            "symbol": "BENCH",
+            "resolution": "1m",
+            "date_from": str(df.index[0]),
+            "date_to": str(df.index[-1]),
+            "search_period": 20,
+            "ta_algos": ALGOS,
+            "symbol_data": encode_frame(df),
+        }
+        full_time, full = respond(lambda_handler, dict(payload, ta_output="full"))
+        compact_time, compact = respond(
+            lambda_handler,
+            dict(payload, ta_output="compact", ta_window=args.window),
+        )
+        check(full, compact, args.window)
+        print(
+            f"{size:>9} {len(full):>13} {len(compact):>16} "
+            f"{full_time:>9.4f} {compact_time:>12.4f}"
+        )
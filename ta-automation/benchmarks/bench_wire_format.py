@@ -0,0 +1,70 @@
+# payload size and decode time for the symbol_data wire formats
+# legacy is what get_symbol_data used to return (history.to_json()) and how the stages used to parse it
+# (json.dumps then pd.read_json). run from the ta-automation folder: python benchmarks/bench_wire_format.py
+import io
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+from ta_common.wire_format import decode_frame, encode_frame
+
+SIZES = [1_000, 10_000, 100_000]
+ENCODINGS = ["json", "b64-f64", "b64-f32"]
+
+
+def make_history(size, seed=42):
+    # roughly what yfinance hands back for a 1m query, including the columns nobody uses
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, size))
+    return pd.DataFrame(
+        {
+            "Open": close + rng.normal(0, 0.05, size),
+            "High": close + np.abs(rng.normal(0, 0.1, size)),
+            "Low": close - np.abs(rng.normal(0, 0.1, size)),
+            "Close": close,
+            "Volume": rng.integers(1_000, 1_000_000, size),
+            "Dividends": 0,
+            "Stock Splits": 0,
+        },
+        index=pd.date_range("2022-01-03 00:00", periods=size, freq="min", tz="UTC"),
+    )
+
+
+def best_of(func, repeats=5):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    print(
+        f"{'bars':>8} {'format':>8} {'bytes':>12} {'ratio':>7} {'decode (ms)':>12} {'speedup':>8}"
+    )
+    for size in SIZES:
+        history = make_history(size)
+
+        legacy_payload = json.loads(history.to_json())
+        legacy_bytes = len(json.dumps(legacy_payload))
+        legacy_decode = best_of(
+            lambda: pd.read_json(io.StringIO(json.dumps(legacy_payload)))
+        )
+        print(
+            f"{size:>8} {'legacy':>8} {legacy_bytes:>12} {1:>6.1f}x {legacy_decode * 1000:>12.2f} {1:>7.1f}x"
+        )
+
+        for encoding in ENCODINGS:
+            # the lambda runtime parses the incoming event for us, so the stage only pays for decode_frame
+            payload = json.loads(json.dumps(encode_frame(history, encoding)))
+            payload_bytes = len(json.dumps(payload))
+            decode = best_of(lambda: decode_frame(payload))
+            print(
+                f"{size:>8} {encoding:>8} {payload_bytes:>12} {legacy_bytes / payload_bytes:>6.1f}x"
+                f" {decode * 1000:>12.2f} {legacy_decode / decode:>7.1f}x"
+            )
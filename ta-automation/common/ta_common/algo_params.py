@@ -0,0 +1,24 @@
+# kept here rather than in run TA's indicators.py so generate graph can put the windows in its titles
+
+# the indicator windows each algo takes from its ta_algo parameters, eg {"awesome-oscillator": {"window1": 8}}, and
+# the defaults for the ones that aren't given
+ALGO_WINDOWS = {
+    "awesome-oscillator": {"window1": 5, "window2": 34},
+    "stoch": {"window": 14, "smooth_window": 3},
+    # how many bars back a price/A-D divergence looks for the previous high or low
+    "accumulation-distribution": {"window": 20},
+}
+
+
+def algo_windows(ta_algo):
+    selected_algo = list(ta_algo.keys())[0]
+    params = ta_algo[selected_algo] or {}
+    return {
+        name: int(params.get(name, default))
+        for name, default in ALGO_WINDOWS.get(selected_algo, {}).items()
+    }
+
+
+def has_custom_windows(ta_algo):
+    selected_algo = list(ta_algo.keys())[0]
+    return algo_windows(ta_algo) != ALGO_WINDOWS.get(selected_algo, {})
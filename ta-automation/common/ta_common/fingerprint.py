@@ -0,0 +1,46 @@
+import hashlib
+import json
+
+# deterministic fingerprints for cache keys. python's built in hash() is salted per process, so it's no good for
+# anything that has to match between invocations
+#
+# pandas is imported where it's used, so checking a cache against a payload doesn't pay for it
+
+
+def frame_fingerprint(df, columns=("Open", "High", "Low", "Close", "Volume")):
+    # hash of the bar timestamps and values, so any change to the data gives a different fingerprint
+    import pandas as pd
+
+    digest = hashlib.blake2b(digest_size=16)
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    digest.update(index.values.astype("datetime64[ms]").astype("<i8").tobytes())
+    for column in columns:
+        if column in df.columns:
+            digest.update(column.encode("utf-8"))
+            digest.update(df[column].to_numpy(dtype="<f8").tobytes())
+    return digest.hexdigest()
+
+
+def params_fingerprint(params):
+    # algo parameters etc. sorted keys so dict ordering doesn't matter
+    body = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def payload_fingerprint(symbol_data):
+    # symbol data as it arrives in a payload, without decoding it - or None if it can't be fingerprinted cheaply. a
+    # claim check is already content addressed (see symbol_data.py), so the pointer is enough. inline data would have
+    # to be serialised and hashed in full on every call, which is most of what a cache hit is meant to save
+    if isinstance(symbol_data, dict) and "claim_check" in symbol_data:
+        return combine("claim_check", symbol_data["claim_check"])
+    return None
+
+
+def combine(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
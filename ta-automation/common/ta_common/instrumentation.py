@@ -0,0 +1,205 @@
+import functools
+import json
+import os
+import threading
+import time
+
+# timing and size metrics for the lambda handlers, written out as CloudWatch Embedded Metric Format (EMF) lines
+#
+#   @instrumented("run_ta")
+#   def lambda_handler(event, context):
+#       with span("parse"):
+#           df = ...
+#       record("rows", len(df))
+#
+# every invocation prints one json line with its spans (ms), counts and payload sizes, plus whether it was a cold
+# start. on lambda, CloudWatch turns those lines into metrics under the ta-automation namespace with no extra API
+# calls. locally, point set_sink at something that keeps them - local_runner does this and aggregates them
+#
+# it's off unless TA_METRICS is set. when it's off, instrumented() hands back the handler untouched and span/record
+# do nothing, so leaving the calls in the hot path costs about as much as an attribute lookup
+
+ENABLED = os.environ.get("TA_METRICS", "").lower() in ("1", "true", "yes", "on")
+NAMESPACE = os.environ.get("TA_METRICS_NAMESPACE", "ta-automation")
+
+# the invocation in progress on this thread, if any. local_runner runs several handlers at once on a thread pool
+_current = threading.local()
+# stages that have handled at least one invocation in this process, so the next one is a warm start
+_warm_stages = set()
+
+
+def print_sink(line):
+    print(line, flush=True)
+
+
+# where the EMF lines go. stdout is what CloudWatch reads
+sink = print_sink
+
+
+def set_sink(new_sink):
+    global sink
+    sink = new_sink
+
+
+class Invocation:
+    def __init__(self, stage, cold_start):
+        self.stage = stage
+        self.cold_start = cold_start
+        # name -> (value, unit). repeated spans/records with the same name add up
+        self.metrics = {}
+
+    def add(self, name, value, unit):
+        if name in self.metrics:
+            value += self.metrics[name][0]
+        self.metrics[name] = (value, unit)
+
+    def to_emf(self):
+        metrics = dict(self.metrics)
+        metrics["cold_start"] = (int(self.cold_start), "Count")
+        line = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": NAMESPACE,
+                        "Dimensions": [["stage"]],
+                        "Metrics": [
+                            {"Name": name, "Unit": unit}
+                            for name, (_, unit) in metrics.items()
+                        ],
+                    }
+                ],
+            },
+            "stage": self.stage,
+        }
+        for name, (value, _) in metrics.items():
+            line[name] = value
+        return json.dumps(line, separators=(",", ":"))
+
+
+class Span:
+    def __init__(self, invocation, name):
+        self.invocation = invocation
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = (time.perf_counter() - self.started) * 1000
+        self.invocation.add(self.name, elapsed, "Milliseconds")
+        return False
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def current_invocation():
+    return getattr(_current, "invocation", None)
+
+
+def span(name):
+    # time a block. a no-op outside an instrumented handler, or when metrics are off
+    invocation = current_invocation()
+    if invocation is None:
+        return NULL_SPAN
+    return Span(invocation, name)
+
+
+def record(name, value, unit="Count"):
+    # a count or size for the current invocation, eg rows or bytes
+    invocation = current_invocation()
+    if invocation is not None:
+        invocation.add(name, value, unit)
+
+
+def payload_size(payload):
+    # only called when metrics are on - serialising a big payload isn't free
+    return len(json.dumps(payload, separators=(",", ":"), default=str))
+
+
+def instrumented(stage):
+    def decorate(handler):
+        if not ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            invocation = Invocation(stage, stage not in _warm_stages)
+            _warm_stages.add(stage)
+            _current.invocation = invocation
+            started = time.perf_counter()
+            try:
+                invocation.add(
+                    "payload_in", payload_size(event.get("Payload")), "Bytes"
+                )
+                result = handler(event, context)
+                invocation.add("payload_out", payload_size(result), "Bytes")
+                return result
+            except Exception:
+                invocation.add("errors", 1, "Count")
+                raise
+            finally:
+                invocation.add(
+                    "duration", (time.perf_counter() - started) * 1000, "Milliseconds"
+                )
+                _current.invocation = None
+                sink(invocation.to_emf())
+
+        return wrapper
+
+    return decorate
+
+
+def aggregate(lines):
+    # the local collector. takes EMF lines (strings or already parsed) and returns
+    # {stage: {metric: {"count", "total", "mean", "max"}}}. anything that isn't one of ours is skipped, so a whole
+    # log file can be passed in
+    summary = {}
+    for line in lines:
+        if isinstance(line, str):
+            try:
+                line = json.loads(line)
+            except ValueError:
+                continue
+        if not isinstance(line, dict) or "_aws" not in line or "stage" not in line:
+            continue
+
+        stage = summary.setdefault(line["stage"], {})
+        for directive in line["_aws"]["CloudWatchMetrics"]:
+            for metric in directive["Metrics"]:
+                value = line[metric["Name"]]
+                stats = stage.setdefault(
+                    metric["Name"],
+                    {"count": 0, "total": 0, "max": value, "unit": metric["Unit"]},
+                )
+                stats["count"] += 1
+                stats["total"] += value
+                stats["max"] = max(stats["max"], value)
+
+    for stage in summary.values():
+        for stats in stage.values():
+            stats["mean"] = stats["total"] / stats["count"]
+    return summary
+
+
+if __name__ == "__main__":
+    # python -m ta_common.instrumentation < lambda.log - summarise the metric lines in a log
+    import sys
+
+    for stage, metrics in aggregate(sys.stdin).items():
+        print(stage)
+        for name, stats in metrics.items():
+            print(
+                f"  {name:<20} n={stats['count']:<6} mean={stats['mean']:<12.2f} "
+                f"max={stats['max']:<12.2f} {stats['unit']}"
+            )
@@ -0,0 +1,109 @@
+import os
+import tempfile
+from urllib.parse import urlparse
+
+# tiny object store abstraction so the stages can swap S3 for the local filesystem when running off AWS
+# stores are addressed by url - s3://bucket/prefix or file:///some/path (a bare path works too)
+
+S3_URL_BASE = "http://s3-ap-southeast-2.amazonaws.com"
+
+
+class LocalObjectStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def put(self, key, body, content_type=None, storage_class=None):
+        # content_type and storage_class only mean something to S3
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # a temp file of its own, so two puts to the same key at once can't rename each other's away
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path),
+            prefix=os.path.basename(path) + ".",
+            suffix=".tmp",
+            delete=False,
+        ) as f:
+            f.write(body)
+        os.replace(f.name, path)
+
+    def get(self, key):
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def url(self, key):
+        return "file://" + self.path(key)
+
+
+class S3ObjectStore:
+    def __init__(self, bucket, prefix="", client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._client = client
+
+    @property
+    def client(self):
+        # built on first use so that just constructing a store doesn't pay for a boto3 client
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("s3")
+        return self._client
+
+    def object_key(self, key):
+        if self.prefix:
+            return f"{self.prefix}/{key}"
+        return key
+
+    def put(self, key, body, content_type=None, storage_class=None):
+        extra_args = {}
+        if content_type:
+            extra_args["ContentType"] = content_type
+        if storage_class:
+            extra_args["StorageClass"] = storage_class
+        self.client.put_object(
+            Bucket=self.bucket, Key=self.object_key(key), Body=body, **extra_args
+        )
+
+    def get(self, key):
+        response = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+        return response["Body"].read()
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise e
+        return True
+
+    def url(self, key):
+        return f"{S3_URL_BASE}/{self.bucket}/{self.object_key(key)}"
+
+
+def object_store_from_url(url):
+    parsed = urlparse(url)
+    if parsed.scheme == "s3":
+        return S3ObjectStore(parsed.netloc, parsed.path)
+    if parsed.scheme in ("", "file"):
+        return LocalObjectStore(parsed.netloc + parsed.path)
+    raise ValueError(f"Unsupported object store url: {url}")
+
+
+def split_object_url(url):
+    # s3://bucket/prefix/key -> (store for s3://bucket, "prefix/key")
+    parsed = urlparse(url)
+    if parsed.scheme == "s3":
+        return S3ObjectStore(parsed.netloc), parsed.path.lstrip("/")
+    if parsed.scheme in ("", "file"):
+        path = parsed.netloc + parsed.path
+        return LocalObjectStore(os.path.dirname(path)), os.path.basename(path)
+    raise ValueError(f"Unsupported object store url: {url}")
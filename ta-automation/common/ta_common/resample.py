@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from ta_common.resolutions import INTRADAY_MINUTES, derivable, sources_for
+
+# builds coarser OHLCV bars out of finer ones we already hold - 1h out of 5m, 1d out of 1h, 1mo out of 1d and so on -
+# so the OHLCV cache can answer a coarse request without going upstream. see OHLCVCache.derive
+#
+# bins follow the exchange's sessions rather than the UTC clock: intraday bins start at each session's first bar
+# (so 1h bars for a 9:30 open land on 9:30, 10:30, ... like yfinance's do), and 1d/1wk/1mo/3mo bins are exchange
+# local calendar days, weeks (starting Monday), months and quarters, labelled at local midnight like yfinance's
+#
+# everything is done on int64 nanosecond arrays with ufunc.reduceat, one pass per column
+
+# longest a bar at each resolution can cover, DST included
+CALENDAR_SPANS = {
+    "1d": pd.Timedelta(hours=25),
+    "1wk": pd.Timedelta(days=7, hours=1),
+    "1mo": pd.Timedelta(days=31, hours=1),
+    "3mo": pd.Timedelta(days=92, hours=1),
+}
+
+NS_PER_MINUTE = 60 * 1_000_000_000
+
+
+def bar_span(resolution):
+    if resolution in INTRADAY_MINUTES:
+        return pd.Timedelta(minutes=INTRADAY_MINUTES[resolution])
+    return CALENDAR_SPANS[resolution]
+
+
+def session_start(timestamp, tz=None):
+    # the start of the exchange local day timestamp is on, as a UTC Timestamp. intraday bins count from the first bar
+    # of each day, so resampling bars that start part way through a session shifts that session's bins (13:20, 14:20
+    # rather than 13:30, 14:30 for 1h out of 5m starting at 13:16) - resample from here and cut afterwards instead
+    local = pd.Timestamp(timestamp).tz_convert(tz or "UTC")
+    # a DST change at midnight means the day starts at 1am
+    return local.floor("D", ambiguous=True, nonexistent="shift_forward").tz_convert(
+        "UTC"
+    )
+
+
+def bin_starts(wall, resolution):
+    # wall is each bar's exchange local wall clock time as datetime64[ns]. returns the wall clock time each bar's bin
+    # starts at
+    day = wall.astype("datetime64[D]")
+
+    if resolution in INTRADAY_MINUTES:
+        # a session is the bars on one local day. bins count from its first bar
+        firsts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+        session_open = np.repeat(wall[firsts], np.diff(np.r_[firsts, len(wall)]))
+        step = INTRADAY_MINUTES[resolution] * NS_PER_MINUTE
+        offset = (wall - session_open).astype(np.int64) // step * step
+        return session_open + offset.astype("timedelta64[ns]")
+
+    if resolution == "1d":
+        labels = day
+    elif resolution == "1wk":
+        # 1970-01-01 was a Thursday, so this is days since the Monday
+        labels = day - ((day.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    elif resolution == "1mo":
+        labels = day.astype("datetime64[M]")
+    elif resolution == "3mo":
+        months = day.astype("datetime64[M]").astype(np.int64)
+        labels = (months - months % 3).astype("datetime64[M]")
+    else:
+        raise ValueError(f"Can't resample to {resolution}")
+    return labels.astype("datetime64[ns]")
+
+
+def resample(frame, resolution, tz=None):
+    # frame is finer bars with a UTC index, tz the exchange's timezone (None for UTC). returns the resolution bars
+    # with a UTC index - first open, highest high, lowest low, last close, summed volume
+    frame = frame.dropna(how="all", subset=["Open", "High", "Low", "Close"])
+    if len(frame) == 0:
+        return frame
+
+    index = pd.DatetimeIndex(frame.index)
+    utc = index.tz_convert(None).values.astype("datetime64[ns]")
+    wall = (
+        index.tz_convert(tz or "UTC").tz_localize(None).values.astype("datetime64[ns]")
+    )
+
+    labels = bin_starts(wall, resolution)
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(frame)] - 1
+
+    # wall clock label back to UTC at the offset of the bin's first bar. exchanges don't trade across a DST change,
+    # so that's the offset for the whole bin
+    label_utc = utc[starts] - (wall[starts] - labels[starts])
+
+    columns = {}
+    for column in frame.columns:
+        values = frame[column].to_numpy()
+        if column == "Open":
+            columns[column] = values[starts]
+        elif column == "High":
+            columns[column] = np.fmax.reduceat(values, starts)
+        elif column == "Low":
+            columns[column] = np.fmin.reduceat(values, starts)
+        elif column == "Close":
+            columns[column] = values[ends]
+        elif column == "Stock Splits":
+            # ratios, with 0 meaning no split. two in one bin multiply
+            ratios = np.multiply.reduceat(np.where(values == 0, 1.0, values), starts)
+            columns[column] = np.where(ratios == 1.0, 0.0, ratios)
+        else:
+            # Volume, Dividends
+            columns[column] = np.add.reduceat(np.nan_to_num(values), starts)
+
+    return pd.DataFrame(
+        columns,
+        index=pd.DatetimeIndex(label_utc, name=index.name).tz_localize("UTC"),
+    )
@@ -0,0 +1,41 @@
+# which resolutions can be built from which. kept apart from resample.py so job scan, which doesn't have numpy or
+# pandas, can check a multi timeframe job's resolutions up front
+
+INTRADAY_MINUTES = {
+    "1m": 1,
+    "2m": 2,
+    "5m": 5,
+    "15m": 15,
+    "30m": 30,
+    "60m": 60,
+    "90m": 90,
+    "1h": 60,
+}
+
+
+def sources_for(resolution):
+    # the finer resolutions resolution can be built from, coarsest first since those have the fewest rows to reduce.
+    # 5d isn't here - yfinance's 5d bars don't line up with anything we can rebuild
+    intraday = sorted(INTRADAY_MINUTES, key=INTRADAY_MINUTES.get, reverse=True)
+    if resolution in INTRADAY_MINUTES:
+        minutes = INTRADAY_MINUTES[resolution]
+        return [
+            source
+            for source in intraday
+            if INTRADAY_MINUTES[source] < minutes
+            and minutes % INTRADAY_MINUTES[source] == 0
+        ]
+    if resolution == "1d":
+        return intraday
+    if resolution in ("1wk", "1mo"):
+        return ["1d"]
+    if resolution == "3mo":
+        return ["1mo", "1d"]
+    return []
+
+
+def derivable(source, target):
+    # whether target bars can be built from source bars, directly or through something in between
+    return source == target or any(
+        middle == source or derivable(source, middle) for middle in sources_for(target)
+    )
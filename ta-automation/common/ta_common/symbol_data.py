@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from ta_common.instrumentation import span
+from ta_common.object_store import object_store_from_url, split_object_url
+from ta_common.wire_format import decode_frame
+
+# claim check support for symbol_data
+# rather than carrying the whole frame through every step function state (and blowing through the 256KB payload
+# limit on long intraday ranges), the fetch stage writes it to an object store once and hands on a small pointer.
+# later stages load it only if they actually need the data
+#
+# if SYMBOL_DATA_STORE isn't set the data is passed inline like it always has been
+
+SYMBOL_DATA_STORE = os.environ.get("SYMBOL_DATA_STORE")
+
+CLAIM_CHECK_KEY = "claim_check"
+
+
+def is_claim_check(symbol_data):
+    return isinstance(symbol_data, dict) and CLAIM_CHECK_KEY in symbol_data
+
+
+def store_symbol_data(symbol_data, symbol, resolution, store_url=SYMBOL_DATA_STORE):
+    if not store_url:
+        return symbol_data
+
+    body = json.dumps(symbol_data, separators=(",", ":")).encode("utf-8")
+    # content addressed, so the same frame is only ever stored once
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    key = f"{symbol.lower()}/{resolution}/{digest}.json"
+
+    store = object_store_from_url(store_url)
+    with span("upload"):
+        if not store.exists(key):
+            store.put(key, body, content_type="application/json")
+
+    return {CLAIM_CHECK_KEY: f"{store_url.rstrip('/')}/{key}"}
+
+
+def load_symbol_data(symbol_data):
+    # accepts either inline symbol data or a claim check pointer, and always returns the actual data
+    if not is_claim_check(symbol_data):
+        return symbol_data
+
+    store, key = split_object_url(symbol_data[CLAIM_CHECK_KEY])
+    with span("download"):
+        body = store.get(key)
+    return json.loads(body)
+
+
+def load_symbol_frame(symbol_data):
+    # straight from whatever was in the payload to a DataFrame
+    symbol_data = load_symbol_data(symbol_data)
+    with span("parse"):
+        return decode_frame(symbol_data)
+
+
+def to_naive_utc(value):
+    # decoded frames have naive UTC indexes, so job dates need to match. naive job dates are taken as UTC already
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp
+
+
+def load_job_frame(job):
+    # the frame for one work item. job scan merges overlapping fetches for the same symbol, so the data we're
+    # handed can cover a wider window than this item asked for - cut it back to [date_from, date_to)
+    df = load_symbol_frame(job["symbol_data"])
+    if len(df) == 0:
+        return df
+
+    mask = np.ones(len(df), dtype=bool)
+    if job.get("date_from"):
+        mask &= df.index >= to_naive_utc(job["date_from"])
+    if job.get("date_to"):
+        mask &= df.index < to_naive_utc(job["date_to"])
+    if mask.all():
+        return df
+    return df[mask].copy()
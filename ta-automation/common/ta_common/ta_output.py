@@ -0,0 +1,72 @@
+import numpy as np
+
+# compact form of run TA's ta_data
+#
+# a full ta_data is every series as a list as long as the symbol data - the indicator values, and signal series that
+# are 0 on nearly every bar. for a few years of 1m bars that's megabytes per algo going through step functions, when
+# only the last search_period bars change the confidence and the graph only needs the recent part of the chart.
+# the compact form keeps the last window bars - the dense series as they are, and the signals as sparse events, so
+# its size depends on the window rather than how much history the job asked for:
+#
+# {
+#     "format": "ta-window/1",
+#     "bars": 100000,                                  # how many bars the full series had
+#     "start": 99750,                                  # the bar the window starts at
+#     "series": {"awesome-oscillator": [...]},         # bars start to bars - 1
+#     "events": {"awesome-oscillator-signal": [[bar, value], ...]},   # the non-zero values from start on
+# }
+#
+# window_ta_data turns it back into a plain ta_data over the window, which is what generate graph draws
+
+FORMAT = "ta-window/1"
+
+
+def is_compact(ta_data):
+    return isinstance(ta_data, dict) and ta_data.get("format") == FORMAT
+
+
+def window_start(bars, window):
+    # the first bar of the last window bars. a window of 0 is the whole series, same as search_period
+    if window <= 0:
+        return 0
+    return max(bars - window, 0)
+
+
+def sparse_events(values, start=0):
+    # [[bar, value], ...] for the non-zero values from bar start on. bars are counted from the start of the series
+    values = np.asarray(values[start:])
+    bars = np.flatnonzero(values)
+    return np.column_stack([bars + start, values[bars]]).tolist()
+
+
+def compact_ta_data(ta_data, window, events=()):
+    # events are the names of the signal series to keep as sparse events, everything else is trimmed to the window
+    bars = len(next(iter(ta_data.values()), []))
+    start = window_start(bars, window)
+    return {
+        "format": FORMAT,
+        "bars": bars,
+        "start": start,
+        "series": {
+            name: values[start:]
+            for name, values in ta_data.items()
+            if name not in events
+        },
+        "events": {
+            name: sparse_events(values, start)
+            for name, values in ta_data.items()
+            if name in events
+        },
+    }
+
+
+def window_ta_data(compact):
+    # {name: list} over the window, with the events filled back out to 0 between them
+    start = compact["start"]
+    ta_data = dict(compact["series"])
+    for name, events in compact["events"].items():
+        values = [0] * (compact["bars"] - start)
+        for bar, value in events:
+            values[bar - start] = value
+        ta_data[name] = values
+    return ta_data
@@ -0,0 +1,151 @@
+import base64
+import os
+import zlib
+import numpy as np
+import pandas as pd
+
+# compact columnar wire format for OHLCV frames
+#
+# history.to_json() gives {column: {epoch_ms_string: value}}, which repeats every timestamp once per column (including
+# Dividends and Stock Splits, which nothing uses), and every stage then had to json.dumps it again so pd.read_json
+# could parse it. this format stores one shared index plus an array per column instead:
+#
+# {
+#     "format": "ohlcv-columnar/1",
+#     "encoding": "b64-f32",
+#     "rows": 3,
+#     "index": <epoch ms>,
+#     "columns": {"Open": <values>, "High": ..., "Low": ..., "Close": ..., "Volume": ...},
+#     "tz": "Australia/Sydney",
+# }
+#
+# the index is always UTC. tz is the exchange's timezone, when we know it, so run TA can build daily bars on the
+# exchange's calendar (see ta_common/resample.py). decode_frame puts it in df.attrs["tz"]
+#
+# encodings:
+#   b64-f64 - default. index is delta encoded int64 ms, zlib'd and base64'd. every column is base64 float64, so run TA
+#             sees exactly the bars get_symbol_data fetched
+#   b64-f32 - as above but prices are float32, which halves them. opt in only (WIRE_ENCODING=b64-f32) - it rounds
+#             prices to ~7 significant digits, enough to move a crossover that's right on the line. volume stays f64
+#   json    - plain json lists, for humans and debugging
+
+FORMAT = "ohlcv-columnar/1"
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+ENCODINGS = {"b64-f32", "b64-f64", "json"}
+DEFAULT_ENCODING = os.environ.get("WIRE_ENCODING", "b64-f64")
+
+
+def is_columnar(payload):
+    return isinstance(payload, dict) and payload.get("format") == FORMAT
+
+
+def epoch_ms(index):
+    # int64 ms since epoch from a DatetimeIndex, tz aware or not (naive is taken as UTC)
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    return index.values.astype("datetime64[ms]").astype(np.int64)
+
+
+def column_dtype(column, encoding):
+    if column == "Volume" or encoding == "b64-f64":
+        return np.dtype("<f8")
+    return np.dtype("<f4")
+
+
+def b64(raw):
+    return base64.b64encode(raw).decode("ascii")
+
+
+def encode_frame(df, encoding=DEFAULT_ENCODING):
+    if encoding not in ENCODINGS:
+        raise ValueError(
+            f"Unknown wire encoding {encoding}. Must be one of {str(sorted(ENCODINGS))}"
+        )
+
+    index = epoch_ms(df.index)
+    columns = [column for column in COLUMNS if column in df.columns]
+    payload = {"format": FORMAT, "encoding": encoding, "rows": len(index)}
+    tz = exchange_tz(df)
+    if tz:
+        payload["tz"] = tz
+
+    if encoding == "json":
+        payload["index"] = index.tolist()
+        payload["columns"] = {
+            # NaN isn't valid json, so it goes over the wire as null
+            column: [
+                None if np.isnan(value) else value
+                for value in df[column].to_numpy(dtype=float).tolist()
+            ]
+            for column in columns
+        }
+        return payload
+
+    # bars are evenly spaced most of the time, so the deltas are mostly the same number and zlib flattens them
+    deltas = np.diff(index, prepend=0).astype("<i8")
+    payload["index"] = b64(zlib.compress(deltas.tobytes()))
+    payload["columns"] = {
+        column: b64(
+            df[column]
+            .to_numpy(dtype=float)
+            .astype(column_dtype(column, encoding))
+            .tobytes()
+        )
+        for column in columns
+    }
+    return payload
+
+
+def exchange_tz(df):
+    # the OHLCV cache keeps it in attrs, a frame straight from yfinance is indexed in it
+    if df.attrs.get("tz"):
+        return df.attrs["tz"]
+    tz = getattr(df.index, "tz", None)
+    if tz is not None and str(tz) != "UTC":
+        return str(tz)
+    return None
+
+
+def decode_index(payload):
+    if payload["encoding"] == "json":
+        index = np.asarray(payload["index"], dtype=np.int64)
+    else:
+        deltas = np.frombuffer(
+            zlib.decompress(base64.b64decode(payload["index"])), dtype="<i8"
+        )
+        index = np.cumsum(deltas)
+    # naive UTC timestamps, same as pd.read_json used to give us
+    return pd.DatetimeIndex(pd.to_datetime(index, unit="ms"))
+
+
+def decode_column(payload, column):
+    values = payload["columns"][column]
+    if payload["encoding"] == "json":
+        return np.asarray(
+            [np.nan if value is None else value for value in values], dtype=float
+        )
+    dtype = column_dtype(column, payload["encoding"])
+    return np.frombuffer(base64.b64decode(values), dtype=dtype).astype(float)
+
+
+def decode_frame(payload):
+    # accepts either the columnar format or the old to_json() shape, so older payloads (and the mocks at the bottom
+    # of each stage) keep working
+    if not is_columnar(payload):
+        return decode_legacy_frame(payload)
+
+    index = decode_index(payload)
+    df = pd.DataFrame(
+        {column: decode_column(payload, column) for column in payload["columns"]},
+        index=index,
+    )
+    if payload.get("tz"):
+        df.attrs["tz"] = payload["tz"]
+    return df
+
+
+def decode_legacy_frame(payload):
+    df = pd.DataFrame(payload)
+    df.index = pd.to_datetime(df.index.astype(np.int64), unit="ms")
+    return df.sort_index()
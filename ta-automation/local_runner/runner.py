@@ -0,0 +1,359 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# runs the same flow as statemachine/ta-automation.asl.json, but in one process on one box:
+#
+#   job scan -> per fetch group (get symbol data -> per algo (run TA -> generate graph)) -> calculate confidence
+#   -> per job result (notify if notify_method is set)
+#
+# every stage is called through its own lambda_handler with the same {"Payload": ...} it gets from Step Functions,
+# so what works here works there. the Map states run on a thread or process pool instead of as state transitions,
+# and yfinance/SSM/Pushover are swapped for the stand-ins in standins.py. S3 isn't needed - the symbol data and
+# graph stores are pointed at local directories under the work dir
+#
+# python -m local_runner.runner jobs.json --workers 8 --pool process
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGE_DIRS = [
+    "common",
+    "1_job_scan",
+    "2_get_symbol_data",
+    "3_run_ta",
+    "4_generate_graph",
+    "5_calculate_confidence",
+    "6_notify",
+]
+STAGE_MODULES = [
+    "job_scan",
+    "get_symbol_data",
+    "run_ta",
+    "generate_graph",
+    "calculate_confidence",
+    "notify",
+]
+
+# the stage modules, once load_stages has run in this process
+stages = {}
+
+
+class MetricBuffer:
+    # sink for ta_common.instrumentation. keeps the EMF lines so they can be handed back from the pool and
+    # aggregated, rather than printed
+    def __init__(self):
+        self.lines = []
+        self._lock = threading.Lock()
+
+    def __call__(self, line):
+        with self._lock:
+            self.lines.append(line)
+
+    def drain(self):
+        with self._lock:
+            lines, self.lines = self.lines, []
+        return lines
+
+
+metric_buffer = MetricBuffer()
+
+
+def load_stages(workdir, seed=0, metrics=False, pushover=None, ssm=None):
+    # the stages read their config from the environment at import time, so it has to be set before they're imported.
+    # anything already set in the environment wins, so you can still point a local run at real buckets
+    os.environ.setdefault("SYMBOL_DATA_STORE", os.path.join(workdir, "symbol-data"))
+    os.environ.setdefault("GRAPH_STORE", os.path.join(workdir, "graphs"))
+    os.environ.setdefault("OHLCV_CACHE_DIR", os.path.join(workdir, "ohlcv_cache"))
+    os.environ.setdefault("RESULT_CACHE_STORE", os.path.join(workdir, "ta-results"))
+    # same as the deployed run TA
+    os.environ.setdefault("TA_OUTPUT", "compact")
+    # the synthetic provider has no rate limit to stay under
+    os.environ.setdefault("FETCH_RATE", "0")
+    if metrics:
+        os.environ["TA_METRICS"] = "1"
+
+    for stage_dir in STAGE_DIRS:
+        path = os.path.join(ROOT, stage_dir)
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    from local_runner.standins import (
+        FakeSSMClient,
+        RecordingPushover,
+        SyntheticProvider,
+    )
+
+    for name in STAGE_MODULES:
+        stages[name] = importlib.import_module(name)
+    importlib.import_module("ta_common.instrumentation").set_sink(metric_buffer)
+
+    provider = SyntheticProvider(seed)
+    stages["get_symbol_data"].use_provider(
+        provider, os.environ["OHLCV_CACHE_DIR"], provider.batch
+    )
+    ssm = ssm or FakeSSMClient()
+    stages["notify"].get_ssm_client = lambda: ssm
+    stages["notify"].send_pushover = pushover or RecordingPushover()
+    return stages
+
+
+def call(stage, payload, timings):
+    # call a stage the way Step Functions would, and time it
+    started = time.perf_counter()
+    result = stages[stage].lambda_handler({"Payload": payload}, None)
+    timings.setdefault(stage, []).append(time.perf_counter() - started)
+    return result
+
+
+# the bodies of the two Map states. these run in the pool, so they hand their timings back rather than sharing them
+def fetch_group(group):
+    timings = {}
+    symbol_data = call("get_symbol_data", group, timings)
+    return symbol_data, timings, metric_buffer.drain()
+
+
+def fetch_batch(groups):
+    # get_symbol_data's batch mode, for fetch groups that all share a resolution and window
+    timings = {}
+    payload = {
+        "symbols": [group["symbol"] for group in groups],
+        "date_from": groups[0]["date_from"],
+        "date_to": groups[0]["date_to"],
+        "resolution": groups[0]["resolution"],
+    }
+    result = call("get_symbol_data", payload, timings)
+    return result, timings, metric_buffer.drain()
+
+
+def batch_fetch_groups(fetch_groups, batch_size):
+    # lists of fetch group indexes that can share one batch call, at most batch_size to a call
+    by_window = {}
+    for index, group in enumerate(fetch_groups):
+        key = (group["resolution"], group["date_from"], group["date_to"])
+        by_window.setdefault(key, []).append(index)
+
+    batches = []
+    for indexes in by_window.values():
+        for start in range(0, len(indexes), batch_size):
+            batches.append(indexes[start : start + batch_size])
+    return batches
+
+
+def analyse_item(item, symbol_data):
+    timings = {}
+    job = {**item, "symbol_data": symbol_data}
+    job["ta_analysis"] = call("run_ta", job, timings)
+    job["graph_url"] = call("generate_graph", job, timings)
+    return job, timings, metric_buffer.drain()
+
+
+def merge_timings(into, timings):
+    for stage, durations in timings.items():
+        into.setdefault(stage, []).extend(durations)
+
+
+def summarise_timings(timings):
+    return {
+        stage: {
+            "calls": len(durations),
+            "total": sum(durations),
+            "mean": sum(durations) / len(durations),
+            "max": max(durations),
+        }
+        for stage, durations in timings.items()
+    }
+
+
+def init_worker(workdir, seed, metrics):
+    load_stages(workdir, seed, metrics)
+    # a forked worker starts with a copy of the parent's buffer, which the parent will report itself
+    metric_buffer.drain()
+
+
+def make_pool(pool, workers, workdir, seed, metrics):
+    if pool == "process":
+        # each worker process imports the stages for itself
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(workdir, seed, metrics),
+        )
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def run_pipeline(
+    jobs, workers=4, pool="thread", workdir=None, seed=0, metrics=False, batch_size=0
+):
+    # returns {"job_results", "notify_results", "timings", "sent"}. "sent" is what would have gone to Pushover.
+    # with metrics on there's also "metrics", the stage spans from ta_common.instrumentation summed up
+    #
+    # batch_size > 0 fetches the symbols that share a resolution and window through get_symbol_data's batch mode,
+    # up to batch_size at a time. symbols that fail to fetch are left out and listed in "fetch_failures"
+    workdir = workdir or tempfile.mkdtemp(prefix="ta-automation-")
+    load_stages(workdir, seed, metrics)
+    from ta_common.instrumentation import aggregate
+
+    timings = {}
+    metric_lines = []
+    started = time.perf_counter()
+
+    # the job scan lambda fills in missing optional keys in place, so give it a copy
+    scan = call("job_scan", json.loads(json.dumps(jobs)), timings)
+    fetch_groups = scan["fetch_groups"]
+
+    with make_pool(pool, workers, workdir, seed, metrics) as executor:
+        # fetch everything first, then fan the algos out over it. Step Functions does these per group, but doing
+        # every fetch before any TA keeps the pool busy when one group has far more algos than the others.
+        # groups for the same symbol + resolution (windows too far apart to merge) fetch at the same time, same as
+        # they would in the Map - the OHLCV cache locks its files, so they can share it
+        symbol_data = [None] * len(fetch_groups)
+        fetch_failures = {}
+        if batch_size > 0:
+            batches = batch_fetch_groups(fetch_groups, batch_size)
+            fetched = executor.map(
+                fetch_batch, [[fetch_groups[i] for i in batch] for batch in batches]
+            )
+            for batch, (result, fetch_timings, lines) in zip(batches, fetched):
+                merge_timings(timings, fetch_timings)
+                metric_lines.extend(lines)
+                fetch_failures.update(result["failures"])
+                for i in batch:
+                    symbol_data[i] = result["symbol_data"].get(
+                        fetch_groups[i]["symbol"]
+                    )
+        else:
+            fetched = executor.map(fetch_group, fetch_groups)
+            for i, (result, fetch_timings, lines) in enumerate(fetched):
+                merge_timings(timings, fetch_timings)
+                metric_lines.extend(lines)
+                symbol_data[i] = result
+
+        futures = [
+            [executor.submit(analyse_item, item, data) for item in group["items"]]
+            for group, data in zip(fetch_groups, symbol_data)
+            if data is not None
+        ]
+        # list of lists, one per fetch group - the same shape the nested Map hands calculate confidence
+        results = []
+        for group_futures in futures:
+            group_results = []
+            for future in group_futures:
+                job, item_timings, lines = future.result()
+                merge_timings(timings, item_timings)
+                metric_lines.extend(lines)
+                group_results.append(job)
+            results.append(group_results)
+
+    confidence = call("calculate_confidence", results, timings)
+
+    notify_results = []
+    for job_result in confidence["job_results"]:
+        if job_result["job"]["notify_method"] is None:
+            notify_results.append(job_result)
+        else:
+            notify_results.append(call("notify", job_result, timings))
+
+    metric_lines.extend(metric_buffer.drain())
+
+    return {
+        "job_results": confidence["job_results"],
+        "notify_results": notify_results,
+        "timings": summarise_timings(timings),
+        "elapsed": time.perf_counter() - started,
+        # only what was sent from this process - notify always runs here, never in the pool
+        "sent": getattr(stages["notify"].send_pushover, "sent", []),
+        "fetches": {
+            key: scan[key]
+            for key in ("fetches_naive", "fetches_planned", "fetches_saved")
+        },
+        "metrics": aggregate(metric_lines),
+        "fetch_failures": fetch_failures,
+    }
+
+
+def print_report(output):
+    print(
+        f'{len(output["job_results"])} jobs in {output["elapsed"]:.2f}s, '
+        f'{output["fetches"]["fetches_planned"]} fetches '
+        f'({output["fetches"]["fetches_saved"]} saved by planning)'
+    )
+    for stage in STAGE_MODULES:
+        stats = output["timings"].get(stage)
+        if stats is None:
+            continue
+        print(
+            f'  {stage:<22} calls {stats["calls"]:>5}  total {stats["total"]:8.3f}s  '
+            f'mean {stats["mean"] * 1000:8.1f}ms  max {stats["max"] * 1000:8.1f}ms'
+        )
+        # where the time went inside the stage, if metrics were on
+        for name, metric in output["metrics"].get(stage, {}).items():
+            if metric["unit"] != "Milliseconds" or name == "duration":
+                continue
+            print(
+                f'    {name:<20} calls {metric["count"]:>5}  total {metric["total"] / 1000:8.3f}s  '
+                f'mean {metric["mean"]:8.1f}ms  max {metric["max"]:8.1f}ms'
+            )
+    for symbol, error in output["fetch_failures"].items():
+        print(f"  {symbol:<10} failed to fetch: {error}")
+    for job_result in output["job_results"]:
+        print(
+            f'  {job_result["job"]["symbol"]:<10} '
+            f'confidence {job_result["ta_summary"]["overall_ta_confidence"]:.1f} '
+            f'(target {job_result["ta_summary"]["target_ta_confidence"]})'
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the ta-automation pipeline locally"
+    )
+    parser.add_argument(
+        "jobs", help='json file with the job scan payload, ie {"jobs": [...]}'
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+    parser.add_argument(
+        "--workdir", help="where the local stores and caches go. default is a temp dir"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed for the synthetic price data"
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="turn on ta_common.instrumentation and break each stage's time down by span",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        help="fetch symbols that share a window in batches of this many. 0 fetches each on its own, like the state machine",
+    )
+    parser.add_argument("--output", help="write the full pipeline output here")
+    args = parser.parse_args(argv)
+
+    with open(args.jobs) as f:
+        jobs = json.load(f)
+
+    output = run_pipeline(
+        jobs,
+        args.workers,
+        args.pool,
+        args.workdir,
+        args.seed,
+        args.metrics,
+        args.batch_size,
+    )
+    print_report(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import threading
+from local_runner.synthetic import symbol_seed, synthetic_history
+
+# stand-ins for the things the stages talk to when they're deployed - yfinance, SSM and Pushover. S3 doesn't need
+# one, every store in ta_common takes a local path instead of an s3:// url
+
+
+class SyntheticProvider:
+    # drop in for get_symbol_data.yfinance_provider, and .batch for yfinance_batch_provider. anything in `failing`
+    # raises, like a ticker yfinance has never heard of
+    def __init__(self, seed=0, failing=()):
+        self.seed = seed
+        self.failing = {symbol.upper() for symbol in failing}
+        self.calls = 0
+        self.batch_calls = 0
+
+    def __call__(self, symbol, start, end, interval):
+        self.calls += 1
+        if symbol.upper() in self.failing:
+            raise ValueError(f"No data found for {symbol}, symbol may be delisted")
+        return synthetic_history(start, end, interval, symbol_seed(symbol, self.seed))
+
+    def batch(self, symbols, start, end, interval):
+        # like yf.download, failed symbols are just missing from the result rather than raising
+        self.batch_calls += 1
+        return {
+            symbol: synthetic_history(
+                start, end, interval, symbol_seed(symbol, self.seed)
+            )
+            for symbol in symbols
+            if symbol.upper() not in self.failing
+        }
+
+
+class FakeSSMClient:
+    # just enough of boto3's ssm client for notify
+    def __init__(self, parameters=None):
+        self.parameters = parameters or {"/tabot/pushover/api_key": "local-api-key"}
+
+    def get_parameter(self, Name, WithDecryption=False):
+        return {"Parameter": {"Name": Name, "Value": self.parameters[Name]}}
+
+
+class RecordingPushover:
+    # drop in for notify.send_pushover. keeps the messages rather than sending them
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def __call__(self, api_key, recipient, message, title):
+        with self._lock:
+            self.sent.append(
+                {"recipient": recipient, "title": title, "message": message}
+            )
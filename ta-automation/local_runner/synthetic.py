@@ -0,0 +1,107 @@
+import zlib
+import numpy as np
+import pandas as pd
+
+# seeded synthetic OHLCV data, for running the pipeline (and benchmarking it) without yfinance
+#
+# prices are a pure function of (seed, bar timestamp), so asking for overlapping windows gives the same bars in the
+# overlap - which matters for the OHLCV cache - and any resolution or length can be generated without walking
+# through everything before it
+
+# pandas frequencies for the resolutions job scan accepts
+RESOLUTION_FREQUENCIES = {
+    "1m": "1min",
+    "2m": "2min",
+    "5m": "5min",
+    "15m": "15min",
+    "30m": "30min",
+    "60m": "60min",
+    "90m": "90min",
+    "1h": "60min",
+    "1d": "1D",
+    "5d": "5D",
+    "1wk": "7D",
+    "1mo": "MS",
+    "3mo": "QS",
+}
+
+
+def symbol_seed(symbol, seed=0):
+    return (zlib.crc32(symbol.upper().encode("utf-8")) ^ seed) & 0xFFFFFFFF
+
+
+def noise(t, salt):
+    # cheap deterministic per bar noise in [0, 1), the classic fract(sin(x) * big) trick
+    return np.modf(np.abs(np.sin(t * 12.9898 + salt * 78.233) * 43758.5453))[0]
+
+
+def synthetic_bars(index, seed=0):
+    # OHLCV for the given bar timestamps
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        utc = index.tz_convert(None)
+    else:
+        utc = index
+    # hours since epoch keeps the numbers in a sensible range for sin()
+    t = utc.values.astype("datetime64[s]").astype(np.int64) / 3600.0
+
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(5, 500)
+    periods = rng.uniform([24 * 5, 24 * 60, 24 * 365], [24 * 20, 24 * 180, 24 * 900])
+    phases = rng.uniform(0, 2 * np.pi, 3)
+    amplitudes = np.array([0.02, 0.08, 0.25])
+    salt = seed % 997
+
+    def price_at(times):
+        wave = sum(
+            amplitude * np.sin(times / period + phase)
+            for amplitude, period, phase in zip(amplitudes, periods, phases)
+        )
+        return base * np.exp(wave + 0.01 * (noise(times, salt) - 0.5))
+
+    open_ = price_at(t)
+    close = price_at(t + 0.5)
+    spread = 0.002 + 0.01 * noise(t, salt + 1)
+    high = np.maximum(open_, close) * (1 + spread * noise(t, salt + 2))
+    low = np.minimum(open_, close) * (1 - spread * noise(t, salt + 3))
+    volume = np.floor(1_000 + 1_000_000 * noise(t, salt + 4))
+
+    return pd.DataFrame(
+        {
+            "Open": open_,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Volume": volume,
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        },
+        index=index,
+    )
+
+
+def bar_index(start, end, resolution):
+    # every bar timestamp in [start, end). UTC, and no attempt at trading sessions
+    frequency = RESOLUTION_FREQUENCIES[resolution]
+    start = pd.Timestamp(start)
+    end = pd.Timestamp(end)
+    start = (
+        start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+    )
+    end = end.tz_localize("UTC") if end.tzinfo is None else end.tz_convert("UTC")
+    # anchor bars on the epoch so every window lines up with every other window at this resolution
+    index = pd.date_range(start.floor("D"), end, freq=frequency, tz="UTC")
+    return index[(index >= start) & (index < end)]
+
+
+def synthetic_history(start, end, resolution, seed=0):
+    return synthetic_bars(bar_index(start, end, resolution), seed)
+
+
+def synthetic_frame(length, resolution="1d", seed=0, end="2022-01-01"):
+    # exactly `length` bars of `resolution`, ending just before `end`
+    frequency = RESOLUTION_FREQUENCIES[resolution]
+    index = pd.date_range(
+        end=pd.Timestamp(end, tz="UTC"), periods=length + 1, freq=frequency
+    )
+    return synthetic_bars(index[:-1], seed)
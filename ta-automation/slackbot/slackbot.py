@@ -1,7 +1,6 @@
 import logging
 import time
 import json
-import boto3
 from slack_bolt import App
 from slack_bolt.adapter.aws_lambda import SlackRequestHandler
 
@@ -162,6 +161,7 @@ def do_ta(respond, body):
                 f"Okay your inputs are all good, now sending it for processing. This might take 15 seconds or more so be patient please"
             )
             # find the step machine so we can get its arn
+            client = get_client()
             ta_automation_machine = get_step_function(client)
 
             # call the state machine
@@ -187,19 +187,31 @@ def do_ta(respond, body):
             # grab the output and load it as json
             state_machine_output = json.loads(job_execution["output"])
 
-            # start responding
-            response_message = (
-                f'Finished analysis for {state_machine_output["job"]["symbol"]}:\n'
-            )
+            # start responding. there's a result per job, although we only ever send the one
+            for job_result in state_machine_output["job_results"]:
+                response_message = (
+                    f'Finished analysis for {job_result["job"]["symbol"]}:\n'
+                )
+
+                for analysis in job_result["ta_analyses"]:
+                    response_message += f' - {str(list(analysis["ta_algo"].keys())[0])} {analysis["ta_analysis"]["confidence"]}/10 confidence <{analysis["graph_url"]}|Graph link>\n'
+
+                respond(response_message)
+
+
+# used by all functions so its a global, but it isn't made until the first /ta that needs it - importing boto3 and
+# building a client is a good chunk of a cold start, and slack wants its ack within 3 seconds
+client = None
 
-            for analysis in state_machine_output["ta_analyses"]:
-                response_message += f' - {str(list(analysis["ta_algo"].keys())[0])} {analysis["ta_analysis"]["confidence"]}/10 confidence <{analysis["graph_url"]}|Graph link>\n'
 
-            respond(response_message)
+def get_client():
+    global client
+    if client is None:
+        import boto3
 
+        client = boto3.client("stepfunctions")
+    return client
 
-# used by all functions so its a global
-client = boto3.client("stepfunctions")
 
 # register commands and handlers
 command = "/ta"
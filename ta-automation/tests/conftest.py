@@ -0,0 +1,22 @@
+import os
+import sys
+
+# the stages are separate lambdas rather than a package, so put each one's folder on the path like the lambda runtime
+# (and local_runner) does. the upstream rate limit is off, the stand-in providers don't need it
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+for path in (
+    "1_job_scan",
+    "2_get_symbol_data",
+    "3_run_ta",
+    "4_generate_graph",
+    "common",
+    "",
+):
+    path = os.path.normpath(os.path.join(ROOT, path))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault("FETCH_RATE", "0")
+os.environ.setdefault("SYMBOL_DATA_STORE", "")
+os.environ.setdefault("RESULT_CACHE_STORE", "")
+os.environ.setdefault("RESULT_CACHE_MB", "0")
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from backtest import backtest
+from signals import BUY, SELL
+
+# small enough to work out by hand. long from the close of a buy to the close of the next sell
+
+
+def signals(length, **at):
+    signal = np.zeros(length, dtype=np.int8)
+    for bar in at.get("buys", []):
+        signal[bar] = BUY
+    for bar in at.get("sells", []):
+        signal[bar] = SELL
+    return signal
+
+
+# two round trips: in at 10 out at 15, in at 8 out at 10
+ROUND_TRIPS = (
+    [10.0, 10, 12, 15, 12, 8, 10, 11],
+    signals(8, buys=[1, 5], sells=[3, 6]),
+)
+
+
+def test_entries_pair_with_the_next_exit():
+    result = backtest(*ROUND_TRIPS)
+    assert result["trades"] == 2
+    assert result["closed_trades"] == 2
+    assert not result["open_trade"]
+    # +50% then +25%
+    assert result["hit_rate"] == 1
+    assert result["average_trade_return"] == pytest.approx(0.375)
+    assert result["total_return"] == pytest.approx(1.5 * 1.25 - 1)
+    # in for bars 1, 2 and 5
+    assert result["exposure"] == pytest.approx(3 / 8)
+    assert result["max_drawdown"] == 0
+    assert result["bars"] == 8
+
+
+def test_repeated_signals_dont_open_another_trade():
+    # a second buy while long, and a sell while flat, change nothing
+    close, _ = ROUND_TRIPS
+    signal = signals(8, buys=[1, 2, 5], sells=[3, 4, 6])
+    assert backtest(close, signal) == backtest(*ROUND_TRIPS)
+
+
+def test_cost_is_paid_on_entry_and_exit():
+    result = backtest(*ROUND_TRIPS, cost=0.01)
+    first = 15 * 0.99 / (10 * 1.01)
+    second = 10 * 0.99 / (8 * 1.01)
+    assert result["average_trade_return"] == pytest.approx((first - 1 + second - 1) / 2)
+    # the bar by bar equity pays the same costs as the trades
+    assert result["total_return"] == pytest.approx(first * second - 1)
+
+
+def test_max_drawdown_and_a_trade_still_open():
+    # in at 10, up to 12, down to 6, back to 12 and still holding
+    close = [10.0, 10, 12, 9, 6, 12]
+    result = backtest(close, signals(6, buys=[1]), cost=0.01)
+    assert result["trades"] == 1
+    assert result["closed_trades"] == 0
+    assert result["open_trade"]
+    # nothing's closed, so there's nothing to grade
+    assert result["hit_rate"] is None
+    assert result["average_trade_return"] is None
+    # marked to the last close without paying to get out
+    assert result["total_return"] == pytest.approx(12 / (10 * 1.01) - 1)
+    # 12 down to 6
+    assert result["max_drawdown"] == pytest.approx(-0.5)
+    assert result["exposure"] == pytest.approx(5 / 6)
+
+
+def test_closed_and_open_trades_together():
+    # a loser (10 -> 8), then in at 8 and still in at the end
+    close = [10.0, 10, 8, 8, 9]
+    result = backtest(close, signals(5, buys=[1, 3], sells=[2]))
+    assert result["trades"] == 2
+    assert result["closed_trades"] == 1
+    assert result["open_trade"]
+    assert result["hit_rate"] == 0
+    assert result["average_trade_return"] == pytest.approx(-0.2)
+    assert result["total_return"] == pytest.approx(0.8 * 9 / 8 - 1)
+    assert result["max_drawdown"] == pytest.approx(-0.2)
+
+
+@pytest.mark.parametrize(
+    "signal",
+    [signals(5), signals(5, sells=[1, 3])],
+    ids=["no signals", "only sells"],
+)
+def test_no_trades(signal):
+    result = backtest([10.0, 11, 9, 12, 10], signal)
+    assert result["trades"] == 0
+    assert result["closed_trades"] == 0
+    assert not result["open_trade"]
+    assert result["hit_rate"] is None
+    assert result["average_trade_return"] is None
+    assert result["total_return"] == 0
+    assert result["max_drawdown"] == 0
+    assert result["exposure"] == 0
+
+
+def test_no_buying_before_the_first_price():
+    # the buy comes before there's a close to buy at, so the trade starts at the first one
+    close = [np.nan, 10.0, np.nan, 11]
+    result = backtest(close, signals(4, buys=[0]))
+    assert result["trades"] == 1
+    assert result["total_return"] == pytest.approx(0.1)
+    assert result["exposure"] == pytest.approx(3 / 4)
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+from local_runner.standins import SyntheticProvider
+from ohlcv_cache import NO_DATA, OHLCVCache
+
+START = pd.Timestamp("2022-01-10", tz="UTC")
+END = pd.Timestamp("2022-03-10", tz="UTC")
+
+
+@pytest.fixture
+def provider():
+    return SyntheticProvider(seed=3, failing=["BAD"])
+
+
+@pytest.fixture
+def cache(tmp_path, provider):
+    return OHLCVCache(str(tmp_path), provider)
+
+
+def expected(symbol, start, end, provider):
+    return provider(symbol, start, end, "1d")
+
+
+def fetch_batch_with(provider):
+    # get_symbol_data.fetch_batch's contract, straight off the stand-in's batch call
+    def fetch_batch(symbols, start, end, interval):
+        frames = provider.batch(symbols, start, end, interval)
+        failures = {symbol: NO_DATA for symbol in symbols if symbol not in frames}
+        return frames, failures
+
+    return fetch_batch
+
+
+def test_history_many_shares_fetches_and_reports_failures(cache, provider):
+    frames, failures = cache.history_many(
+        ["bhp", "BAD", "rio"], START, END, "1d", fetch_batch_with(provider)
+    )
+    assert set(frames) == {"bhp", "rio"}
+    assert set(failures) == {"BAD"}
+    # one upstream call for every symbol on a cold cache
+    assert provider.batch_calls == 1
+    for symbol in ("bhp", "rio"):
+        pd.testing.assert_frame_equal(
+            frames[symbol],
+            expected(symbol, START, END, provider),
+            check_freq=False,
+            check_index_type=False,
+        )
+
+    # the failed symbol wasn't cached, the others were
+    assert cache.load("BAD", "1d") is None
+    frames, failures = cache.history_many(
+        ["bhp", "rio"], START, END, "1d", fetch_batch_with(provider)
+    )
+    assert provider.batch_calls == 1
+    assert failures == {}
+
+
+def test_history_many_accepts_an_empty_gap(cache, provider):
+    fetch_batch = fetch_batch_with(provider)
+    cache.history_many(["bhp", "rio"], START, END, "1d", fetch_batch)
+
+    def closed(symbols, start, end, interval):
+        # the market's been shut since - nobody has any bars for the gap
+        return {}, {symbol: NO_DATA for symbol in symbols}
+
+    later = END + pd.Timedelta(days=3)
+    frames, failures = cache.history_many(
+        ["bhp", "rio", "fmg"], START, later, "1d", closed
+    )
+    # same as history() would give: the bars we already had. fmg has nothing at all, so that one's a failure
+    assert failures == {"fmg": NO_DATA}
+    assert set(frames) == {"bhp", "rio"}
+    for symbol in ("bhp", "rio"):
+        pd.testing.assert_frame_equal(
+            frames[symbol],
+            expected(symbol, START, END, provider),
+            check_freq=False,
+            check_index_type=False,
+        )
+    assert cache.load("fmg", "1d") is None
+    # and the cache knows it's covered the gap now
+    assert cache.load("bhp", "1d")[2] >= later
+
+
+def test_batch_handler_per_symbol_failures(tmp_path):
+    import get_symbol_data
+    from ta_common.wire_format import decode_frame
+
+    provider = SyntheticProvider(seed=3, failing=["BAD"])
+    original = get_symbol_data.provider, get_symbol_data.batch_provider
+    try:
+        for batch in (provider.batch, None):
+            get_symbol_data.use_provider(
+                provider,
+                cache_dir=str(tmp_path / str(batch is None)),
+                new_batch_provider=batch,
+            )
+            result = get_symbol_data.batch_handler(
+                {
+                    "symbols": ["bhp", "BAD", "rio", "bhp"],
+                    "date_from": "2022-01-10T00:00:00+00:00",
+                    "date_to": "2022-03-10T00:00:00+00:00",
+                    "resolution": "1d",
+                }
+            )
+            assert set(result["symbol_data"]) == {"bhp", "rio"}
+            assert set(result["failures"]) == {"BAD"}
+            bhp = decode_frame(result["symbol_data"]["bhp"])
+            assert np.allclose(
+                bhp["Close"], expected("bhp", START, END, provider)["Close"]
+            )
+    finally:
+        get_symbol_data.use_provider(*original[:1], new_batch_provider=original[1])
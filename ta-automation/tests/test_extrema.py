@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+from extrema import rolling_extreme, rolling_range
+
+
+def expected(high, low, window):
+    # what ta itself does
+    return (
+        pd.Series(high).rolling(window, min_periods=0).max().to_numpy(),
+        pd.Series(low).rolling(window, min_periods=0).min().to_numpy(),
+    )
+
+
+def prices(length, seed=0, nans=()):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, length))
+    high = close + rng.uniform(0, 2, length)
+    low = close - rng.uniform(0, 2, length)
+    for bar in nans:
+        high[bar] = low[bar] = np.nan
+    return high, low
+
+
+@pytest.mark.parametrize("window", [1, 2, 3, 7, 14, 50, 199, 200, 201, 500])
+@pytest.mark.parametrize(
+    "nans",
+    [
+        (),
+        # a warm-up - an indicator's leading nans, longer than some of the windows
+        tuple(range(20)),
+        # gaps, one of them longer than the shorter windows
+        (30, 31, 32, 33, 34, 35, 90, 150, 199),
+    ],
+    ids=["no nans", "nan warm-up", "nan gaps"],
+)
+def test_matches_pandas(window, nans):
+    high, low = prices(200, nans=nans)
+    highest, lowest = rolling_range(high, low, window)
+    expected_highest, expected_lowest = expected(high, low, window)
+    # exact - max and min don't round
+    np.testing.assert_array_equal(highest, expected_highest)
+    np.testing.assert_array_equal(lowest, expected_lowest)
+
+
+def test_window_of_one_is_the_values_themselves():
+    high, low = prices(50, nans=(3, 4))
+    highest, lowest = rolling_range(high, low, 1)
+    np.testing.assert_array_equal(highest, high)
+    np.testing.assert_array_equal(lowest, low)
+    # copies, not the arrays that went in
+    assert highest is not high and lowest is not low
+
+
+def test_window_longer_than_the_series_is_the_running_extreme():
+    high, low = prices(10)
+    highest, lowest = rolling_range(high, low, 25)
+    np.testing.assert_array_equal(highest, np.maximum.accumulate(high))
+    np.testing.assert_array_equal(lowest, np.minimum.accumulate(low))
+
+
+def test_all_nan_windows_are_nan():
+    high, low = prices(12, nans=(0, 1, 2, 6, 7, 8, 9))
+    highest, lowest = rolling_range(high, low, 3)
+    assert np.isnan(highest[[0, 1, 2, 8, 9]]).all()
+    assert np.isnan(lowest[[0, 1, 2, 8, 9]]).all()
+    np.testing.assert_array_equal(highest, expected(high, low, 3)[0])
+
+
+def test_columns_are_rolled_separately():
+    # a 2d array is one series per column, as the panel uses it
+    columns = [prices(120, seed=seed, nans=(seed, 60 + seed)) for seed in range(4)]
+    high = np.column_stack([high for high, _ in columns])
+    low = np.column_stack([low for _, low in columns])
+    highest, lowest = rolling_range(high, low, 9)
+    assert highest.shape == high.shape
+    for i, (column_high, column_low) in enumerate(columns):
+        expected_highest, expected_lowest = expected(column_high, column_low, 9)
+        np.testing.assert_array_equal(highest[:, i], expected_highest)
+        np.testing.assert_array_equal(lowest[:, i], expected_lowest)
+
+
+def test_empty():
+    highest, lowest = rolling_range([], [], 14)
+    assert len(highest) == 0 and len(lowest) == 0
+    assert len(rolling_extreme(np.zeros((0, 3)), 5)) == 0
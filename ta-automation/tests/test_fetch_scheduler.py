@@ -0,0 +1,247 @@
+import threading
+import time
+import pandas as pd
+import pytest
+from fetch_scheduler import FetchScheduler, TokenBucket, is_retryable
+
+
+class FakeClock:
+    # sleeping just moves the clock on, and remembers how long for
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TopOfRange:
+    # stands in for the scheduler's rng - always the most the jitter allows
+    def uniform(self, low, high):
+        return high
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class HTTPError(Exception):
+    # shaped like requests'
+    def __init__(self, status_code):
+        super().__init__(f"{status_code} Client Error for url: https://example.com/BHP")
+        self.response = Response(status_code)
+
+
+class YFRateLimitError(Exception):
+    pass
+
+
+class RequestException(IOError):
+    pass
+
+
+class Timeout(RequestException):
+    pass
+
+
+class ReadTimeout(Timeout):
+    # requests' own, which isn't a builtin TimeoutError
+    pass
+
+
+def flaky(failures, error):
+    # a fetcher that raises error the first `failures` times it's called
+    calls = []
+
+    def fetch(symbol, start, end, interval):
+        calls.append(symbol)
+        if len(calls) <= failures:
+            raise error
+        return pd.DataFrame({"Close": [1.0, 2.0]})
+
+    return fetch, calls
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        HTTPError(429),
+        HTTPError(503),
+        YFRateLimitError("Too Many Requests. Rate limited. Try after a while."),
+        ConnectionResetError(),
+        TimeoutError(),
+        ReadTimeout(),
+    ],
+)
+def test_retryable(error):
+    assert is_retryable(error)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        HTTPError(404),
+        # a 429 in the message isn't a 429 - it's a symbol or a date
+        ValueError("No data found for 1429.HK, symbol may be delisted"),
+        KeyError("Too Many Requests"),
+    ],
+)
+def test_not_retryable(error):
+    assert not is_retryable(error)
+
+
+def test_token_bucket_rate_and_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=5, clock=clock, sleep=clock.sleep)
+
+    # the burst goes straight through, then one every half a second
+    waits = [bucket.acquire() for _ in range(8)]
+    assert waits == [0, 0, 0, 0, 0, 0.5, 0.5, 0.5]
+    assert clock.now == pytest.approx(1.5)
+
+    # saving up never gets past the burst
+    clock.now += 60
+    waits = [bucket.acquire() for _ in range(6)]
+    assert waits == [0, 0, 0, 0, 0, 0.5]
+
+
+def test_token_bucket_serves_callers_in_order():
+    # reserved tokens mean callers that arrive together are spaced out, rather than all waiting the same time
+    clock = FakeClock()
+    bucket = TokenBucket(rate=4, burst=1, clock=clock, sleep=lambda seconds: None)
+    assert [bucket.acquire() for _ in range(4)] == [0, 0.25, 0.5, 0.75]
+
+
+def test_scheduler_is_rate_limited():
+    clock = FakeClock()
+    fetch, calls = flaky(0, None)
+    scheduler = FetchScheduler(fetch, rate=1, burst=2, clock=clock, sleep=clock.sleep)
+    for day in range(5):
+        scheduler("BHP", day, day + 1, "1d")
+    assert len(calls) == 5
+    assert clock.sleeps == [1, 1, 1]
+
+
+def test_concurrency_cap():
+    in_flight = []
+    most = []
+    lock = threading.Lock()
+
+    def fetch(symbol, start, end, interval):
+        with lock:
+            in_flight.append(symbol)
+            most.append(len(in_flight))
+        time.sleep(0.02)
+        with lock:
+            in_flight.remove(symbol)
+        return pd.DataFrame()
+
+    scheduler = FetchScheduler(fetch, rate=None, max_concurrency=2)
+    threads = [
+        threading.Thread(target=scheduler, args=(f"S{i}", 0, 1, "1d")) for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(most) == 8
+    assert max(most) == 2
+    assert scheduler.stats["max_queue_depth"] > 2
+
+
+def test_single_flight():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch(symbol, start, end, interval):
+        calls.append(symbol)
+        started.set()
+        release.wait(5)
+        return pd.DataFrame({"Close": [1.0, 2.0]})
+
+    scheduler = FetchScheduler(fetch, rate=None)
+    results = []
+
+    def call(symbol):
+        results.append(scheduler(symbol, 0, 1, "1d"))
+
+    leader = threading.Thread(target=call, args=("BHP",))
+    leader.start()
+    started.wait(5)
+    # the same request in different case, while the first is still in flight
+    followers = [threading.Thread(target=call, args=("bhp",)) for _ in range(5)]
+    for follower in followers:
+        follower.start()
+    deadline = time.monotonic() + 5
+    while scheduler.stats["coalesced"] < 5 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert calls == ["BHP"]
+    assert scheduler.stats["coalesced"] == 5
+    assert len(results) == 6
+    for result in results:
+        pd.testing.assert_frame_equal(result, results[0])
+    # everyone gets their own copy
+    assert len({id(result) for result in results}) == 6
+
+    # and once it's done, the next one goes upstream again
+    scheduler("BHP", 0, 1, "1d")
+    assert len(calls) == 2
+
+
+def test_retries_with_backoff():
+    clock = FakeClock()
+    fetch, calls = flaky(5, HTTPError(429))
+    scheduler = FetchScheduler(
+        fetch,
+        rate=None,
+        max_retries=5,
+        base_delay=0.5,
+        max_delay=3,
+        clock=clock,
+        sleep=clock.sleep,
+        rng=TopOfRange(),
+    )
+    result = scheduler("BHP", 0, 1, "1d")
+
+    assert len(result) == 2
+    assert len(calls) == 6
+    # doubling each time, up to max_delay
+    assert clock.sleeps == [0.5, 1, 2, 3, 3]
+    assert scheduler.stats["retries"] == 5
+    assert scheduler.stats["upstream_calls"] == 6
+
+
+def test_gives_up_after_max_retries():
+    clock = FakeClock()
+    fetch, calls = flaky(10, HTTPError(503))
+    scheduler = FetchScheduler(
+        fetch, rate=None, max_retries=2, clock=clock, sleep=clock.sleep
+    )
+    with pytest.raises(HTTPError):
+        scheduler("BHP", 0, 1, "1d")
+    assert len(calls) == 3
+    assert len(clock.sleeps) == 2
+
+
+def test_other_errors_are_not_retried():
+    clock = FakeClock()
+    fetch, calls = flaky(1, ValueError("No data found for 1429.HK"))
+    scheduler = FetchScheduler(fetch, rate=None, clock=clock, sleep=clock.sleep)
+    with pytest.raises(ValueError):
+        scheduler("1429.HK", 0, 1, "1d")
+    assert len(calls) == 1
+    assert clock.sleeps == []
+    # and the slot it had was given back
+    scheduler("1429.HK", 0, 1, "1d")
+    assert len(calls) == 2
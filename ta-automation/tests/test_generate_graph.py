@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from generate_graph import RENDERERS, _figures
+from local_runner.synthetic import synthetic_frame
+
+
+@pytest.fixture
+def figure(monkeypatch):
+    # a figure of our own that isn't cleared after saving, so the titles can be checked
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    monkeypatch.setattr(figure, "clear", lambda: None)
+    monkeypatch.setattr(_figures, "figure", figure, raising=False)
+    return figure
+
+
+def ta_data(bars):
+    values = np.sin(np.arange(bars) / 5).tolist()
+    return {
+        "awesome-oscillator": values,
+        "awesome-oscillator-signal": [0] * bars,
+        "stoch": values,
+        "stoch_signal": values,
+        "stoch-crossover": [0] * bars,
+    }
+
+
+@pytest.mark.parametrize(
+    "ta_algo, title",
+    [
+        ({"awesome-oscillator": None}, "BHP AWESOME OSCILLATOR 5,34"),
+        (
+            {"awesome-oscillator": {"window1": 8, "window2": 21}},
+            "BHP AWESOME OSCILLATOR 8,21",
+        ),
+        ({"stoch": None}, "BHP STOCHASTIC 14,3"),
+        ({"stoch": {"window": 21, "smooth_window": 5}}, "BHP STOCHASTIC 21,5"),
+    ],
+)
+def test_titles_have_the_algo_windows(figure, tmp_path, ta_algo, title):
+    df = synthetic_frame(50, seed=4)
+    render = RENDERERS[list(ta_algo)[0]]
+    render(df, ta_data(len(df)), "BHP", str(tmp_path / "graph.png"), ta_algo)
+    assert title in [ax.get_title() for ax in figure.axes]
@@ -0,0 +1,154 @@
+import json
+import numpy as np
+import pytest
+from incremental import DEFAULT_HISTORY, IndicatorState, advance
+from indicators import IndicatorFrame
+from local_runner.synthetic import synthetic_frame
+from signals import BUY, SELL, crossover_signal, signal_found
+
+BARS = 600
+CHUNKS = [1, 40, 41, 100, 173, 250, 400, 599, 600]
+
+
+@pytest.fixture
+def df():
+    return synthetic_frame(BARS, resolution="5m", seed=21)
+
+
+def full(df):
+    frame = IndicatorFrame(df)
+    stoch, stoch_signal = frame.stoch()
+    return {
+        "awesome-oscillator": frame.awesome_oscillator().to_numpy(),
+        "stoch": stoch.to_numpy(),
+        "stoch_signal": stoch_signal.to_numpy(),
+        "accumulation-distribution": frame.acc_dist().to_numpy(),
+    }
+
+
+def saved(state):
+    # through json, the way it goes in and out of the state store
+    return IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+
+
+def run_in_chunks(df, ends):
+    # one "run" per end, each over df up to there, starting from the checkpoint the previous run saved
+    checkpoint = None
+    for end in ends:
+        live, checkpoint, _ = advance(
+            None if checkpoint is None else saved(checkpoint), df.iloc[:end]
+        )
+        checkpoint = saved(checkpoint)
+        yield end, live
+
+
+def test_streaming_matches_a_full_recompute(df):
+    for end, live in run_in_chunks(df, CHUNKS):
+        expected = full(df.iloc[:end])
+        for name, values in expected.items():
+            np.testing.assert_allclose(
+                live.latest[name], values[-1], rtol=1e-9, atol=1e-9, err_msg=name
+            )
+
+
+def test_every_bar_matches_a_full_recompute(df):
+    # one bar per run - each run replays the bar the checkpoint before it stopped short of
+    expected = full(df)
+    live_values = {name: [] for name in expected}
+    for _, live in run_in_chunks(df, range(1, BARS + 1)):
+        for name in expected:
+            live_values[name].append(live.latest[name])
+    for name, values in expected.items():
+        np.testing.assert_allclose(
+            live_values[name], values, rtol=1e-9, atol=1e-9, err_msg=name
+        )
+
+
+def test_checkpoint_is_taken_before_the_last_bar(df):
+    live, checkpoint, processed = advance(None, df.iloc[:300])
+    assert processed == 300
+    assert live.bars == 300
+    assert checkpoint.bars == 299
+
+    # the last bar was still forming - it comes back revised, and the replay uses the new numbers
+    revised = df.iloc[:301].copy()
+    revised.iloc[299, revised.columns.get_loc("Close")] *= 1.05
+    revised.iloc[299, revised.columns.get_loc("High")] *= 1.05
+    live, checkpoint, processed = advance(saved(checkpoint), revised)
+    assert processed == 2
+    expected = full(revised)
+    for name, values in expected.items():
+        np.testing.assert_allclose(
+            live.latest[name], values[-1], rtol=1e-9, atol=1e-9, err_msg=name
+        )
+
+
+def test_state_that_does_not_line_up_starts_again(df):
+    _, checkpoint, _ = advance(None, df.iloc[:200])
+    # a window that doesn't include the bar the checkpoint stopped at
+    live, _, processed = advance(saved(checkpoint), df.iloc[250:400])
+    assert processed == 150
+    expected = full(df.iloc[250:400])
+    np.testing.assert_allclose(
+        live.latest["awesome-oscillator"], expected["awesome-oscillator"][-1]
+    )
+
+
+@pytest.mark.parametrize("search_period", [1, 5, 20, DEFAULT_HISTORY])
+def test_crossover_search_matches_the_full_signal(df, search_period):
+    signal = crossover_signal(full(df)["awesome-oscillator"])
+    for _, live in run_in_chunks(df, [200, 450, BARS]):
+        pass
+    for value in (BUY, SELL):
+        assert live.crossover.found(search_period, value) == signal_found(
+            signal, search_period, value
+        )
+
+
+def test_search_everything_runs_in_full(monkeypatch):
+    import incremental
+    import run_ta
+
+    monkeypatch.setattr(incremental, "INDICATOR_STATE_STORE", "/tmp/state")
+    payload = {
+        "incremental": True,
+        "search_period": 20,
+        "ta_algo": {"awesome-oscillator": None},
+    }
+    assert run_ta.use_incremental(payload)
+    # 0 means the whole series, which the state doesn't keep
+    assert not run_ta.use_incremental(dict(payload, search_period=0))
+    assert not run_ta.use_incremental(dict(payload, search_period=DEFAULT_HISTORY + 1))
+
+
+def test_sliding_window_matches_a_full_recompute(df):
+    # date_from and date_to both moving on between runs - each run has to answer for its own window, as if the bars
+    # before it had never been seen
+    checkpoint = None
+    for start, end in [(0, 200), (0, 260), (60, 320), (120, 380), (120, 450)]:
+        window = df.iloc[start:end]
+        live, checkpoint, _ = advance(
+            None if checkpoint is None else saved(checkpoint), window
+        )
+        checkpoint = saved(checkpoint)
+
+        expected = full(window)
+        for name, values in expected.items():
+            np.testing.assert_allclose(
+                live.latest[name], values[-1], rtol=1e-9, atol=1e-9, err_msg=name
+            )
+        signal = crossover_signal(expected["awesome-oscillator"])
+        for search_period in (5, 20, DEFAULT_HISTORY):
+            for value in (BUY, SELL):
+                assert live.crossover.found(search_period, value) == signal_found(
+                    signal, search_period, value
+                ), (start, end, search_period, value)
+
+
+def test_state_from_a_moved_date_from_starts_again(df):
+    _, checkpoint, _ = advance(None, df.iloc[:300])
+    _, _, processed = advance(saved(checkpoint), df.iloc[100:350])
+    assert processed == 250
+    # same date_from, so only the new bars (plus the one the checkpoint stopped short of)
+    _, _, processed = advance(saved(checkpoint), df.iloc[:350])
+    assert processed == 51
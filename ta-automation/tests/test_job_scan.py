@@ -0,0 +1,86 @@
+from datetime import timedelta
+import pytest
+from job_scan import job_enumerator, parse_date, plan_fetches, validate_input
+
+
+def job(**overrides):
+    return dict(
+        {
+            "symbol": "spy",
+            "date_from": "2022-01-01T04:16:13+10:00",
+            "date_to": "2022-03-30T04:16:13+10:00",
+            "ta_algos": [{"awesome-oscillator": None}],
+            "resolution": "5m",
+        },
+        **overrides,
+    )
+
+
+def test_resolutions_buildable_from_resolution_are_accepted():
+    validate_input([job(resolutions=["15m", "1h", "1d", "1wk"])])
+
+
+@pytest.mark.parametrize(
+    "resolution, resolutions", [("1d", ["5d"]), ("1d", ["1h"]), ("15m", ["1h", "10m"])]
+)
+def test_resolutions_that_cant_be_built_are_rejected(resolution, resolutions):
+    # 5d bars can't be rebuilt from anything, and nothing finer comes out of coarser bars
+    with pytest.raises(ValueError, match="resolutions"):
+        validate_input([job(resolution=resolution, resolutions=resolutions)])
+
+
+def test_multi_timeframe_fetch_starts_a_day_early():
+    plain = job()
+    multi = job(symbol="qqq", resolutions=["1h"])
+    validate_input([plain, multi])
+    groups = {
+        group["symbol"]: group
+        for group in plan_fetches(job_enumerator({"jobs": [plain, multi]}))[
+            "fetch_groups"
+        ]
+    }
+
+    assert groups["spy"]["date_from"] == plain["date_from"]
+    assert parse_date(groups["qqq"]["date_from"]) == parse_date(
+        multi["date_from"]
+    ) - timedelta(hours=25)
+    # the item keeps its own date_from for run TA to cut back to
+    assert groups["qqq"]["items"][0]["date_from"] == multi["date_from"]
+
+
+def test_incremental_reaches_run_ta():
+    jobs = [job(incremental=True), job(symbol="qqq")]
+    validate_input(jobs)
+    items = {
+        item["symbol"]: item
+        for group in plan_fetches(job_enumerator({"jobs": jobs}))["fetch_groups"]
+        for item in group["items"]
+    }
+    assert items["spy"]["incremental"] is True
+    assert items["qqq"]["incremental"] is None
+
+    with pytest.raises(ValueError, match="incremental"):
+        validate_input([job(incremental="sometimes")])
+
+
+@pytest.mark.parametrize(
+    "params", [{"window1": 8}, {"window2": 26}, {"window1": 8, "window2": 26}, None]
+)
+def test_ao_windows_are_accepted(params):
+    validate_input([job(ta_algos=[{"awesome-oscillator": params}])])
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        # checked against the other window's default, 5/34
+        {"window1": 40},
+        {"window1": 34},
+        {"window2": 5},
+        {"window2": 3},
+        {"window1": 20, "window2": 10},
+    ],
+)
+def test_ao_windows_the_wrong_way_round_are_rejected(params):
+    with pytest.raises(ValueError, match="must be shorter than window2"):
+        validate_input([job(ta_algos=[{"awesome-oscillator": params}])])
@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+from ta_common.object_store import (
+    LocalObjectStore,
+    S3ObjectStore,
+    object_store_from_url,
+)
+from ta_common.symbol_data import is_claim_check, load_symbol_data, store_symbol_data
+
+
+class RecordingS3Client:
+    # just put_object, for checking what S3ObjectStore sends
+    def __init__(self):
+        self.calls = []
+
+    def put_object(self, **kwargs):
+        self.calls.append(kwargs)
+
+
+def test_local_round_trip(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    assert not store.exists("bhp/1d/abc.json")
+
+    store.put("bhp/1d/abc.json", b'{"x": 1}', content_type="application/json")
+    assert store.exists("bhp/1d/abc.json")
+    assert store.get("bhp/1d/abc.json") == b'{"x": 1}'
+    assert store.url("bhp/1d/abc.json") == "file://" + str(
+        tmp_path / "bhp" / "1d" / "abc.json"
+    )
+
+    # overwrites, and leaves no temp file behind
+    store.put("bhp/1d/abc.json", b"second", storage_class="STANDARD_IA")
+    assert store.get("bhp/1d/abc.json") == b"second"
+    assert sorted(path.name for path in (tmp_path / "bhp" / "1d").iterdir()) == [
+        "abc.json"
+    ]
+
+
+def test_concurrent_puts_to_the_same_key(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    bodies = [f"body {i}".encode() * 1000 for i in range(32)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda body: store.put("graphs/same.png", body), bodies))
+
+    # one of them won, whole, and nothing's left over
+    assert store.get("graphs/same.png") in bodies
+    assert [path.name for path in (tmp_path / "graphs").iterdir()] == ["same.png"]
+
+
+def test_store_from_url(tmp_path):
+    for url in (str(tmp_path), "file://" + str(tmp_path)):
+        store = object_store_from_url(url)
+        assert isinstance(store, LocalObjectStore)
+        store.put("key", b"body")
+        assert object_store_from_url(url).get("key") == b"body"
+
+    store = object_store_from_url("s3://bucket/some/prefix")
+    assert isinstance(store, S3ObjectStore)
+    assert (store.bucket, store.object_key("key")) == ("bucket", "some/prefix/key")
+
+
+def test_s3_put_passes_content_type_and_storage_class():
+    client = RecordingS3Client()
+    store = S3ObjectStore("bucket", "graphs", client=client)
+    store.put("a.png", b"png", content_type="image/png", storage_class="STANDARD_IA")
+    store.put("b.json", b"{}")
+    assert client.calls == [
+        {
+            "Bucket": "bucket",
+            "Key": "graphs/a.png",
+            "Body": b"png",
+            "ContentType": "image/png",
+            "StorageClass": "STANDARD_IA",
+        },
+        {"Bucket": "bucket", "Key": "graphs/b.json", "Body": b"{}"},
+    ]
+
+
+def test_claim_check_round_trip(tmp_path):
+    symbol_data = {
+        "format": "ohlcv-columnar/1",
+        "rows": 2,
+        "columns": {"Close": [1, 2]},
+    }
+
+    claim_check = store_symbol_data(symbol_data, "BHP", "1d", store_url=str(tmp_path))
+    assert is_claim_check(claim_check)
+    assert load_symbol_data(claim_check) == symbol_data
+
+    # content addressed - the same data gets the same pointer, and is only stored once
+    assert store_symbol_data(symbol_data, "BHP", "1d", store_url=str(tmp_path)) == (
+        claim_check
+    )
+    assert len(list((tmp_path / "bhp" / "1d").iterdir())) == 1
+
+
+def test_no_store_passes_the_data_inline():
+    symbol_data = {"rows": 0}
+    assert store_symbol_data(symbol_data, "bhp", "1d", store_url=None) is symbol_data
+    assert load_symbol_data(symbol_data) is symbol_data
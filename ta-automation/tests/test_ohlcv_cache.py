@@ -0,0 +1,264 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+from local_runner.standins import SyntheticProvider
+from local_runner.synthetic import synthetic_history
+from ohlcv_cache import OHLCVCache, merge_frames
+from ta_common.resample import resample
+
+START = pd.Timestamp("2022-01-10", tz="UTC")
+END = pd.Timestamp("2022-03-10", tz="UTC")
+
+
+@pytest.fixture
+def provider():
+    return SyntheticProvider(seed=3, failing=["BAD"])
+
+
+@pytest.fixture
+def cache(tmp_path, provider):
+    return OHLCVCache(str(tmp_path), provider)
+
+
+def expected(symbol, start, end, provider):
+    return provider(symbol, start, end, "1d")
+
+
+def test_plan_cold_cache_fetches_the_whole_range(cache):
+    plan = cache.plan("bhp", START, END, "1d")
+    assert plan.frame is None
+    assert plan.gaps == [(START, END)]
+
+
+def test_plan_covered_middle_needs_nothing(cache):
+    cache.history("bhp", START, END, "1d")
+    plan = cache.plan(
+        "bhp", START + pd.Timedelta(days=10), END - pd.Timedelta(days=10), "1d"
+    )
+    assert plan.gaps == []
+
+
+def test_plan_head_gap_runs_up_to_the_cached_range(cache):
+    cache.history("bhp", START, END, "1d")
+    earlier = START - pd.Timedelta(days=20)
+    plan = cache.plan("bhp", earlier, END, "1d")
+    assert plan.gaps == [(earlier, START)]
+    assert plan.covered_from == earlier
+
+
+def test_plan_tail_gap_refetches_the_last_bar(cache):
+    history = cache.history("bhp", START, END, "1d")
+    later = END + pd.Timedelta(days=20)
+    plan = cache.plan("bhp", START, later, "1d")
+    # the last bar held might have been a partial one, so it's fetched again
+    assert plan.gaps == [(history.index[-1], later)]
+    assert plan.covered_to == later
+
+
+def test_plan_head_and_tail_gaps(cache):
+    history = cache.history("bhp", START, END, "1d")
+    earlier = START - pd.Timedelta(days=5)
+    later = END + pd.Timedelta(days=5)
+    plan = cache.plan("bhp", earlier, later, "1d")
+    assert plan.gaps == [(earlier, START), (history.index[-1], later)]
+
+
+def test_history_only_fetches_the_gaps(cache, provider):
+    cache.history("bhp", START, END, "1d")
+    assert provider.calls == 1
+
+    # inside what's cached - nothing upstream
+    cache.history("bhp", START + pd.Timedelta(days=3), END, "1d")
+    assert provider.calls == 1
+
+    # either side - one call for each gap, and the bars are the same as fetching it all in one go
+    earlier = START - pd.Timedelta(days=7)
+    later = END + pd.Timedelta(days=7)
+    history = cache.history("bhp", earlier, later, "1d")
+    assert provider.calls == 3
+    pd.testing.assert_frame_equal(
+        history,
+        expected("bhp", earlier, later, provider),
+        check_freq=False,
+        check_index_type=False,
+    )
+
+
+def test_merge_frames_later_pieces_win():
+    index = pd.date_range("2022-01-01", periods=6, freq="D", tz="UTC")
+    old = pd.DataFrame({"Close": [1.0, 2.0, 3.0, 4.0]}, index=index[:4])
+    new = pd.DataFrame({"Close": [30.0, 40.0, 50.0, 60.0]}, index=index[2:])
+
+    merged = merge_frames([old, new])
+    assert merged.index.equals(index)
+    assert merged["Close"].tolist() == [1.0, 2.0, 30.0, 40.0, 50.0, 60.0]
+
+
+def test_merge_frames_sorts_and_skips_empty_pieces():
+    index = pd.date_range("2022-01-01", periods=4, freq="D", tz="UTC")
+    late = pd.DataFrame({"Close": [3.0, 4.0]}, index=index[2:])
+    early = pd.DataFrame({"Close": [1.0, 2.0]}, index=index[:2])
+    empty = pd.DataFrame(index=pd.DatetimeIndex([], tz="UTC"))
+
+    merged = merge_frames([late, empty, early])
+    assert merged.index.equals(index)
+    assert merged["Close"].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_npz_round_trip(cache):
+    frame = synthetic_history(START, END, "1h", seed=5)
+    cache.save("bhp.ax", "1h", frame, START, END, "Australia/Sydney")
+
+    loaded, covered_from, covered_to, tz = cache.load("bhp.ax", "1h")
+    pd.testing.assert_frame_equal(
+        loaded, frame, check_freq=False, check_index_type=False
+    )
+    assert loaded.index.tz is not None
+    assert (covered_from, covered_to) == (START, END)
+    assert tz == "Australia/Sydney"
+
+
+def test_npz_round_trip_without_tz(cache):
+    frame = synthetic_history(START, END, "1d", seed=5)
+    cache.save("bhp", "1d", frame, START, END)
+    assert cache.load("bhp", "1d")[3] is None
+
+
+def test_load_unknown_symbol(cache):
+    assert cache.load("never-seen", "1d") is None
+
+
+def session_bars(days, tz="America/New_York"):
+    # 5m bars for a 9:30 to 16:00 session on each day, UTC indexed like the cache holds them
+    index = pd.DatetimeIndex([])
+    for day in days:
+        index = index.append(
+            pd.date_range(f"{day} 09:30", f"{day} 15:55", freq="5min", tz=tz)
+        )
+    index = index.tz_convert("UTC")
+    close = np.linspace(100.0, 110.0, len(index))
+    return pd.DataFrame(
+        {
+            "Open": close,
+            "High": close + 1,
+            "Low": close - 1,
+            "Close": close,
+            "Volume": np.ones(len(index)),
+        },
+        index=index,
+    )
+
+
+def test_derive_from_part_way_through_a_session(cache):
+    tz = "America/New_York"
+    frame = session_bars(["2022-01-10", "2022-01-11"])
+    cache.save(
+        "spy",
+        "5m",
+        frame,
+        pd.Timestamp("2022-01-10", tz=tz),
+        pd.Timestamp("2022-01-13", tz=tz),
+        tz,
+    )
+
+    start = pd.Timestamp("2022-01-10 13:16", tz=tz)
+    end = pd.Timestamp("2022-01-12", tz=tz)
+    derived = cache.derive("spy", start, end, "1h")
+
+    # binned from the 9:30 open, not from the first bar after start
+    local = derived.index.tz_convert(tz)
+    assert [str(t.time()) for t in local[:4]] == [
+        "13:30:00",
+        "14:30:00",
+        "15:30:00",
+        "09:30:00",
+    ]
+    whole = resample(frame, "1h", tz)
+    pd.testing.assert_frame_equal(
+        derived, whole[whole.index >= start], check_freq=False, check_index_type=False
+    )
+
+
+def test_derive_needs_the_start_of_the_session(cache):
+    tz = "America/New_York"
+    frame = session_bars(["2022-01-10", "2022-01-11"])
+    frame = frame[frame.index >= pd.Timestamp("2022-01-10 13:16", tz=tz)]
+    cache.save(
+        "spy",
+        "5m",
+        frame,
+        pd.Timestamp("2022-01-10 13:16", tz=tz),
+        pd.Timestamp("2022-01-13", tz=tz),
+        tz,
+    )
+
+    # the cache doesn't have the session's first bars, so it can't line the bins up
+    start = pd.Timestamp("2022-01-10 13:16", tz=tz)
+    assert cache.derive("spy", start, pd.Timestamp("2022-01-12", tz=tz), "1h") is None
+
+
+class SlowProvider(SyntheticProvider):
+    # holds every fetch up for a moment, so concurrent writers overlap
+    def __call__(self, symbol, start, end, interval):
+        time.sleep(0.01)
+        return super().__call__(symbol, start, end, interval)
+
+
+def fetch_at_once(cache, windows, workers=16):
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(cache.history, "bhp", start, end, "1d")
+            for start, end in windows
+        ]
+        return [future.result() for future in futures]
+
+
+def test_concurrent_writers_with_separate_windows(tmp_path):
+    provider = SlowProvider(seed=3)
+    cache = OHLCVCache(str(tmp_path), provider)
+    windows = [
+        (START + pd.Timedelta(days=40 * i), START + pd.Timedelta(days=40 * i + 30))
+        for i in range(20)
+    ]
+    for (start, end), history in zip(windows, fetch_at_once(cache, windows)):
+        pd.testing.assert_frame_equal(
+            history,
+            expected("bhp", start, end, provider),
+            check_freq=False,
+            check_index_type=False,
+        )
+
+    # whatever's left on disk is one writer's range, with the right bars in it
+    frame, covered_from, covered_to, _ = cache.load("bhp", "1d")
+    pd.testing.assert_frame_equal(
+        frame,
+        expected("bhp", covered_from, covered_to, provider),
+        check_freq=False,
+        check_index_type=False,
+    )
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_concurrent_writers_keep_each_others_bars(tmp_path):
+    # overlapping windows - none of the bars any of them fetched go missing
+    provider = SlowProvider(seed=3)
+    cache = OHLCVCache(str(tmp_path), provider)
+    cache.history("bhp", START, START + pd.Timedelta(days=10), "1d")
+    windows = [
+        (START + pd.Timedelta(days=5 * i), START + pd.Timedelta(days=5 * i + 10))
+        for i in range(16)
+    ]
+    fetch_at_once(cache, windows)
+
+    frame, covered_from, covered_to, _ = cache.load("bhp", "1d")
+    assert covered_from == START
+    assert covered_to == windows[-1][1]
+    pd.testing.assert_frame_equal(
+        frame,
+        expected("bhp", covered_from, covered_to, provider),
+        check_freq=False,
+        check_index_type=False,
+    )
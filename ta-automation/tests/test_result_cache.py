@@ -0,0 +1,154 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+import result_cache
+from result_cache import ResultCache, cached_result, result_key
+from ta_common.object_store import LocalObjectStore
+
+
+def payload(url="s3://bucket/symbol-data/bhp/1d/abc.json", **params):
+    return {
+        "symbol": "BHP",
+        "resolution": "1d",
+        "date_from": "2024-01-01",
+        "date_to": "2024-06-01",
+        "search_period": 5,
+        "ta_algo": {"stoch": None},
+        "symbol_data": {"claim_check": url},
+        **params,
+    }
+
+
+def size_of(result):
+    return len(json.dumps(result, separators=(",", ":")).encode("utf-8"))
+
+
+class Runs:
+    # stands in for run TA, counting how often it actually ran
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"call": self.calls}
+
+
+def test_miss_then_hit():
+    cache = ResultCache(1024 * 1024)
+    run = Runs()
+
+    first = cached_result(cache, payload(), run)
+    second = cached_result(cache, payload(), run)
+
+    assert run.calls == 1
+    # the very same object, not a copy
+    assert second is first
+    assert cache.stats["misses"] == 1
+    assert cache.stats["hits"] == 1
+
+
+def test_store_hit_from_a_fresh_cache(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    run = Runs()
+    cached_result(ResultCache(1024 * 1024, store), payload(), run)
+
+    # a new container - nothing in memory, but the store has it
+    cache = ResultCache(1024 * 1024, store)
+    assert cached_result(cache, payload(), run) == {"call": 1}
+    assert run.calls == 1
+    assert cache.stats["store_hits"] == 1
+
+    # and it's in memory now
+    cached_result(cache, payload(), run)
+    assert cache.stats["hits"] == 1
+
+
+def test_evicts_least_recently_used():
+    result = {"value": "x" * 100}
+    cache = ResultCache(size_of(result) * 2)
+    cache.put("a", result)
+    cache.put("b", result)
+    # a is now the most recently used, so b goes
+    assert cache.get("a") is result
+    cache.put("c", result)
+
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.get("b") is None
+    assert cache.size == size_of(result) * 2
+    assert cache.stats["evictions"] == 1
+
+
+def test_too_big_for_memory_only_goes_in_the_store(tmp_path):
+    cache = ResultCache(10, LocalObjectStore(str(tmp_path)))
+    cache.put("a", {"value": "x" * 100})
+
+    assert not cache.entries
+    assert cache.size == 0
+    assert cache.get("a") == {"value": "x" * 100}
+
+
+def test_key_changes_with_data_params_and_version(monkeypatch):
+    key = result_key(payload())
+    assert result_key(payload()) == key
+
+    assert result_key(payload(url="s3://bucket/symbol-data/bhp/1d/def.json")) != key
+    assert result_key(payload(search_period=6)) != key
+    assert result_key(payload(ta_algo={"stoch": {"window": 10}})) != key
+
+    monkeypatch.setattr(result_cache, "RESULT_VERSION", result_cache.RESULT_VERSION + 1)
+    assert result_key(payload()) != key
+
+
+def test_new_data_is_a_miss():
+    cache = ResultCache(1024 * 1024)
+    run = Runs()
+    cached_result(cache, payload(), run)
+    cached_result(cache, payload(url="s3://bucket/symbol-data/bhp/1d/def.json"), run)
+
+    assert run.calls == 2
+    assert cache.stats["misses"] == 2
+
+
+def test_inline_data_is_not_cached():
+    cache = ResultCache(1024 * 1024)
+    run = Runs()
+    inline = payload()
+    inline["symbol_data"] = {"index": [1, 2, 3], "close": [1.0, 2.0, 3.0]}
+
+    assert result_key(inline) is None
+    cached_result(cache, inline, run)
+    cached_result(cache, inline, run)
+    assert run.calls == 2
+    assert not cache.entries
+
+
+def test_panel_key():
+    panel = payload(symbols=["BHP", "RIO", "FMG"])
+    panel["symbol_data"] = {
+        "BHP": {"claim_check": "s3://bucket/bhp.json"},
+        "RIO": {"claim_check": "s3://bucket/rio.json"},
+    }
+    key = result_key(panel)
+    assert key is not None
+
+    # FMG's data turning up changes it, and any symbol's data being inline means no key at all
+    panel["symbol_data"]["FMG"] = {"claim_check": "s3://bucket/fmg.json"}
+    assert result_key(panel) != key
+    panel["symbol_data"]["FMG"] = {"index": [1], "close": [1.0]}
+    assert result_key(panel) is None
+
+
+def test_shared_between_threads():
+    result = {"value": "x" * 100}
+    cache = ResultCache(size_of(result) * 8)
+
+    def use(i):
+        key = f"key {i % 16}"
+        if cache.get(key) is None:
+            cache.put(key, result)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(use, range(2000)))
+
+    assert len(cache.entries) <= 8
+    assert cache.size == size_of(result) * len(cache.entries)
+    assert sum(cache.stats[name] for name in ("hits", "misses")) == 2000
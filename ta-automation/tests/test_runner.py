@@ -0,0 +1,50 @@
+import pytest
+from local_runner.runner import run_pipeline
+
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    # load_stages sets its config with setdefault - keep it from leaking into the other tests. the stages read it at
+    # import, and other tests may have imported generate graph already, so its store is patched in directly
+    import generate_graph
+
+    for name in ("OHLCV_CACHE_DIR", "GRAPH_STORE", "TA_OUTPUT"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(generate_graph, "GRAPH_STORE", str(tmp_path / "graphs"))
+    return tmp_path
+
+
+def one_symbol_jobs():
+    # separate and overlapping windows for the one symbol, so its fetch groups hit the same cache file at once
+    jobs = []
+    for i in range(12):
+        month = 1 + i % 12
+        jobs.append(
+            {
+                "symbol": "bhp",
+                "date_from": f"{2019 + i % 3}-{month:02d}-01T04:16:13+10:00",
+                "date_to": f"{2019 + i % 3}-{month:02d}-25T04:16:13+10:00",
+                "ta_algos": [{"awesome-oscillator": None}, {"stoch": None}],
+                "target_ta_confidence": 5,
+            }
+        )
+    return {"jobs": jobs}
+
+
+def confidences(output):
+    return [
+        (result["job"]["date_from"], result["ta_summary"]["overall_ta_confidence"])
+        for result in output["job_results"]
+    ]
+
+
+@pytest.mark.parametrize("pool", ["thread", "process"])
+def test_one_symbol_across_several_workers(env, pool):
+    # parallel first, on a cold cache - the serial run then shares it
+    parallel = run_pipeline(
+        one_symbol_jobs(), workers=8, pool=pool, workdir=str(env / pool)
+    )
+    serial = run_pipeline(one_symbol_jobs(), workers=1, workdir=str(env / "serial"))
+    assert parallel["fetches"]["fetches_planned"] == 12
+    assert len(parallel["job_results"]) == 12
+    assert sorted(confidences(parallel)) == sorted(confidences(serial))
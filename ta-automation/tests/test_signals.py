@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from indicators import IndicatorFrame
+from local_runner.synthetic import synthetic_frame
+from panel import Panel
+from signals import BUY, SELL, divergence_events, graded_confidence, stoch_events
+
+ALGOS = [{"stoch": None}, {"accumulation-distribution": None}]
+
+
+def test_stoch_keeps_repeated_buys():
+    # two oversold crossings up with no sell between them - both are signals, and the latest one is graded
+    k = [10, 15, 12, 5, 8, 50]
+    d = [12, 13, 14, 6, 7, 40]
+    signal, strength = stoch_events(k, d)
+    assert signal.tolist() == [0, BUY, 0, 0, BUY, 0]
+    assert graded_confidence(signal, strength, 3) == pytest.approx(
+        5 + 5 * (20 - 5) / 20
+    )
+
+
+def test_divergence_keeps_repeated_buys():
+    # price keeps making new lows while the indicator doesn't
+    price = [10, 9, 8, 7]
+    indicator = [5, 6, 7, 8]
+    signal, _ = divergence_events(price, indicator, 2)
+    assert signal.tolist() == [0, BUY, BUY, BUY]
+
+
+@pytest.mark.parametrize("ta_algo", ALGOS)
+def test_run_algo_signal_is_the_raw_events(ta_algo):
+    from run_ta import run_algo
+
+    df = synthetic_frame(2_000, resolution="5m", seed=8)
+    frame = IndicatorFrame(df)
+    if "stoch" in ta_algo:
+        events, strength = stoch_events(*frame.stoch())
+        key = "stoch-crossover"
+    else:
+        events, strength = divergence_events(df["Close"], frame.acc_dist(), 20)
+        key = "accumulation-distribution-divergence"
+    # the synthetic data has back to back signals in the same direction, or this wouldn't show anything
+    fired = events[events != 0]
+    assert np.any(fired[1:] == fired[:-1])
+
+    analysis = run_algo(IndicatorFrame(df), ta_algo, 100)
+    assert analysis["ta_data"][key] == events.tolist()
+    assert analysis["confidence"] == graded_confidence(events, strength, 100)
+
+
+@pytest.mark.parametrize("ta_algo", ALGOS)
+def test_panel_matches_each_symbol(ta_algo):
+    from run_ta import run_algo, run_panel_algo
+
+    frames = {
+        symbol: synthetic_frame(bars, resolution="5m", seed=seed)
+        for symbol, bars, seed in [("a", 1_500, 1), ("b", 1_200, 2), ("c", 900, 3)]
+    }
+    panel = run_panel_algo(Panel(frames), ta_algo, 50)
+    for symbol, df in frames.items():
+        single = run_algo(IndicatorFrame(df), ta_algo, 50)
+        assert panel[symbol]["confidence"] == pytest.approx(single["confidence"])
+        for name, value in panel[symbol]["latest"].items():
+            assert value == pytest.approx(single["ta_data"][name][-1], nan_ok=True)
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from backtest import backtest_frame
+from indicators import IndicatorFrame
+from local_runner.synthetic import synthetic_frame
+from run_ta import run_algo
+from sweep import ao_grid_signals, grid_points, sweep
+
+
+@pytest.fixture(scope="module")
+def frames():
+    return {
+        f"S{seed}": synthetic_frame(1500, resolution="1h", seed=seed)
+        for seed in range(3)
+    }
+
+
+def test_ao_points_need_window1_shorter_than_window2():
+    points = grid_points(
+        "awesome-oscillator", {"window1": [3, 5, 40], "window2": [34, 21]}
+    )
+    assert points == [
+        {"window1": 3, "window2": 34},
+        {"window1": 3, "window2": 21},
+        {"window1": 5, "window2": 34},
+        {"window1": 5, "window2": 21},
+    ]
+
+
+def test_ao_points_check_a_missing_window_against_its_default():
+    # window2 is 34 when it isn't swept
+    points = grid_points("awesome-oscillator", {"window1": [3, 34, 40]})
+    assert points == [{"window1": 3}]
+
+
+def test_grid_points_are_every_combination():
+    points = grid_points("stoch", {"window": [5, 9], "smooth_window": [3, 5]})
+    assert points == [
+        {"window": 5, "smooth_window": 3},
+        {"window": 5, "smooth_window": 5},
+        {"window": 9, "smooth_window": 3},
+        {"window": 9, "smooth_window": 5},
+    ]
+    # parameters the algo doesn't take are left out
+    assert grid_points("accumulation-distribution", {"window": [10], "bogus": [1]}) == [
+        {"window": 10}
+    ]
+
+
+@pytest.mark.parametrize("strategy", ["crossover", "saucer", "twin-peaks"])
+def test_ao_grid_signals_match_run_algo(frames, strategy):
+    df = frames["S0"]
+    points = grid_points(
+        "awesome-oscillator", {"window1": [3, 5, 13], "window2": [21, 34]}
+    )
+    signals = ao_grid_signals(df, points, strategy)
+    assert signals.shape == (len(df), len(points))
+
+    for i, point in enumerate(points):
+        ta_algo = {"awesome-oscillator": {**point, "strategy": strategy}}
+        expected = run_algo(IndicatorFrame(df.copy()), ta_algo, 20)["ta_data"][
+            "awesome-oscillator-signal"
+        ]
+        np.testing.assert_array_equal(signals[:, i], expected, err_msg=str(point))
+
+
+def test_ranking(frames):
+    grid = {"window": [5, 14, 21], "smooth_window": [3, 5]}
+    results = sweep(frames, "stoch", grid, workers=1, min_trades=30)
+    assert len(results) == 6
+
+    # every point's numbers add up to the backtests of its own ta_algo
+    for result in results:
+        stats = [backtest_frame(df, result["ta_algo"]) for df in frames.values()]
+        closed = sum(s["closed_trades"] for s in stats)
+        wins = sum(
+            round(s["hit_rate"] * s["closed_trades"])
+            for s in stats
+            if s["hit_rate"] is not None
+        )
+        assert result["closed_trades"] == closed
+        assert result["hit_rate"] == (wins / closed if closed else None)
+        assert result["ranked"] == (closed >= 30)
+
+    # the ones with enough trades first, best hit rate and then most trades first within them
+    ranked = [result["ranked"] for result in results]
+    assert any(ranked) and not all(ranked)
+    assert ranked == sorted(ranked, reverse=True)
+    for group in (True, False):
+        keys = [
+            (result["hit_rate"] or 0, result["closed_trades"])
+            for result in results
+            if result["ranked"] == group
+        ]
+        assert keys == sorted(keys, reverse=True)
+
+
+def test_min_trades(frames):
+    grid = {"window": [5, 14], "smooth_window": [3]}
+    most = max(
+        result["closed_trades"] for result in sweep(frames, "stoch", grid, workers=1)
+    )
+    assert all(
+        result["ranked"]
+        for result in sweep(frames, "stoch", grid, workers=1, min_trades=0)
+    )
+    assert not any(
+        result["ranked"]
+        for result in sweep(frames, "stoch", grid, workers=1, min_trades=most + 1)
+    )
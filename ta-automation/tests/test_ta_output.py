@@ -0,0 +1,112 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from local_runner.synthetic import synthetic_frame
+from ta_common.ta_output import compact_ta_data, is_compact, window_ta_data
+from ta_common.wire_format import encode_frame
+
+BARS = 1200
+ALGOS = [
+    {"awesome-oscillator": None},
+    {"awesome-oscillator": {"strategy": "saucer", "direction": "bearish"}},
+    {"stoch": None},
+    {"accumulation-distribution": None},
+]
+
+
+def through_json(value):
+    # the way it goes through step functions
+    return json.loads(json.dumps(value))
+
+
+@pytest.mark.parametrize("window", [0, 1, 30, BARS - 1, BARS, BARS + 50])
+def test_window_is_the_end_of_the_full_series(window):
+    rng = np.random.default_rng(window)
+    signal = np.zeros(BARS, dtype=np.int8)
+    signal[rng.choice(BARS, 40, replace=False)] = rng.choice([1, -1], 40)
+    full = {
+        "indicator": rng.normal(size=BARS).tolist(),
+        "signal": signal.tolist(),
+    }
+    compact = through_json(compact_ta_data(full, window, events=["signal"]))
+
+    assert is_compact(compact)
+    start = compact["start"]
+    assert start == (0 if window == 0 else max(BARS - window, 0))
+    assert window_ta_data(compact) == {
+        name: values[start:] for name, values in full.items()
+    }
+
+
+@pytest.fixture(scope="module")
+def job():
+    df = synthetic_frame(BARS, resolution="1h", seed=8)
+    return {
+        "symbol": "BHP",
+        "resolution": "1h",
+        "date_from": str(df.index[0]),
+        "date_to": str(df.index[-1] + pd.Timedelta(hours=1)),
+        "search_period": 20,
+        "symbol_data": encode_frame(df),
+    }
+
+
+def run_ta(payload):
+    import run_ta
+
+    return through_json(run_ta.lambda_handler({"Payload": payload}, None))
+
+
+@pytest.mark.parametrize("ta_window", [0, 20, 250, BARS * 2])
+def test_compact_run_ta_round_trips(job, ta_window):
+    from run_ta import DERIVED_KEYS
+
+    full = run_ta(dict(job, ta_algos=ALGOS, ta_output="full"))
+    compact = run_ta(
+        dict(job, ta_algos=ALGOS, ta_output="compact", ta_window=ta_window)
+    )
+
+    for full_result, compact_result in zip(full, compact):
+        full_analysis = full_result["ta_analysis"]
+        compact_analysis = compact_result["ta_analysis"]
+        # what calculate confidence reads
+        assert compact_analysis["confidence"] == full_analysis["confidence"]
+
+        # and what generate graph draws - the full series from where the window starts
+        ta_data = compact_analysis["ta_data"]
+        assert is_compact(ta_data)
+        assert ta_data["bars"] == BARS
+        start = ta_data["start"]
+        assert start == (0 if ta_window == 0 else max(BARS - ta_window, 0))
+        assert window_ta_data(ta_data) == {
+            name: values[start:]
+            for name, values in full_analysis["ta_data"].items()
+            if name not in DERIVED_KEYS
+        }
+
+
+def test_generate_graph_draws_the_same_window(job, monkeypatch, tmp_path):
+    import generate_graph
+
+    drawn = []
+
+    def capture(df, ta_data, symbol, graph_file, ta_algo=None):
+        drawn.append((df, ta_data))
+        with open(graph_file, "wb") as f:
+            f.write(b"png")
+
+    monkeypatch.setattr(generate_graph, "GRAPH_STORE", str(tmp_path))
+    monkeypatch.setitem(generate_graph.RENDERERS, "stoch", capture)
+
+    payload = dict(job, ta_algo={"stoch": None})
+    for options in ({"ta_output": "full"}, {"ta_output": "compact", "ta_window": 100}):
+        analysis = run_ta(dict(payload, **options))
+        generate_graph.lambda_handler(
+            {"Payload": dict(payload, ta_analysis=analysis)}, None
+        )
+
+    (full_df, full_data), (window_df, window_data) = drawn
+    assert len(window_df) == 100
+    pd.testing.assert_frame_equal(window_df, full_df.iloc[-100:])
+    assert window_data == {name: values[-100:] for name, values in full_data.items()}
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import pytest
+from local_runner.synthetic import synthetic_frame
+from signals import BUY, SELL, signal_state
+from ta_common.resample import resample
+from ta_common.wire_format import encode_frame
+from timeframes import align_state, build_timeframes
+
+TZ = "America/New_York"
+
+
+def session_frame(days):
+    # 5m bars for a 9:30 to 16:00 session on each day, with a naive UTC index and the exchange's tz in attrs like a
+    # decoded frame
+    index = pd.DatetimeIndex([])
+    for day in days:
+        index = index.append(
+            pd.date_range(f"{day} 09:30", f"{day} 15:55", freq="5min", tz=TZ)
+        )
+    close = 100 + np.sin(np.arange(len(index)) / 7)
+    frame = pd.DataFrame(
+        {
+            "Open": close,
+            "High": close + 1,
+            "Low": close - 1,
+            "Close": close,
+            "Volume": np.ones(len(index)),
+        },
+        index=index.tz_convert("UTC").tz_localize(None),
+    )
+    frame.attrs["tz"] = TZ
+    return frame
+
+
+def test_coarser_bins_line_up_when_date_from_is_part_way_through_a_session():
+    df = session_frame(["2022-01-07", "2022-01-10", "2022-01-11"])
+    date_from = "2022-01-10T13:16:00-05:00"
+    timeframes = build_timeframes(df, "5m", ["5m", "1h"], date_from)
+
+    hourly = timeframes["1h"].index.tz_localize("UTC").tz_convert(TZ)
+    assert [str(t.time()) for t in hourly[:4]] == [
+        "13:30:00",
+        "14:30:00",
+        "15:30:00",
+        "09:30:00",
+    ]
+    # the same bars as resampling everything, from date_from on
+    whole = resample(df.tz_localize("UTC"), "1h", TZ).tz_localize(None)
+    start = pd.Timestamp(date_from).tz_convert("UTC").tz_localize(None)
+    pd.testing.assert_frame_equal(
+        timeframes["1h"], whole[whole.index >= start], check_freq=False
+    )
+    # and the base timeframe is cut back to date_from too
+    assert timeframes["5m"].index[0] == start + pd.Timedelta(minutes=4)
+
+
+def test_run_ta_keeps_the_bars_before_date_from_for_resampling():
+    import run_ta
+
+    df = session_frame(["2022-01-07", "2022-01-10", "2022-01-11"])
+    payload = {
+        "symbol": "spy",
+        "symbol_data": encode_frame(df.tz_localize("UTC").tz_convert(TZ)),
+        "date_from": "2022-01-10T13:16:00-05:00",
+        "date_to": "2022-01-12T00:00:00-05:00",
+        "resolution": "5m",
+        "resolutions": ["1h"],
+        "search_period": 20,
+        "ta_algo": {"awesome-oscillator": None},
+    }
+    analysis = run_ta.analyse(payload)
+    # 13:30, 14:30 and 15:30 on the 10th, then a full session of seven on the 11th
+    assert analysis["timeframes"]["1h"]["bars"] == 10
+    # 13:20 to 15:55 on the 10th, 9:30 to 15:55 on the 11th
+    assert analysis["timeframes"]["5m"]["bars"] == 32 + 78
+
+
+def confluence_frames(seed):
+    from indicators import IndicatorFrame
+
+    # naive UTC, like a decoded frame
+    df = synthetic_frame(6_000, resolution="5m", seed=seed).tz_localize(None)
+    timeframes = build_timeframes(df, "5m", ["5m", "15m", "1h", "1d"])
+    return {
+        resolution: IndicatorFrame(frame) for resolution, frame in timeframes.items()
+    }
+
+
+# seed 19 has every timeframe's last crossover bearish, seed 3 has one bullish and three bearish
+@pytest.mark.parametrize(
+    "seed, states, bullish, bearish",
+    [(19, [SELL] * 4, 0, 10), (3, [BUY, SELL, SELL, SELL], 2.5, 7.5)],
+)
+def test_confluence_counts_the_direction_the_job_is_after(
+    seed, states, bullish, bearish
+):
+    from run_ta import run_algo_confluence
+
+    frames = confluence_frames(seed)
+
+    def run(direction):
+        ta_algo = {"awesome-oscillator": {"direction": direction}}
+        return run_algo_confluence(frames, "5m", ta_algo, 0)
+
+    result = run("bullish")
+    assert [timeframe["state"] for timeframe in result["timeframes"].values()] == states
+    assert result["confidence"] == pytest.approx(bullish)
+    assert run("bearish")["confidence"] == pytest.approx(bearish)
+
+
+def test_signal_state_expires_after_search_period():
+    signal = [0, BUY, 0, 0, 0, SELL, 0, 0]
+    assert signal_state(signal).tolist() == [0, 1, 1, 1, 1, -1, -1, -1]
+    # the signal's own bar and the two after it
+    assert signal_state(signal, 3).tolist() == [0, 1, 1, 1, 0, -1, -1, -1]
+    assert signal_state(signal, 2).tolist() == [0, 1, 1, 0, 0, -1, -1, 0]
+
+
+def test_confluence_ignores_signals_older_than_search_period():
+    from run_ta import run_algo_confluence
+
+    # none of these timeframes has a stochastic buy in its last 5 bars, but three of them had one before that
+    frames = confluence_frames(43)
+    result = run_algo_confluence(frames, "5m", {"stoch": None}, 5)
+    for timeframe in result["timeframes"].values():
+        assert timeframe["confidence"] == 0
+        assert timeframe["state"] == 0
+    assert result["confidence"] == 0
+
+    # looking back over everything, they count again
+    everything = run_algo_confluence(frames, "5m", {"stoch": None}, 0)
+    assert everything["confidence"] == pytest.approx(7.5)
+
+
+def test_align_state_waits_for_the_coarser_bar_to_close():
+    # an hour of 5m bars, and 15m bars over it
+    base = pd.date_range("2022-01-03 10:00", periods=12, freq="5min")
+    coarse = pd.date_range("2022-01-03 10:00", periods=4, freq="15min")
+    state = [BUY, SELL, BUY, SELL]
+    aligned = align_state(state, base, coarse)
+    # each 15m bar's state only shows from its last 5m bar on - 10:10, 10:25, 10:40, 10:55
+    assert aligned.tolist() == [0, 0, 1, 1, 1, -1, -1, -1, 1, 1, 1, -1]
+
+    # changing a coarser bar can't change anything aligned before it closed
+    later = align_state([BUY, SELL, SELL, BUY], base, coarse)
+    assert later[:8].tolist() == aligned[:8].tolist()
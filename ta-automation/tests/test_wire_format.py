@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from local_runner.synthetic import synthetic_frame
+from ta_common.wire_format import DEFAULT_ENCODING, decode_frame, encode_frame
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+@pytest.fixture
+def frame():
+    df = synthetic_frame(500, resolution="1m", seed=11)[COLUMNS]
+    # prices that float32 can't hold
+    df["Close"] += 1e-9
+    return df
+
+
+def test_default_encoding_is_exact(frame):
+    assert DEFAULT_ENCODING == "b64-f64"
+    decoded = decode_frame(encode_frame(frame))
+    np.testing.assert_array_equal(decoded[COLUMNS].to_numpy(), frame.to_numpy())
+    assert decoded.index.equals(frame.index.tz_convert(None))
+
+
+def test_f32_is_opt_in_and_rounds_prices(frame):
+    decoded = decode_frame(encode_frame(frame, "b64-f32"))
+    assert not np.array_equal(decoded["Close"].to_numpy(), frame["Close"].to_numpy())
+    np.testing.assert_allclose(decoded["Close"], frame["Close"], rtol=1e-6)
+    # volume is f64 either way
+    np.testing.assert_array_equal(decoded["Volume"], frame["Volume"])
+
+
+def test_json_encoding_keeps_nans(frame):
+    frame.iloc[3, 0] = np.nan
+    decoded = decode_frame(encode_frame(frame, "json"))
+    assert np.isnan(decoded["Open"].iloc[3])
+    np.testing.assert_array_equal(decoded["Close"], frame["Close"])